@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Publish many HLS sources from a manifest, concurrently.
+
+Each source goes through the same download -> trim -> probe -> upload ->
+playlist pipeline as download_upload_m3u8_complete.py, with its own trim
+rules, storage path and rendition selection. Sources run in parallel, but
+network transfers and ffmpeg/ffprobe runs are capped globally across all
+of them. Every source writes its own upload_results.json, and the batch
+summary collects them (same shape) under the source names.
+
+Manifest (JSON, or YAML if PyYAML is installed):
+  {
+    "defaults": {"target_duration": 63, "hls_layout": "byterange"},
+    "sources": [
+      {
+        "name": "landing_video",
+        "url": "https://.../master.m3u8",
+        "storage_path": "videos/landing",
+        "renditions": ["1280x720", "640x360"],   # Optional, default: every variant
+        "target_duration": 63,                    # Or "frames_to_trim": 15
+        "auto_trim": false,                       # Trim at the detected end card (see end_card.py)
+        "thumbnails": true,                       # Poster, scrub sprite and WebVTT track
+        "iframes": true,                          # I-frame playlists for trick play (not with "single")
+        "audio_group": true,                      # Audio once as a shared group, video-only renditions
+        "audio_rendition": "1280x720",            # Rendition the audio group is taken from (default: the largest)
+        "segment_duration": 6,
+        "first_segment_duration": 1,              # Short first segment for a faster start, 0 to disable
+        "stream": false                           # Pipe ffmpeg into the upload, no local MP4
+      },
+      {
+        "name": "my_effect",
+        "input": "generated/my_effect.mp4",       # Instead of "url": encode a ladder locally
+        "ladder": [{"name": "640x360", "height": 360, "video_bitrate": 800000}],  # Optional
+        "storage_path": "videos/effects"
+      }
+    ]
+  }
+
+Usage:
+  python3 batch_publish.py manifest.json
+  python3 batch_publish.py manifest.yaml --max-sources 4 --max-transfers 8 --force
+  python3 batch_publish.py manifest.json --ffmpeg-timeout 600  # Kill any ffmpeg run after 10 minutes
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+import download_upload_m3u8_complete as publisher
+import ffmpeg_runner
+import hls_client
+import hls_package
+import hls_playlist
+import pipeline_state
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Configuration
+OUTPUT_DIR = Path("downloaded_videos")
+SUMMARY_FILE = OUTPUT_DIR / "batch_results.json"
+MAX_SOURCES = 3  # Sources processed at once
+MAX_TRANSFERS = 4  # Concurrent downloads/uploads across all sources
+MAX_FFMPEG = os.cpu_count() or 1  # Concurrent ffmpeg/ffprobe runs across all sources
+
+def load_manifest(path):
+    """Load a JSON or YAML manifest."""
+    path = Path(path)
+    with open(path) as f:
+        if path.suffix in (".yaml", ".yml"):
+            if yaml is None:
+                raise ValueError("YAML manifests need PyYAML: pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def resolve_renditions(url, names=None):
+    """Rendition entries (name, bandwidth, url, resolution) for the selected variants.
+
+    names may list resolutions ("1280x720") or full RESOLUTIONS-style entries;
+    by default every variant of a master playlist is published.
+    """
+    if names and all(isinstance(name, dict) for name in names):
+        return names
+
+    session = hls_client.create_session()
+    try:
+        master = hls_client.fetch_playlist(session, url)
+    finally:
+        session.close()
+    if not isinstance(master, hls_playlist.MasterPlaylist):
+        if names and len(names) > 1:
+            raise ValueError(f"{url} is a media playlist, it has a single rendition")
+        return [{"name": names[0] if names else "source", "bandwidth": None, "url": url}]
+
+    if not names:
+        names = list(dict.fromkeys(variant.resolution for variant in master.variants if variant.resolution))
+    renditions = []
+    for name in names:
+        variant = hls_client.select_variant(master, name)
+        renditions.append({"name": name, "bandwidth": variant.bandwidth, "url": url, "resolution": name})
+    return renditions
+
+def build_source(entry, defaults):
+    """Merge a manifest entry with the manifest and script defaults into a source."""
+    entry = {**defaults, **entry}
+    for key in ("name", "storage_path"):
+        if not entry.get(key):
+            raise ValueError(f"Manifest source is missing '{key}': {entry}")
+    if not entry.get("url") and not entry.get("input"):
+        raise ValueError(f"Manifest source needs a 'url' or an 'input' video: {entry}")
+
+    hls_layout = entry.get("hls_layout", publisher.HLS_LAYOUT)
+    if hls_layout not in hls_package.LAYOUTS:
+        raise ValueError(f"Unknown hls_layout '{hls_layout}' for {entry['name']}")
+
+    default_first_segment = hls_package.FIRST_SEGMENT_DURATION if publisher.FAST_START else None
+
+    frames_to_trim = entry.get("frames_to_trim")
+    target_duration = entry.get("target_duration")
+    if target_duration is None and frames_to_trim is None:
+        target_duration = publisher.TARGET_DURATION
+
+    return {
+        "name": entry["name"],
+        "url": entry.get("url"),
+        "renditions": entry.get("renditions"),
+        "target_duration": target_duration,
+        "frames_to_trim": frames_to_trim,
+        "auto_trim": bool(entry.get("auto_trim", False)),
+        "thumbnails": bool(entry.get("thumbnails", publisher.THUMBNAILS)),
+        "iframes": bool(entry.get("iframes", publisher.IFRAME_PLAYLISTS)),
+        "audio_group": bool(entry.get("audio_group", publisher.AUDIO_GROUP)),
+        "audio_rendition": entry.get("audio_rendition", publisher.AUDIO_RENDITION),
+        "input": entry.get("input"),
+        "ladder": entry.get("ladder"),
+        "storage_path": entry["storage_path"].strip("/"),
+        "output_dir": Path(entry.get("output_dir", OUTPUT_DIR / entry["name"])),
+        "hls_layout": hls_layout,
+        "segment_duration": float(entry.get("segment_duration", publisher.SEGMENT_DURATION)),
+        "first_segment_duration": entry.get("first_segment_duration", default_first_segment) or None,
+        "stream": bool(entry.get("stream", False))
+    }
+
+def publish(state, source, project_id, storage_bucket, can_upload):
+    """Resolve a source's renditions and publish it. Returns (name, output_data or error)."""
+    try:
+        if source["input"]:
+            print(f"\n🎬 {source['name']}: ladder from {source['input']} -> {source['storage_path']}/")
+        else:
+            source["renditions"] = resolve_renditions(source["url"], source["renditions"])
+            print(f"\n🎬 {source['name']}: {len(source['renditions'])} renditions -> {source['storage_path']}/")
+        return source["name"], publisher.publish_source(state, source, project_id, storage_bucket, can_upload)
+    except (requests.RequestException, ValueError, OSError, subprocess.CalledProcessError) as e:
+        print(f"❌ {source['name']} failed: {e}")
+        return source["name"], {"error": str(e)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish every HLS source in a manifest to Firebase Storage')
+    parser.add_argument('manifest', type=Path, help='JSON or YAML manifest of sources')
+    parser.add_argument('--max-sources', type=int, default=MAX_SOURCES, help='Sources processed at once')
+    parser.add_argument('--max-transfers', type=int, default=MAX_TRANSFERS,
+                       help='Concurrent downloads/uploads across all sources')
+    parser.add_argument('--max-ffmpeg', type=int, default=MAX_FFMPEG,
+                       help='Concurrent ffmpeg/ffprobe processes across all sources')
+    parser.add_argument('--ffmpeg-timeout', type=float, metavar='SECONDS', default=ffmpeg_runner.TIMEOUT,
+                       help='Kill an ffmpeg run that takes longer than this (0: no limit)')
+    parser.add_argument('--summary', type=Path, default=SUMMARY_FILE, help='Batch summary JSON')
+    parser.add_argument('--force', action='store_true',
+                       help='Ignore the pipeline state and rerun every stage')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("Batch HLS Download, Trim & Upload to Firebase Storage")
+    print("=" * 70)
+
+    try:
+        manifest = load_manifest(args.manifest)
+        defaults = manifest.get("defaults", {})
+        sources = [build_source(entry, defaults) for entry in manifest.get("sources", [])]
+    except (OSError, ValueError) as e:
+        print(f"❌ Invalid manifest {args.manifest}: {e}")
+        sys.exit(1)
+    names = [source["name"] for source in sources]
+    if len(set(names)) != len(names):
+        print(f"❌ Source names must be unique: {names}")
+        sys.exit(1)
+    if not sources:
+        print(f"❌ No sources in {args.manifest}")
+        sys.exit(1)
+
+    if not publisher.check_ffmpeg():
+        sys.exit(1)
+
+    # No prompts in batch mode: without credentials or a project, files are only prepared locally
+    can_upload = publisher.check_storage_access()
+    project_id, storage_bucket = publisher.get_firebase_config()
+    if can_upload and not project_id:
+        print("\n⚠️  Could not detect Firebase project ID, skipping uploads")
+
+    publisher.set_concurrency_limits(args.max_transfers, args.max_ffmpeg)
+    ffmpeg_runner.TIMEOUT = args.ffmpeg_timeout or None
+    state = pipeline_state.PipelineState(force=args.force)
+
+    print(f"\n📦 {len(sources)} sources, {args.max_sources} at a time "
+          f"({args.max_transfers} transfers, {args.max_ffmpeg} ffmpeg processes)")
+    with ThreadPoolExecutor(max_workers=args.max_sources) as executor:
+        summary = dict(executor.map(
+            lambda source: publish(state, source, project_id, storage_bucket, can_upload), sources
+        ))
+
+    args.summary.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.summary, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n{'='*70}")
+    print("📊 Batch Summary")
+    print(f"{'='*70}")
+    failed = 0
+    for name, output_data in summary.items():
+        if "error" in output_data:
+            failed += 1
+            print(f"\n❌ {name}: {output_data['error']}")
+        else:
+            print(f"\n✅ {name}: {len(output_data['resolutions'])} renditions")
+            print(f"   Master Playlist URL: {output_data['master_playlist_url'] or 'N/A'}")
+        jobs = ffmpeg_runner.history(name)
+        if jobs:
+            media = sum(job["out_time"] or 0 for job in jobs)
+            print(f"   ffmpeg: {len(jobs)} jobs, {sum(job['elapsed'] for job in jobs):.1f}s for {media:.1f}s of media")
+    
+    ffmpeg_report = ffmpeg_runner.report()
+    if ffmpeg_report:
+        print(f"\n⏱️  ffmpeg (slowest first):")
+        for line in ffmpeg_report:
+            print(f"   {line}")
+    print(f"\n📄 Results saved to: {args.summary}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
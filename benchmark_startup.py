@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Measure HLS startup (time to first byte and first frame) for each playlist layout.
+
+Packages one MP4 in every layout of hls_package.py, with and without the
+fast-start short first segment, serves them from a local HTTP server with
+injectable latency and bandwidth, and plays the start of each one the way
+a player does:
+
+  1. fetch and parse the media playlist
+  2. fetch the init section (#EXT-X-MAP), if any
+  3. fetch the whole first segment, then decode its first frame
+
+TTFB is the time until the first byte of the first media segment arrives,
+TTFF the time until its first frame is decoded (ffmpeg stands in for the
+player's decoder). Both count from the playlist request. Layouts:
+
+  single               one #EXTINF for the whole MP4 (+faststart)
+  byterange            byte ranges into a fragmented MP4
+  byterange_faststart  same, first segment cut short at --first-segment-duration
+  fmp4                 init + .m4s files from ffmpeg's hls muxer
+  fmp4_faststart       init + .m4s files, first segment cut short
+
+The fast-start layouts need a keyframe at the short segment's end; the
+first GOP of the input is re-encoded to add one (smart_cut.split_first_gop).
+Nothing touches the network; absolute numbers depend on --latency and
+--rate-mbps, compare layouts with each other.
+
+Usage:
+  python3 benchmark_startup.py downloaded_videos/landing_video_1280x720.mp4
+  python3 benchmark_startup.py input.mp4 --latency 0.08 --rate-mbps 3 --runs 5 --json startup.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+import ffmpeg_runner
+import hls_client
+import hls_package
+import hls_playlist
+import media_probe
+import smart_cut
+
+# Configuration
+LAYOUTS = ("single", "byterange", "byterange_faststart", "fmp4", "fmp4_faststart")
+LATENCY = 0.05  # Seconds per request, roughly a mobile round trip
+RATE_MBPS = 5.0  # Download bandwidth in Mbit/s
+RUNS = 3
+CHUNK_SIZE = 16 * 1024  # Bytes written between bandwidth sleeps
+
+class ThrottledHandler(SimpleHTTPRequestHandler):
+    """Static files with single Range requests, per-request latency and a bandwidth cap."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    rate = None  # Bytes per second, None for unlimited
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return
+        data = path.read_bytes()
+        status = 200
+        byte_range = self.headers.get("Range")
+        if byte_range and byte_range.startswith("bytes="):
+            first, _, last = byte_range[len("bytes="):].partition("-")
+            first = int(first)
+            last = min(int(last), len(data) - 1) if last else len(data) - 1
+            content_range = f"bytes {first}-{last}/{len(data)}"
+            data = data[first:last + 1]
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Type", self.guess_type(str(path)))
+        self.send_header("Content-Length", str(len(data)))
+        if status == 206:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+        for start in range(0, len(data), CHUNK_SIZE):
+            chunk = data[start:start + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            if self.rate:
+                time.sleep(len(chunk) / self.rate)
+
+def start_server(directory, latency, rate):
+    """Serve directory in a background thread. Returns (server, base URL)."""
+    handler = type("Handler", (ThrottledHandler,), {"latency": latency, "rate": rate})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(directory)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def fast_start_source(input_path, directory, first_segment_duration, fragmented):
+    """The input with a keyframe at first_segment_duration (a copy if it has one already)."""
+    output_path = directory / f"faststart_{'fragmented' if fragmented else 'mp4'}.mp4"
+    movflags = hls_package.FRAGMENT_MOVFLAGS if fragmented else None
+    if smart_cut.split_first_gop(input_path, output_path, first_segment_duration, movflags) is None:
+        if fragmented:
+            hls_package.fragment_mp4(input_path, output_path)
+        else:
+            output_path.write_bytes(Path(input_path).read_bytes())
+    return output_path
+
+def package_layout(layout, input_path, directory, segment_duration, first_segment_duration):
+    """Package input_path in one layout under directory/layout. Returns the playlist name relative to directory."""
+    layout_dir = directory / layout
+    layout_dir.mkdir()
+    fast_start = layout.endswith("_faststart")
+    first = first_segment_duration if fast_start else None
+
+    if layout == "single":
+        mp4_path = layout_dir / "video.mp4"
+        cmd = ["ffmpeg", "-v", "error", "-i", str(input_path), "-map", "0", "-c", "copy",
+               "-movflags", "+faststart", "-y", str(mp4_path)]
+        ffmpeg_runner.run(cmd)
+        duration = media_probe.get_video_duration(mp4_path)
+        playlist = hls_playlist.MediaPlaylist(segments=[hls_playlist.Segment(mp4_path.name, duration)])
+        hls_playlist.write(playlist, layout_dir / "video.m3u8")
+    elif layout.startswith("byterange"):
+        mp4_path = layout_dir / "video.mp4"
+        if fast_start:
+            fast_start_source(input_path, directory, first, fragmented=True).replace(mp4_path)
+        else:
+            hls_package.fragment_mp4(input_path, mp4_path)
+        hls_package.package_byterange(mp4_path, mp4_path.name, layout_dir / "video.m3u8", segment_duration, first)
+    else:
+        source = fast_start_source(input_path, directory, first, fragmented=False) if fast_start else input_path
+        hls_package.package_fmp4(source, layout_dir, "video", segment_duration, first)
+    return f"{layout}/video.m3u8"
+
+def fetch(session, uri, byterange=None):
+    """GET a URI (or a byte range of it). Returns (seconds to the first byte from now, data)."""
+    headers = {}
+    if byterange:
+        offset, length = byterange
+        headers["Range"] = f"bytes={offset}-{offset + length - 1}"
+    start = time.perf_counter()
+    first_byte = None
+    data = bytearray()
+    with session.get(uri, headers=headers, stream=True, timeout=hls_client.REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            data += chunk
+    return first_byte or 0.0, bytes(data)
+
+def decode_first_frame(data, directory):
+    """Decode the first video frame of an init + segment byte string. Returns True on success."""
+    path = Path(directory) / "startup.mp4"
+    path.write_bytes(data)
+    cmd = ["ffmpeg", "-v", "error", "-i", str(path), "-map", "0:v:0", "-frames:v", "1", "-f", "null", "-"]
+    return subprocess.run(cmd, capture_output=True).returncode == 0
+
+def measure_startup(url, directory):
+    """Start playing the media playlist at url once. Returns the timings of that start."""
+    session = requests.Session()
+    try:
+        start = time.perf_counter()
+        playlist = hls_client.fetch_media_playlist(session, url)
+        requests_made = 1
+        media = b""
+        if playlist.init:
+            _, media = fetch(session, playlist.init.uri, playlist.init.byterange)
+            requests_made += 1
+        segment = playlist.segments[0]
+        before_segment = time.perf_counter() - start
+        first_byte, data = fetch(session, segment.uri, segment.byterange)
+        requests_made += 1
+        ttfb = before_segment + first_byte
+        decoded = decode_first_frame(media + data, directory)
+        ttff = time.perf_counter() - start
+    finally:
+        session.close()
+    return {
+        "first_segment_seconds": segment.duration,
+        "first_segment_bytes": len(data),
+        "startup_bytes": len(media) + len(data),
+        "requests": requests_made,
+        "ttfb_ms": ttfb * 1000,
+        "ttff_ms": ttff * 1000 if decoded else None,
+    }
+
+def measure(base_url, layout, playlist_name, runs, directory):
+    """Median startup of a layout over runs."""
+    results = [measure_startup(f"{base_url}/{playlist_name}", directory) for _ in range(runs)]
+    ttffs = [result["ttff_ms"] for result in results]
+    return {
+        "layout": layout,
+        "first_segment_seconds": round(results[0]["first_segment_seconds"], 3),
+        "first_segment_bytes": results[0]["first_segment_bytes"],
+        "startup_bytes": results[0]["startup_bytes"],
+        "requests": results[0]["requests"],
+        "ttfb_ms": round(statistics.median(result["ttfb_ms"] for result in results), 1),
+        "ttff_ms": round(statistics.median(ttffs), 1) if None not in ttffs else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HLS time to first byte/frame per playlist layout')
+    parser.add_argument('input', type=Path, help='MP4 to package (e.g. a landing video rendition)')
+    parser.add_argument('--layouts', default=",".join(LAYOUTS), help=f'Comma-separated: {", ".join(LAYOUTS)}')
+    parser.add_argument('--segment-duration', type=float, default=hls_package.SEGMENT_DURATION,
+                       help='Target segment duration in seconds')
+    parser.add_argument('--first-segment-duration', type=float, default=hls_package.FIRST_SEGMENT_DURATION,
+                       help='Short first segment of the *_faststart layouts, in seconds')
+    parser.add_argument('--latency', type=float, default=LATENCY, help='Seconds added to every request')
+    parser.add_argument('--rate-mbps', type=float, default=RATE_MBPS, help='Bandwidth in Mbit/s (0: unlimited)')
+    parser.add_argument('--runs', type=int, default=RUNS, help='Startups per layout (the median is reported)')
+    parser.add_argument('--json', type=Path, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    layouts = [name.strip() for name in args.layouts.split(",") if name.strip()]
+    unknown = [name for name in layouts if name not in LAYOUTS]
+    if unknown:
+        parser.error(f"unknown layouts: {', '.join(unknown)}")
+    if not args.input.exists():
+        parser.error(f"{args.input} does not exist")
+
+    rate = args.rate_mbps * 1000 * 1000 / 8 if args.rate_mbps else None
+    print(f"📊 {args.input.name}: {args.segment_duration:g}s segments, {args.first_segment_duration:g}s fast start, "
+          f"{args.latency * 1000:.0f} ms latency, {args.rate_mbps:g} Mbit/s, {args.runs} runs")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        served = directory / "www"
+        served.mkdir()
+        playlists = {}
+        for layout in layouts:
+            try:
+                playlists[layout] = package_layout(
+                    layout, args.input, served, args.segment_duration, args.first_segment_duration
+                )
+            except (ValueError, subprocess.CalledProcessError) as e:
+                print(f"⚠️  Could not package {layout}: {e}")
+
+        server, base_url = start_server(served, args.latency, rate)
+        try:
+            print(f"\n{'layout':<20} {'1st seg s':>9} {'1st seg KB':>10} {'requests':>8} {'TTFB ms':>8} {'TTFF ms':>8}")
+            for layout, playlist_name in playlists.items():
+                row = measure(base_url, layout, playlist_name, args.runs, directory)
+                rows.append(row)
+                ttff = f"{row['ttff_ms']:>8.0f}" if row["ttff_ms"] is not None else f"{'failed':>8}"
+                print(f"{layout:<20} {row['first_segment_seconds']:>9.2f} {row['first_segment_bytes'] / 1024:>10.0f} "
+                      f"{row['requests']:>8} {row['ttfb_ms']:>8.0f} {ttff}")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    if not rows:
+        sys.exit(1)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n📄 Results saved to: {args.json}")
+
+if __name__ == "__main__":
+    main()
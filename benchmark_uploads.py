@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Measure upload throughput (files/s, MB/s) against the local Storage emulator.
+
+Generates a set of random files, starts storage_emulator.py in-process and
+runs each upload backend of gcs_storage.py at several concurrency levels:
+
+  multipart   single-request uploads with hashes in the metadata
+  resumable   chunked resumable sessions with the final X-Goog-Hash check
+  sync        sync_files() into an empty prefix, then again with nothing changed
+
+Latency and failures injected into the emulator show how each backend
+copes with round trips and retries. Nothing touches real Cloud Storage.
+The emulator hashes every object in the same process, so absolute numbers
+are a lower bound; compare backends and concurrency levels with each other.
+Install google-crc32c first, the pure-Python CRC32C dominates otherwise.
+
+Usage:
+  python3 benchmark_uploads.py
+  python3 benchmark_uploads.py --files 100 --size-mb 0.5 --workers 1,4,16 --latency 0.03
+  python3 benchmark_uploads.py --backends resumable --chunk-mb 1 --failure-rate 0.05 --json results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import gcs_storage
+import storage_emulator
+
+# Configuration
+BUCKET = "benchmark.appspot.com"
+FILE_COUNT = 40
+FILE_SIZE_MB = 2.0
+WORKER_COUNTS = "1,2,4,8,16"
+BACKENDS = ("multipart", "resumable", "sync")
+LATENCY = 0.02  # Seconds per request, roughly a nearby region
+MULTIPART_LIMIT = gcs_storage.MULTIPART_LIMIT  # What sync uses to pick a protocol
+
+def make_files(directory, count, size):
+    """Write count files of random bytes. Returns their paths."""
+    paths = []
+    for i in range(count):
+        path = Path(directory) / f"segment_{i:04d}.m4s"
+        path.write_bytes(os.urandom(size))
+        paths.append(path)
+    return paths
+
+def run_uploads(backend, paths, workers, prefix):
+    """Upload paths with one backend. Returns the names of files that failed."""
+    session = gcs_storage.create_session(workers)
+    try:
+        if backend == "sync":
+            gcs_storage.MULTIPART_LIMIT = MULTIPART_LIMIT
+            result = gcs_storage.sync_files(BUCKET, prefix, paths, max_workers=workers, session=session)
+            return result["failed"]
+        # Every file goes through the chosen protocol
+        gcs_storage.MULTIPART_LIMIT = sys.maxsize if backend == "multipart" else -1
+        uploads = [(path, f"{prefix}/{path.name}") for path in paths]
+        results = gcs_storage.upload_files(BUCKET, uploads, workers, session=session)
+        return [name for name, result in results.items() if result is None]
+    finally:
+        session.close()
+
+def measure(emulator, backend, paths, workers, total_bytes):
+    """Time one backend at one concurrency level on an empty emulator."""
+    emulator.objects.clear()
+    emulator.sessions.clear()
+    before = dict(emulator.stats)
+    prefix = f"bench/{backend}_{workers}"
+
+    start = time.perf_counter()
+    failed = run_uploads(backend, paths, workers, prefix)
+    elapsed = time.perf_counter() - start
+    row = {
+        "backend": backend,
+        "workers": workers,
+        "files": len(paths),
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(len(paths) / elapsed, 2),
+        "mb_per_second": round(total_bytes / elapsed / (1024 * 1024), 2),
+        "requests": emulator.stats["requests"] - before["requests"],
+        "injected_failures": emulator.stats["failures"] - before["failures"],
+        "failed": len(failed),
+    }
+
+    if backend == "sync":
+        # Second pass: everything is already there, only the listing and hashes are checked
+        start = time.perf_counter()
+        run_uploads(backend, paths, workers, prefix)
+        row["unchanged_seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Storage upload backends against a local emulator')
+    parser.add_argument('--files', type=int, default=FILE_COUNT, help='Number of files')
+    parser.add_argument('--size-mb', type=float, default=FILE_SIZE_MB, help='Size of each file in MB')
+    parser.add_argument('--workers', default=WORKER_COUNTS, help='Comma-separated concurrency levels')
+    parser.add_argument('--backends', default=",".join(BACKENDS), help=f'Comma-separated: {", ".join(BACKENDS)}')
+    parser.add_argument('--chunk-mb', type=float, help='Resumable chunk size in MB (rounded to 256 KiB)')
+    parser.add_argument('--latency', type=float, default=LATENCY, help='Seconds added to every request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for failure injection')
+    parser.add_argument('--json', type=Path, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    unknown = [name for name in backends if name not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(unknown)}")
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    if args.chunk_mb:
+        granularity = storage_emulator.CHUNK_GRANULARITY
+        gcs_storage.UPLOAD_CHUNK_SIZE = max(1, round(args.chunk_mb * 1024 * 1024 / granularity)) * granularity
+
+    emulator = storage_emulator.StorageEmulator(args.latency, args.failure_rate, seed=args.seed)
+    gcs_storage.STORAGE_API_URL = emulator.start()
+    os.environ.setdefault("GOOGLE_OAUTH_ACCESS_TOKEN", "local")
+
+    if gcs_storage.google_crc32c is None:
+        print("⚠️  google-crc32c is not installed, results are dominated by pure-Python CRC32C")
+    size = int(args.size_mb * 1024 * 1024)
+    print(f"📊 {args.files} files x {args.size_mb} MB, {args.latency * 1000:.0f} ms latency, "
+          f"{args.failure_rate:.0%} failures, emulator at {emulator.url}")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep resumable sessions and cached hashes out of downloaded_videos/
+        gcs_storage.SESSIONS_FILE = Path(directory) / "sessions.json"
+        gcs_storage.HASH_CACHE_FILE = Path(directory) / "hashes.json"
+        paths = make_files(Path(directory), args.files, size)
+        total_bytes = size * len(paths)
+
+        print(f"\n{'backend':<10} {'workers':>7} {'seconds':>8} {'files/s':>8} {'MB/s':>8} {'requests':>8} {'failed':>6}")
+        for backend in backends:
+            for workers in worker_counts:
+                row = measure(emulator, backend, paths, workers, total_bytes)
+                rows.append(row)
+                line = (f"{backend:<10} {workers:>7} {row['seconds']:>8.2f} {row['files_per_second']:>8.1f} "
+                        f"{row['mb_per_second']:>8.1f} {row['requests']:>8} {row['failed']:>6}")
+                if "unchanged_seconds" in row:
+                    line += f"   (unchanged re-sync {row['unchanged_seconds']:.2f}s)"
+                print(line)
+        gcs_storage.save_hash_cache()  # Before the directory is removed, not at exit
+    emulator.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n📄 Results saved to: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,29 @@
 Download m3u8 video in multiple resolutions and trim the last frames.
 This script downloads all available resolutions from the m3u8 playlist,
 trims the last 10-15 frames (watermark), and saves them as MP4 files.
+With AUDIO_GROUP the resolutions are saved video only, and the audio once
+as landing_video_audio.mp4 (for a shared HLS audio group).
+
+Usage:
+  python3 download_and_trim_m3u8.py                # Download and trim each resolution separately
+  python3 download_and_trim_m3u8.py --single-pass  # Open the master once and write all resolutions
 """
 
 import subprocess
 import os
 import sys
 import json
+import argparse
 from pathlib import Path
 
+import requests
+
+import ffmpeg_runner
+import hls_client
+import hls_playlist
+import media_probe
+import smart_cut
+
 # Configuration
 M3U8_URL = "https://video.twimg.com/amplify_video/1858525650694635520/pl/M1N2AhZP1we_u-at.m3u8?variant_version=1&tag=14"
 OUTPUT_DIR = Path("downloaded_videos")
@@ -19,12 +34,14 @@ TARGET_DURATION = 63  # Target duration in seconds (1 minute 3 seconds = 63s)
 FRAMES_TO_TRIM = None  # Set to None to use TARGET_DURATION instead
 FPS = 30  # Approximate FPS (will be detected automatically if possible)
 
-# Available resolutions from the m3u8 file
+# Variants to download from the master playlist; their video and audio playlists are read from it
 RESOLUTIONS = [
-    {"name": "1280x720", "url": "https://video.twimg.com/amplify_video/1858525650694635520/pl/avc1/1280x720/mMcIfeVfjw-Z1J_D.m3u8"},
-    {"name": "640x360", "url": "https://video.twimg.com/amplify_video/1858525650694635520/pl/avc1/640x360/cbYJT2bxdEuam1A5.m3u8"},
-    {"name": "480x270", "url": "https://video.twimg.com/amplify_video/1858525650694635520/pl/avc1/480x270/P0RHyJWr6wy0B68H.m3u8"},
+    {"name": "1280x720"},
+    {"name": "640x360"},
+    {"name": "480x270"},
 ]
+AUDIO_GROUP = True  # Video-only resolutions plus one audio file, instead of the audio muxed into each
+AUDIO_RESOLUTION = None  # Resolution whose audio is saved (None: the first in RESOLUTIONS)
 
 def check_ffmpeg():
     """Check if ffmpeg is installed."""
@@ -39,98 +56,60 @@ def check_ffmpeg():
         print("  Windows: Download from https://ffmpeg.org/download.html")
         return False
 
-def get_video_duration(video_path):
-    """Get video duration in seconds using ffprobe."""
+def resolve_streams(master_url, resolutions):
+    """Each resolution with the video and audio media playlist URLs the master lists for it."""
+    session = hls_client.create_session()
     try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(video_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
-    except Exception as e:
-        print(f"Warning: Could not get video duration: {e}")
-        return None
+        master = hls_client.fetch_playlist(session, master_url)
+    finally:
+        session.close()
+    if not isinstance(master, hls_playlist.MasterPlaylist):
+        raise ValueError(f"{master_url} is not a master playlist")
+    streams = []
+    for resolution in resolutions:
+        variant = hls_client.select_variant(master, resolution["name"])
+        audio = hls_client.select_audio(master, variant)
+        streams.append({**resolution, "video_url": variant.uri, "audio_url": audio.uri if audio else None})
+    return streams
 
-def get_video_fps(video_path):
-    """Get video FPS using ffprobe."""
-    try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=r_frame_rate",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(video_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        fps_str = result.stdout.strip()
-        if "/" in fps_str:
-            num, den = map(int, fps_str.split("/"))
-            return num / den if den != 0 else 30.0
-        return float(fps_str) if fps_str else 30.0
-    except Exception as e:
-        print(f"Warning: Could not get video FPS, using default {FPS}: {e}")
-        return FPS
-
-def download_m3u8(m3u8_url, output_path):
-    """Download m3u8 video and convert to MP4."""
+def download_m3u8(name, output_path, target_duration=None, frames_to_trim=None, audio=True):
+    """Download one variant of the master playlist and convert it to MP4, trimming it in the same remux.
+    
+    With target_duration only the segments covering that window are fetched;
+    without audio only the variant's video is kept.
+    Returns the hls_client download result, or None on failure.
+    """
     print(f"\n📥 Downloading: {output_path.name}")
-    print(f"   Resolution URL: {m3u8_url}")
     
-    # Use master playlist URL - it contains both video and audio streams
+    # Use master playlist URL - it lists the variant's video and its audio rendition
     # Individual resolution URLs only have video, no audio
-    master_url = "https://video.twimg.com/amplify_video/1858525650694635520/pl/M1N2AhZP1we_u-at.m3u8?variant_version=1&tag=14"
-    
-    # Determine which video/audio stream pair to select based on resolution
-    # From master playlist: audio streams are 0,1,2 and video streams are 3,4,5
-    if "1280x720" in m3u8_url:
-        # 1280x720 video (stream 3) + 128k audio (stream 0)
-        map_video = "0:3"
-        map_audio = "0:0"
-    elif "640x360" in m3u8_url:
-        # 640x360 video (stream 4) + 64k audio (stream 1)
-        map_video = "0:4"
-        map_audio = "0:1"
-    elif "480x270" in m3u8_url:
-        # 480x270 video (stream 5) + 32k audio (stream 2)
-        map_video = "0:5"
-        map_audio = "0:2"
-    else:
-        # Default: use first video and first audio
-        map_video = "0:v:0"
-        map_audio = "0:a:0"
+    master_url = M3U8_URL
     
-    print(f"   Using master playlist and mapping video stream {map_video} + audio stream {map_audio}")
-    
-    cmd = [
-        "ffmpeg",
-        "-i", master_url,
-        "-map", map_video,  # Map specific video stream
-        "-map", map_audio,  # Map specific audio stream
-        "-c:v", "copy",  # Copy video codec
-        "-c:a", "copy",  # Copy audio codec (preserve audio)
-        "-bsf:a", "aac_adtstoasc",  # Fix AAC audio
-        "-y",  # Overwrite output file
-        str(output_path)
-    ]
+    if audio:
+        print(f"   Using master playlist and fetching the {name or 'best'} variant + its audio rendition")
+    else:
+        print(f"   Using master playlist and fetching the {name or 'best'} variant, video only")
     
-    try:
-        subprocess.run(cmd, check=True)
+    download = hls_client.download_hls(
+        master_url,
+        output_path,
+        resolution=name,
+        max_duration=target_duration,
+        frames_to_trim=frames_to_trim,
+        fps=FPS,
+        audio=audio
+    )
+    if download:
         print(f"✅ Downloaded: {output_path.name}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error downloading {output_path.name}: {e}")
-        return False
+        return download
+    print(f"❌ Error downloading {output_path.name}")
+    return None
 
 def trim_video(input_path, output_path, frames_to_trim=None, target_duration=None):
-    """Trim video to specific duration or by frames."""
+    """Trim video to specific duration or by frames, frame-exactly (see smart_cut.py)."""
     # Get video duration and FPS
-    duration = get_video_duration(input_path)
-    fps = get_video_fps(input_path) if frames_to_trim else None
+    duration = media_probe.get_video_duration(input_path)
+    fps = media_probe.get_video_fps(input_path, default=FPS) if frames_to_trim else None
     
     if duration is None:
         print("⚠️  Could not determine video duration. Skipping trim.")
@@ -164,6 +143,18 @@ def trim_video(input_path, output_path, frames_to_trim=None, target_duration=Non
         print(f"   FPS: {fps:.2f}")
     print(f"   New duration: {new_duration:.2f}s ({int(new_duration // 60)}:{int(new_duration % 60):02d})")
     
+    try:
+        if target_duration is None:
+            smart_cut.smart_cut(input_path, output_path, frames_to_trim=frames_to_trim)
+        else:
+            smart_cut.smart_cut(input_path, output_path, new_duration)
+        print(f"✅ Trimmed: {output_path.name}")
+        return True
+    except ValueError as e:
+        print(f"⚠️  Smart cut not possible ({e}), cutting at packet boundaries")
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️  Smart cut failed ({e}), cutting at packet boundaries")
+    
     cmd = [
         "ffmpeg",
         "-i", str(input_path),
@@ -176,44 +167,120 @@ def trim_video(input_path, output_path, frames_to_trim=None, target_duration=Non
     ]
     
     try:
-        subprocess.run(cmd, check=True)
+        ffmpeg_runner.run(cmd, duration=new_duration, on_progress=ffmpeg_runner.progress_printer(output_path.name))
         print(f"✅ Trimmed: {output_path.name}")
         return True
     except subprocess.CalledProcessError as e:
         print(f"❌ Error trimming {output_path.name}: {e}")
         return False
 
-def main():
-    """Main function to download and process all resolutions."""
-    print("=" * 60)
-    print("M3U8 Video Downloader and Trimmer")
-    print("=" * 60)
+def download_all_single_pass(master_url, resolutions, output_dir, target_duration=None, audio_group=False):
+    """Download and trim all resolutions from one read of the master playlist.
     
-    # Check ffmpeg
-    if not check_ffmpeg():
-        sys.exit(1)
+    The master is parsed once for each resolution's video and audio media
+    playlists. A single ffmpeg process opens each of them once and writes one
+    output per resolution, with the trim applied as an output option, so every
+    segment is pulled from the origin only once. With audio_group the outputs
+    are video only and the audio of AUDIO_RESOLUTION is written once, to
+    landing_video_audio.mp4.
+    Returns the list of (resolution, output path) that were written, the
+    resolutions carrying their "video_url"/"audio_url".
+    """
+    print(f"\n📥 Downloading {len(resolutions)} resolutions in a single pass")
+    print(f"   Master URL: {master_url}")
     
-    # Create output directory
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    print(f"\n📁 Output directory: {OUTPUT_DIR.absolute()}")
+    try:
+        streams = resolve_streams(master_url, resolutions)
+    except (requests.RequestException, ValueError) as e:
+        print(f"❌ Could not read the master playlist: {e}")
+        return []
     
-    results = []
+    audio_stream = audio_source(streams) if audio_group else None
     
-    # Process each resolution
-    for resolution in RESOLUTIONS:
-        name = resolution["name"]
-        url = resolution["url"]
-        
-        # File paths
-        temp_file = OUTPUT_DIR / f"temp_{name}.mp4"
-        final_file = OUTPUT_DIR / f"landing_video_{name}.mp4"
-        
-        # Step 1: Download
-        if not download_m3u8(url, temp_file):
-            print(f"⚠️  Skipping {name} due to download error")
-            continue
-        
-        # Step 2: Trim
+    # One input per distinct media playlist, in first-use order
+    inputs = list(dict.fromkeys(
+        url for stream in streams for url in (stream["video_url"], stream["audio_url"])
+        if url and (not audio_stream or url == stream["video_url"] or stream is audio_stream)
+    ))
+    cmd = ["ffmpeg"]
+    for url in inputs:
+        cmd += ["-i", url]
+    
+    outputs = []
+    for stream in streams:
+        output_path = output_dir / f"landing_video_{stream['name']}.mp4"
+        video_input = inputs.index(stream["video_url"])
+        maps = ["-map", f"{video_input}:v:0"]
+        if audio_stream:
+            maps += ["-an"]  # Video only, the audio goes to its own output below
+        elif stream["audio_url"]:
+            maps += ["-map", f"{inputs.index(stream['audio_url'])}:a:0"]
+        else:
+            maps += ["-map", f"{video_input}:a:0?"]  # Audio muxed into the variant, if any
+        print(f"   {stream['name']}: inputs {' + '.join(m for m in maps[1::2])} -> {output_path.name}")
+        cmd += [
+            *maps,
+            "-c:v", "copy",
+            "-c:a", "copy",
+            "-bsf:a", "aac_adtstoasc",
+        ]
+        if target_duration is not None:
+            cmd += ["-t", str(target_duration)]  # Keep first N seconds
+        cmd += ["-y", str(output_path)]
+        outputs.append((stream, output_path))
+    
+    if audio_stream:
+        output_path = output_dir / "landing_video_audio.mp4"
+        if audio_stream["audio_url"]:
+            audio_map = f"{inputs.index(audio_stream['audio_url'])}:a:0"
+        else:
+            audio_map = f"{inputs.index(audio_stream['video_url'])}:a:0"
+        print(f"   audio ({audio_stream['name']}): input {audio_map} -> {output_path.name}")
+        cmd += ["-map", audio_map, "-c:a", "copy", "-bsf:a", "aac_adtstoasc"]
+        if target_duration is not None:
+            cmd += ["-t", str(target_duration)]
+        cmd += ["-y", str(output_path)]
+        outputs.append(({"name": "audio"}, output_path))
+    
+    if target_duration is not None:
+        print(f"   Trimming to {target_duration}s (0:00 - {int(target_duration // 60)}:{int(target_duration % 60):02d})")
+    
+    try:
+        ffmpeg_runner.run(
+            cmd, duration=target_duration, on_progress=ffmpeg_runner.progress_printer("single pass"),
+            label=f"single pass ({len(outputs)} outputs)"
+        )
+        print(f"✅ Downloaded and trimmed {len(outputs)} resolutions")
+        return outputs
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Error in single-pass download: {e}")
+        return []
+
+def audio_source(resolutions):
+    """The resolution whose audio is saved for the shared audio group (AUDIO_RESOLUTION, else the first)."""
+    return next((resolution for resolution in resolutions if resolution["name"] == AUDIO_RESOLUTION), resolutions[0])
+
+def download_and_trim(name, final_file, audio=True):
+    """Download one resolution into final_file and trim it (in a second pass if needed). Returns True on success."""
+    temp_file = final_file.with_name(f"temp_{final_file.name}")
+    
+    # Step 1: Download and trim in one remux (only the segments inside TARGET_DURATION
+    # are fetched when trimming by duration; frame-based trimming needs the real end)
+    download = download_m3u8(
+        name,
+        final_file,
+        target_duration=TARGET_DURATION,
+        frames_to_trim=FRAMES_TO_TRIM,
+        audio=audio
+    )
+    if not download:
+        print(f"⚠️  Skipping {name} due to download error")
+        return False
+    
+    # Step 2: Trim in a second pass, only when the playlist did not give the source duration
+    if download["source_duration"] is None:
+        print("⚠️  Source duration unknown, trimming in a second pass")
+        final_file.rename(temp_file)
         trim_success = trim_video(
             temp_file, 
             final_file, 
@@ -229,12 +296,91 @@ def main():
         # Clean up temp file
         if temp_file.exists() and final_file.exists():
             temp_file.unlink()
+    return True
+
+def download_audio(name, final_file):
+    """Download the audio rendition of one resolution into final_file, audio only. Returns True on success.
+    
+    Only the audio is fetched (see hls_client.download_audio), cut where
+    the already trimmed video-only file of that resolution ends.
+    """
+    video_file = OUTPUT_DIR / f"landing_video_{name}.mp4"
+    duration = media_probe.get_video_duration(video_file) if video_file.exists() else None
+    if duration is None:
+        print(f"❌ No trimmed {video_file.name} to cut the audio to")
+        return False
+    
+    print(f"\n📥 Downloading: {final_file.name}")
+    download = hls_client.download_audio(
+        M3U8_URL,
+        final_file,
+        resolution=name,
+        max_duration=TARGET_DURATION,
+        duration=duration
+    )
+    if not download:
+        print(f"❌ Error downloading {final_file.name}")
+        return False
+    print(f"✅ Audio: {final_file.name}")
+    return True
+
+def main():
+    """Main function to download and process all resolutions."""
+    parser = argparse.ArgumentParser(description='Download m3u8 video in multiple resolutions and trim it')
+    parser.add_argument('--single-pass', action='store_true',
+                       help='Open the master playlist once and write all trimmed resolutions from one ffmpeg run')
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("M3U8 Video Downloader and Trimmer")
+    print("=" * 60)
+    
+    # Check ffmpeg
+    if not check_ffmpeg():
+        sys.exit(1)
+    
+    # Create output directory
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    print(f"\n📁 Output directory: {OUTPUT_DIR.absolute()}")
+    
+    results = []
+    
+    # Frame-based trimming needs the source duration, which is only known after
+    # download, so it keeps the per-resolution download + trim path.
+    single_pass = args.single_pass and FRAMES_TO_TRIM is None
+    if args.single_pass and not single_pass:
+        print("⚠️  FRAMES_TO_TRIM is set, falling back to per-resolution download + trim")
+    
+    if single_pass:
+        outputs = download_all_single_pass(M3U8_URL, RESOLUTIONS, OUTPUT_DIR, TARGET_DURATION, AUDIO_GROUP)
+        for stream, final_file in outputs:
+            results.append({
+                "resolution": stream["name"],
+                "file": str(final_file),
+                "url": M3U8_URL
+            })
+    else:
+        # Process each resolution
+        for resolution in RESOLUTIONS:
+            name = resolution["name"]
+            final_file = OUTPUT_DIR / f"landing_video_{name}.mp4"
+            if not download_and_trim(name, final_file, audio=not AUDIO_GROUP):
+                continue
+            results.append({
+                "resolution": name,
+                "file": str(final_file),
+                "url": M3U8_URL
+            })
         
-        results.append({
-            "resolution": name,
-            "file": str(final_file),
-            "url": url
-        })
+        # The shared audio group, once
+        if AUDIO_GROUP:
+            final_file = OUTPUT_DIR / "landing_video_audio.mp4"
+            if download_audio(audio_source(RESOLUTIONS)["name"], final_file):
+                results.append({
+                    "resolution": "audio",
+                    "file": str(final_file),
+                    "url": M3U8_URL
+                })
     
     # Summary
     print("\n" + "=" * 60)
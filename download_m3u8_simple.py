@@ -8,6 +8,11 @@ import subprocess
 import sys
 from pathlib import Path
 
+import ffmpeg_runner
+import hls_client
+import media_probe
+import smart_cut
+
 # Configuration
 M3U8_URL = "https://video.twimg.com/amplify_video/1858525650694635520/pl/M1N2AhZP1we_u-at.m3u8?variant_version=1&tag=14"
 OUTPUT_DIR = Path("downloaded_videos")
@@ -28,71 +33,13 @@ def check_ffmpeg():
 
 def get_video_info(video_path):
     """Get video duration and FPS."""
-    try:
-        # Get duration
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(video_path)
-        ]
-        duration = float(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.strip())
-        
-        # Get FPS
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=r_frame_rate",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(video_path)
-        ]
-        fps_str = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.strip()
-        if "/" in fps_str:
-            num, den = map(int, fps_str.split("/"))
-            fps = num / den if den != 0 else 30.0
-        else:
-            fps = float(fps_str) if fps_str else 30.0
-        
-        return duration, fps
-    except Exception as e:
-        print(f"Warning: Could not get video info: {e}")
+    duration = media_probe.get_video_duration(video_path)
+    if duration is None:
         return None, None
+    return duration, media_probe.get_video_fps(video_path)
 
-def main():
-    print("=" * 60)
-    print("M3U8 Video Downloader (Simple)")
-    print("=" * 60)
-    
-    if not check_ffmpeg():
-        sys.exit(1)
-    
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    temp_file = OUTPUT_DIR / "temp_video.mp4"
-    final_file = OUTPUT_DIR / OUTPUT_NAME
-    
-    # Step 1: Download (ffmpeg will automatically select best quality)
-    print(f"\n📥 Downloading from: {M3U8_URL}")
-    print("   (ffmpeg will automatically select the best available resolution)")
-    
-    cmd = [
-        "ffmpeg",
-        "-i", M3U8_URL,
-        "-c", "copy",
-        "-bsf:a", "aac_adtstoasc",
-        "-y",
-        str(temp_file)
-    ]
-    
-    try:
-        subprocess.run(cmd, check=True)
-        print(f"✅ Downloaded: {temp_file.name}")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Download failed: {e}")
-        sys.exit(1)
-    
-    # Step 2: Get video info and trim
+def trim_downloaded_file(temp_file, final_file):
+    """Trim an untrimmed download into final_file, frame-exactly (two-pass fallback)."""
     duration, fps = get_video_info(temp_file)
     
     if duration:
@@ -126,7 +73,16 @@ def main():
             ]
             
             try:
-                subprocess.run(cmd, check=True)
+                try:
+                    if TARGET_DURATION is None:
+                        smart_cut.smart_cut(temp_file, final_file, frames_to_trim=FRAMES_TO_TRIM)
+                    else:
+                        smart_cut.smart_cut(temp_file, final_file, target_duration)
+                except (ValueError, subprocess.CalledProcessError) as e:
+                    print(f"⚠️  Smart cut failed ({e}), cutting at packet boundaries")
+                    ffmpeg_runner.run(
+                        cmd, duration=target_duration, on_progress=ffmpeg_runner.progress_printer(final_file.name)
+                    )
                 temp_file.unlink()
                 print(f"✅ Final video: {final_file.name}")
             except subprocess.CalledProcessError as e:
@@ -141,6 +97,41 @@ def main():
     else:
         print("⚠️  Could not get video info, skipping trim")
         temp_file.rename(final_file)
+
+def main():
+    print("=" * 60)
+    print("M3U8 Video Downloader (Simple)")
+    print("=" * 60)
+    
+    if not check_ffmpeg():
+        sys.exit(1)
+    
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    temp_file = OUTPUT_DIR / "temp_video.mp4"
+    final_file = OUTPUT_DIR / OUTPUT_NAME
+    
+    # Step 1: Download and trim in one remux (the HLS client picks the highest-bandwidth variant)
+    print(f"\n📥 Downloading from: {M3U8_URL}")
+    print("   (the best available resolution is selected automatically)")
+    
+    # Duration-based trims only need the segments inside TARGET_DURATION;
+    # frame-based trims need the real end of the stream
+    download = hls_client.download_hls(
+        M3U8_URL,
+        final_file,
+        max_duration=TARGET_DURATION,
+        frames_to_trim=FRAMES_TO_TRIM
+    )
+    if not download:
+        print("❌ Download failed")
+        sys.exit(1)
+    print(f"✅ Downloaded: {final_file.name}")
+    
+    # Step 2: Trim in a second pass, only when the playlist did not give the source duration
+    if download["source_duration"] is None:
+        print("⚠️  Source duration unknown, trimming in a second pass")
+        final_file.rename(temp_file)
+        trim_downloaded_file(temp_file, final_file)
     
     # Final info
     if final_file.exists():
@@ -1,11 +1,26 @@
 #!/usr/bin/env python3
 """
 Complete solution: Download m3u8 videos in all resolutions, trim them,
-upload to Firebase Storage, and generate m3u8 playlists for adaptive streaming.
+upload to Firebase Storage, and generate m3u8 playlists for adaptive streaming
+(plus a poster, scrub sprite and WebVTT thumbnail track, see thumbnails.py).
+
+With AUDIO_GROUP (not when streaming) audio is published once, as an
+#EXT-X-MEDIA audio group taken from one rendition (AUDIO_RENDITION); the
+video renditions are downloaded without audio and refer to the group, so
+players switch video bitrates without fetching the audio again.
 
 Usage:
   python3 download_upload_m3u8_complete.py          # Download, trim, and upload
   python3 download_upload_m3u8_complete.py --skip-download  # Skip download, just upload existing files
+  python3 download_upload_m3u8_complete.py --hls-layout fmp4  # Upload init + .m4s segments instead of byte ranges
+  python3 download_upload_m3u8_complete.py --force  # Rerun every stage, even if unchanged
+  python3 download_upload_m3u8_complete.py --stream  # Pipe ffmpeg into resumable uploads, no local MP4s
+  python3 download_upload_m3u8_complete.py --auto-trim  # Cut off the detected end card instead of at TARGET_DURATION
+  python3 download_upload_m3u8_complete.py --transcode generated.mp4  # Encode our own ladder instead of downloading one
+  python3 download_upload_m3u8_complete.py --muxed-audio  # Audio in every rendition instead of a shared audio group
+  python3 download_upload_m3u8_complete.py --ffmpeg-timeout 600  # Kill any ffmpeg run after 10 minutes
+
+Reruns skip every stage whose inputs and outputs are unchanged (see pipeline_state.py).
 """
 
 import subprocess
@@ -13,21 +28,57 @@ import os
 import sys
 import json
 import argparse
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urlparse, quote
+from urllib.parse import urlparse
+
+import ffmpeg_runner
+import gcs_storage
+import hls_client
+import hls_package
+import hls_playlist
+import media_probe
+import pipeline_executor
+import pipeline_state
+import smart_cut
+import thumbnails
+import transcode_ladder
 
 # Configuration
 M3U8_URL = "https://video.twimg.com/amplify_video/1858525650694635520/pl/M1N2AhZP1we_u-at.m3u8?variant_version=1&tag=14"
 OUTPUT_DIR = Path("downloaded_videos")
 TARGET_DURATION = 63  # 1 minute 3 seconds
+AUTO_TRIM = False  # Trim where end_card.py finds the end card/watermark (TARGET_DURATION is the fallback)
+THUMBNAILS = True  # Poster, scrub sprite and WebVTT track from the largest rendition (not when streaming)
 FIREBASE_STORAGE_PATH = "videos/landing"  # Path in Firebase Storage
 FIREBASE_PROJECT_ID = "genaivideogenerator"  # Auto-detected from google-services.json
+HLS_LAYOUT = "byterange"  # "byterange", "fmp4" or "single" (see hls_package.py)
+SEGMENT_DURATION = 6.0  # Target HLS segment length in seconds
+FAST_START = True  # Short first segment (hls_package.FIRST_SEGMENT_DURATION) so the landing video starts sooner
+IFRAME_PLAYLISTS = True  # #EXT-X-I-FRAMES-ONLY playlist per rendition for trick play and scrubbing (not "single")
+AUDIO_GROUP = True  # Audio once as a shared #EXT-X-MEDIA group, video-only renditions (False: audio muxed into each)
+AUDIO_RENDITION = None  # Rendition whose audio the group carries (None: the largest, which has the best audio)
+AUDIO_GROUP_ID = "audio"  # GROUP-ID of the shared audio rendition in the master playlist
+
+# Concurrent renditions per pipeline stage (see pipeline_executor.py)
+DOWNLOAD_WORKERS = 2  # Network-bound
+PROBE_WORKERS = 2  # CPU/disk-bound (ffprobe, ffmpeg segmenting)
+UPLOAD_WORKERS = 3  # Network-bound
+
+# Global caps across renditions and sources (see set_concurrency_limits)
+NETWORK_SLOTS = threading.BoundedSemaphore(4)  # Concurrent downloads/uploads
+FFMPEG_SLOTS = threading.BoundedSemaphore(os.cpu_count() or 1)  # Concurrent ffmpeg/ffprobe runs
 
-# Available resolutions from the m3u8 file
+# Fallback CODECS attribute when the output can't be probed
+DEFAULT_CODECS = "mp4a.40.2,avc1.640020"
+
+# Variants of M3U8_URL to publish; each is resolved in the master together with its audio rendition
+# (bandwidth is only a fallback; playlists use the bitrate measured from each trimmed file)
 RESOLUTIONS = [
-    {"name": "1280x720", "bandwidth": 2372879, "url": "https://video.twimg.com/amplify_video/1858525650694635520/pl/avc1/1280x720/mMcIfeVfjw-Z1J_D.m3u8"},
-    {"name": "640x360", "bandwidth": 889250, "url": "https://video.twimg.com/amplify_video/1858525650694635520/pl/avc1/640x360/cbYJT2bxdEuam1A5.m3u8"},
-    {"name": "480x270", "bandwidth": 308531, "url": "https://video.twimg.com/amplify_video/1858525650694635520/pl/avc1/480x270/P0RHyJWr6wy0B68H.m3u8"},
+    {"name": "1280x720", "bandwidth": 2372879, "url": M3U8_URL, "resolution": "1280x720"},
+    {"name": "640x360", "bandwidth": 889250, "url": M3U8_URL, "resolution": "640x360"},
+    {"name": "480x270", "bandwidth": 308531, "url": M3U8_URL, "resolution": "480x270"},
 ]
 
 def check_ffmpeg():
@@ -40,14 +91,15 @@ def check_ffmpeg():
         print("Install: brew install ffmpeg (macOS) or sudo apt-get install ffmpeg (Linux)")
         return False
 
-def check_gsutil():
-    """Check if gsutil is installed."""
+def check_storage_access():
+    """Check that Storage credentials are available (GOOGLE_OAUTH_ACCESS_TOKEN or gcloud)."""
     try:
-        subprocess.run(["gsutil", "version"], capture_output=True, check=True)
+        gcs_storage.get_access_token()
         return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("WARNING: gsutil is not installed")
-        print("Install: pip install gsutil or use Firebase CLI")
+    except gcs_storage.UploadError:
+        print("WARNING: No Google Cloud credentials found")
+        print("Install the Google Cloud SDK and run: gcloud auth login")
+        print("Or set GOOGLE_OAUTH_ACCESS_TOKEN")
         print("Alternative: Use Firebase Console to upload manually")
         return False
 
@@ -70,69 +122,39 @@ def get_firebase_config():
     
     return None, None
 
-def get_video_duration(video_path):
-    """Get video duration in seconds using ffprobe."""
-    try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(video_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
-    except Exception as e:
-        print(f"Warning: Could not get video duration: {e}")
-        return None
-
-def get_video_info(video_path):
-    """Get video resolution and codec info."""
-    try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height,codec_name",
-            "-of", "json",
-            str(video_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        data = json.loads(result.stdout)
-        stream = data.get("streams", [{}])[0]
-        return {
-            "width": stream.get("width"),
-            "height": stream.get("height"),
-            "codec": stream.get("codec_name", "h264")
-        }
-    except Exception as e:
-        print(f"Warning: Could not get video info: {e}")
-        return None
-
-def download_m3u8(m3u8_url, output_path):
-    """Download m3u8 video and convert to MP4."""
-    print(f"\n📥 Downloading: {output_path.name}")
+def download_m3u8(m3u8_url, output_path, target_duration=None, fragmented=False, resolution=None,
+                  frames_to_trim=None, auto_trim=False, audio=True):
+    """Download m3u8 video and convert to MP4, trimming it in the same remux.
     
-    cmd = [
-        "ffmpeg",
-        "-i", m3u8_url,
-        "-c", "copy",
-        "-bsf:a", "aac_adtstoasc",
-        "-y",
-        str(output_path)
-    ]
+    With target_duration only the segments covering that window are fetched
+    (frames_to_trim instead trims that many frames off the end). auto_trim
+    trims at the detected end card, if any (see end_card.py).
+    With fragmented the MP4 is written fragmented, ready for byte-range HLS.
+    resolution picks the variant when m3u8_url is a master playlist; without
+    audio only its video is kept (the audio is published as a shared group).
+    Returns the hls_client download result, or None on failure.
+    """
+    print(f"\n📥 Downloading: {output_path.name}")
     
-    try:
-        subprocess.run(cmd, check=True, capture_output=True)
+    download = hls_client.download_hls(
+        m3u8_url,
+        output_path,
+        resolution=resolution,
+        max_duration=target_duration,
+        frames_to_trim=frames_to_trim,
+        movflags=hls_package.FRAGMENT_MOVFLAGS if fragmented else None,
+        auto_trim=auto_trim,
+        audio=audio
+    )
+    if download:
         print(f"✅ Downloaded: {output_path.name}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error downloading {output_path.name}")
-        return False
+        return download
+    print(f"❌ Error downloading {output_path.name}")
+    return None
 
 def trim_video(input_path, output_path, target_duration):
-    """Trim video to specific duration."""
-    duration = get_video_duration(input_path)
+    """Trim video to specific duration, frame-exactly (see smart_cut.py)."""
+    duration = media_probe.get_video_duration(input_path)
     
     if duration is None:
         print("⚠️  Could not determine video duration. Skipping trim.")
@@ -146,6 +168,15 @@ def trim_video(input_path, output_path, target_duration):
     
     print(f"   Trimming to {target}s (0:00 - {int(target // 60)}:{int(target % 60):02d})")
     
+    try:
+        smart_cut.smart_cut(input_path, output_path, target)
+        print(f"✅ Trimmed: {output_path.name}")
+        return True
+    except ValueError as e:
+        print(f"⚠️  Smart cut not possible ({e}), cutting at packet boundaries")
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️  Smart cut failed ({e}), cutting at packet boundaries")
+    
     cmd = [
         "ffmpeg",
         "-i", str(input_path),
@@ -156,75 +187,90 @@ def trim_video(input_path, output_path, target_duration):
     ]
     
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
+        ffmpeg_runner.run(cmd, duration=target)
         print(f"✅ Trimmed: {output_path.name}")
         return True
     except subprocess.CalledProcessError as e:
-        print(f"❌ Error trimming {output_path.name}")
+        print(f"❌ Error trimming {output_path.name}: {e}")
         return False
 
 def upload_to_firebase_storage(file_path, storage_path, project_id, storage_bucket=None):
-    """Upload file to Firebase Storage using gsutil."""
+    """Upload file to Firebase Storage as a public-read object (pooled Storage API session).
+    
+    Media files get content-hashed names and immutable caching, playlists a
+    short max-age (see gcs_storage.object_name_for/cache_control_for).
+    """
     # Use storage_bucket if provided, otherwise fall back to default format
-    if storage_bucket:
-        bucket = f"gs://{storage_bucket}"
-    else:
-        bucket = f"gs://{project_id}.appspot.com"
-    gs_path = f"{bucket}/{storage_path}/{file_path.name}"
+    bucket_name = storage_bucket if storage_bucket else f"{project_id}.appspot.com"
     
     print(f"\n📤 Uploading to Firebase Storage...")
     print(f"   Local: {file_path.name}")
-    print(f"   Remote: {storage_path}/{file_path.name}")
-    
-    cmd = ["gsutil", "cp", str(file_path), gs_path]
     
     try:
-        subprocess.run(cmd, check=True)
-        
-        # Make file publicly readable
-        cmd_acl = ["gsutil", "acl", "ch", "-u", "AllUsers:R", gs_path]
-        subprocess.run(cmd_acl, check=True, capture_output=True)
-        
-        # Get public URL
-        bucket_name = storage_bucket if storage_bucket else f"{project_id}.appspot.com"
-        public_url = f"https://firebasestorage.googleapis.com/v0/b/{bucket_name}/o/{quote(storage_path, safe='')}%2F{quote(file_path.name, safe='')}?alt=media"
-        
+        object_name = f"{storage_path}/{gcs_storage.object_name_for(file_path)}"
+        print(f"   Remote: {object_name}")
+        upload = gcs_storage.upload_file(bucket_name, object_name, file_path)
         print(f"✅ Uploaded: {file_path.name}")
-        return public_url
-    except subprocess.CalledProcessError as e:
+        return upload["url"]
+    except (gcs_storage.UploadError, OSError) as e:
         print(f"❌ Upload failed: {e}")
         return None
 
-def generate_m3u8_playlist(resolutions_data, output_path, base_url):
-    """Generate master m3u8 playlist for adaptive streaming."""
-    print(f"\n📝 Generating m3u8 playlist...")
-    
-    lines = [
-        "#EXTM3U",
-        "#EXT-X-VERSION:6",
-        "#EXT-X-INDEPENDENT-SEGMENTS",
-        ""
-    ]
-    
-    # Add audio tracks (if you have separate audio, otherwise skip)
-    # For now, we'll assume audio is embedded in video
+def master_variant(res):
+    """Master playlist entry for an uploaded rendition, preferring values measured from the output file."""
+    return hls_playlist.Variant(
+        res["url"],
+        res["bandwidth"],
+        average_bandwidth=res.get("average_bandwidth"),
+        resolution=res.get("resolution") or res["name"],
+        codecs=res.get("codecs") or DEFAULT_CODECS,
+        audio=res.get("audio")
+    )
+
+def master_audio_media(audio):
+    """#EXT-X-MEDIA entry for the uploaded shared audio rendition."""
+    return hls_playlist.Media(
+        "AUDIO",
+        AUDIO_GROUP_ID,
+        "Audio",
+        uri=audio["url"],
+        default=True,
+        autoselect=True,
+        channels=audio.get("channels")
+    )
+
+def master_iframe_stream(res):
+    """#EXT-X-I-FRAME-STREAM-INF entry for a rendition with an uploaded I-frame playlist."""
+    iframes = res["iframes"]
+    return hls_playlist.IFrameStream(
+        iframes["url"],
+        iframes["bandwidth"],
+        average_bandwidth=iframes["average_bandwidth"],
+        resolution=res.get("resolution") or res["name"],
+        codecs=iframes["codecs"]
+    )
+
+def generate_m3u8_playlist(resolutions_data, output_path, audio=None):
+    """Generate master m3u8 playlist for adaptive streaming.
     
-    # Add video streams
-    for res in sorted(resolutions_data, key=lambda x: x['bandwidth'], reverse=True):
-        name = res['name']
-        width, height = name.split('x')
-        bandwidth = res['bandwidth']
-        url = res['url']
-        
-        # Generate individual m3u8 for this resolution
-        individual_m3u8 = f"{name}.m3u8"
-        individual_url = f"{base_url}/{individual_m3u8}"
-        
-        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={name},CODECS="mp4a.40.2,avc1.640020"')
-        lines.append(individual_url)
-        lines.append("")
+    Each variant points at the URL its media playlist was uploaded to, and
+    renditions with an I-frame playlist get an #EXT-X-I-FRAME-STREAM-INF.
+    With audio (the uploaded shared audio rendition) it is listed once as
+    the AUDIO_GROUP_ID group, which variants with an "audio" key refer to.
+    Problems found by hls_playlist.validate() are printed, the playlist is
+    written regardless.
+    """
+    print(f"\n📝 Generating m3u8 playlist...")
     
-    content = "\n".join(lines)
+    resolutions_data = sorted(resolutions_data, key=lambda x: x['bandwidth'] or 0, reverse=True)
+    master = hls_playlist.MasterPlaylist(
+        variants=[master_variant(res) for res in resolutions_data],
+        media=[master_audio_media(audio)] if audio else [],
+        iframe_streams=[master_iframe_stream(res) for res in resolutions_data if res.get("iframes")]
+    )
+    for problem in hls_playlist.validate(master):
+        print(f"⚠️  {problem}")
+    content = hls_playlist.dumps(master)
     
     with open(output_path, "w") as f:
         f.write(content)
@@ -236,40 +282,801 @@ def generate_individual_m3u8(video_url, output_path, duration):
     """Generate individual m3u8 playlist for a single resolution."""
     # For MP4 files, we create a simple m3u8 that points to the MP4
     # This works with ExoPlayer and most HLS players
-    lines = [
-        "#EXTM3U",
-        "#EXT-X-VERSION:6",
-        f"#EXTINF:{duration:.6f},",
-        video_url,
-        "#EXT-X-ENDLIST"
-    ]
+    playlist = hls_playlist.MediaPlaylist(segments=[hls_playlist.Segment(video_url, duration)])
+    return hls_playlist.write(playlist, output_path)
+
+def default_source():
+    """The landing video source configured at the top of this file.
     
-    content = "\n".join(lines)
+    A source is one HLS stream to publish (see batch_publish.py for manifests):
+    name prefixes every output file, renditions are RESOLUTIONS-style entries,
+    and trim rules, layout and storage path can differ per source.
+    """
+    return {
+        "name": "landing_video",
+        "url": M3U8_URL,
+        "renditions": RESOLUTIONS,
+        "target_duration": TARGET_DURATION,
+        "frames_to_trim": None,
+        "auto_trim": AUTO_TRIM,
+        "thumbnails": THUMBNAILS,
+        "input": None,  # A local video to encode the ladder from instead of downloading renditions
+        "ladder": None,  # Rungs for input (default: transcode_ladder.LADDER)
+        "storage_path": FIREBASE_STORAGE_PATH,
+        "output_dir": OUTPUT_DIR,
+        "hls_layout": HLS_LAYOUT,
+        "first_segment_duration": hls_package.FIRST_SEGMENT_DURATION if FAST_START else None,
+        "iframes": IFRAME_PLAYLISTS,
+        "audio_group": AUDIO_GROUP,
+        "audio_rendition": AUDIO_RENDITION,  # Rendition name the audio group is taken from (None: the largest)
+        "segment_duration": SEGMENT_DURATION,
+        "stream": False
+    }
+
+def set_concurrency_limits(max_transfers, max_ffmpeg):
+    """Cap concurrent network transfers and ffmpeg/ffprobe runs across all sources."""
+    global NETWORK_SLOTS, FFMPEG_SLOTS
+    NETWORK_SLOTS = threading.BoundedSemaphore(max_transfers)
+    FFMPEG_SLOTS = threading.BoundedSemaphore(max_ffmpeg)
+
+def upload_file(state, file_path, storage_path, project_id, storage_bucket):
+    """Upload a file unless the same content was already uploaded to the same path."""
+    def upload():
+        with NETWORK_SLOTS:
+            return upload_to_firebase_storage(file_path, storage_path, project_id, storage_bucket)
     
-    with open(output_path, "w") as f:
-        f.write(content)
+    return state.run_stage(
+        "upload", f"{storage_path}/{file_path.name}",
+        {
+            "project_id": project_id,
+            "storage_bucket": storage_bucket,
+            "object_name": gcs_storage.object_name_for(file_path),
+            "cache_control": gcs_storage.cache_control_for(gcs_storage.object_name_for(file_path))
+        },
+        upload,
+        inputs=[file_path]
+    )
+
+def download_rendition(rendition, final_file, hls_layout, target_duration=TARGET_DURATION, frames_to_trim=None,
+                       auto_trim=False, first_segment_duration=None, audio=True):
+    """Download and trim one rendition into final_file. Returns download info or None.
     
-    return content
+    With first_segment_duration the first GOP is split there for a short
+    first HLS segment (see add_startup_keyframe). Without audio the
+    rendition is video only.
+    """
+    temp_file = final_file.with_name(f"temp_{final_file.name}")
+    
+    # Step 1: Download and trim in one remux (only the segments inside target_duration)
+    with NETWORK_SLOTS:
+        download = download_m3u8(
+            rendition["url"],
+            final_file,
+            target_duration,
+            fragmented=hls_layout == "byterange",
+            resolution=rendition.get("resolution"),
+            frames_to_trim=frames_to_trim,
+            auto_trim=auto_trim,
+            audio=audio
+        )
+    if not download:
+        return None
+    
+    # Step 2: Trim in a second pass, only when the playlist did not give the source duration
+    # (and no end card was cut off already)
+    if download["source_duration"] is None and download["duration"] is None and target_duration:
+        print("⚠️  Source duration unknown, trimming in a second pass")
+        final_file.rename(temp_file)
+        with FFMPEG_SLOTS:
+            trimmed = trim_video(temp_file, final_file, target_duration)
+        if not trimmed:
+            print(f"⚠️  Trim failed for {final_file.name}, keeping original")
+            if temp_file.exists():
+                temp_file.rename(final_file)
+        
+        # Clean up temp file
+        if temp_file.exists() and final_file.exists():
+            temp_file.unlink()
+    
+    if first_segment_duration:
+        with FFMPEG_SLOTS:
+            add_startup_keyframe(final_file, first_segment_duration, fragmented=hls_layout == "byterange")
+    
+    # Byte-range HLS needs a fragmented MP4 (no-op when the remux already wrote one)
+    if hls_layout == "byterange":
+        with FFMPEG_SLOTS:
+            fragmented = hls_package.ensure_fragmented(final_file)
+        if not fragmented:
+            print(f"⚠️  Could not fragment {final_file.name}, its playlist will use a single segment")
+    
+    return {"source_duration": download["source_duration"]}
 
-def upload_existing_files(output_dir, storage_path, project_id, storage_bucket, has_gsutil):
-    """Upload existing files without downloading."""
-    files_to_upload = [
-        "landing_video_1280x720.mp4",
-        "landing_video_640x360.mp4",
-        "landing_video_480x270.mp4",
-        "landing_video_1280x720.m3u8",
-        "landing_video_640x360.m3u8",
-        "landing_video_480x270.m3u8",
-        "landing_video_master.m3u8",
-    ]
+def download_audio_rendition(rendition, final_file, hls_layout, video_duration, target_duration=TARGET_DURATION,
+                             auto_trim=False):
+    """Download the shared audio rendition into final_file, an audio-only MP4. Returns download info or None.
     
-    existing_files = []
-    for filename in files_to_upload:
-        file_path = output_dir / filename
-        if file_path.exists():
-            existing_files.append(file_path)
+    Only the audio is fetched (the variant's AUDIO group, see
+    hls_client.download_audio), cut at video_duration so it ends exactly
+    where the trimmed video renditions do (end cards are found in the video).
+    """
+    print(f"\n📥 Downloading: {final_file.name}")
+    with NETWORK_SLOTS:
+        download = hls_client.download_audio(
+            rendition["url"],
+            final_file,
+            resolution=rendition.get("resolution"),
+            max_duration=None if auto_trim else target_duration,
+            duration=video_duration
+        )
+    if not download:
+        return None
+    
+    # Byte-range HLS needs a fragmented MP4
+    if hls_layout == "byterange":
+        with FFMPEG_SLOTS:
+            fragmented = hls_package.ensure_fragmented(final_file)
+        if not fragmented:
+            print(f"⚠️  Could not fragment {final_file.name}, its playlist will use a single segment")
+    print(f"✅ Audio group: {final_file.name}")
+    return download
+
+def add_startup_keyframe(final_file, first_segment_duration, fragmented=False):
+    """Give final_file a keyframe at first_segment_duration, re-encoding only its first GOP.
+    
+    Without it the short first segment can only end at the source's first
+    keyframe. Keeps the file as it is when that is already early enough or
+    the split fails.
+    """
+    temp_file = final_file.with_name(f"faststart_{final_file.name}")
+    try:
+        split = smart_cut.split_first_gop(
+            final_file, temp_file, first_segment_duration,
+            movflags=hls_package.FRAGMENT_MOVFLAGS if fragmented else None
+        )
+    except (ValueError, subprocess.CalledProcessError) as e:
+        print(f"⚠️  Could not add a keyframe at {first_segment_duration:g}s to {final_file.name} ({e}), "
+              f"the first segment ends at the first keyframe")
+        temp_file.unlink(missing_ok=True)
+        return False
+    if split:
+        temp_file.replace(final_file)
+    return True
+
+def stream_rendition(rendition, object_name, bucket_name, target_duration=TARGET_DURATION, frames_to_trim=None,
+                     auto_trim=False):
+    """Remux a rendition from the network straight into a resumable upload.
+    
+    Nothing is written locally; the object is only committed if ffmpeg
+    succeeded and Storage's checksum matches. Returns upload info or None.
+    """
+    print(f"\n📡 Streaming: {object_name}")
+    with NETWORK_SLOTS:
+        stream = hls_client.stream_hls(
+            rendition["url"],
+            resolution=rendition.get("resolution"),
+            max_duration=target_duration,
+            frames_to_trim=frames_to_trim,
+            movflags=hls_package.FRAGMENT_MOVFLAGS,
+            auto_trim=auto_trim,
+            on_progress=ffmpeg_runner.progress_printer(object_name),
+            label=object_name
+        )
+        if not stream:
+            return None
+        job, download = stream
+        try:
+            upload = gcs_storage.upload_stream(
+                bucket_name,
+                object_name,
+                job.stdout,
+                before_commit=lambda: job.wait(check=False)["returncode"] == 0
+            )
+        except gcs_storage.UploadError as e:
+            job.kill()
+            try:
+                job.wait()
+                error = None
+            except ffmpeg_runner.FfmpegError as ffmpeg_error:
+                error = ffmpeg_error
+            print(f"❌ Streaming upload failed: {e}" + (f"\n   {error}" if error else ""))
+            return None
+    
+    print(f"✅ Uploaded: {object_name} ({upload['size'] / (1024 * 1024):.2f} MB)")
+    return {
+        "url": upload["url"],
+        "md5": upload["md5"],
+        "duration": download["duration"] or download["source_duration"]
+    }
+
+def shares_audio(source):
+    """Whether a source publishes its audio once as a shared group (not when streaming, which keeps no local file)."""
+    return bool(source.get("audio_group")) and not source.get("stream")
+
+def first_segment_duration(source):
+    """The short first segment length of a source, None when it has none (or its layout has no segments)."""
+    if source["hls_layout"] == "single" or source.get("stream"):
+        return None
+    return source.get("first_segment_duration")
+
+def transcode_source(state, source):
+    """Encode a local source's ladder in one ffmpeg run (see transcode_ladder.py). Returns its renditions."""
+    ladder = source.get("ladder") or transcode_ladder.LADDER
+    movflags = hls_package.FRAGMENT_MOVFLAGS if source["hls_layout"] == "byterange" else transcode_ladder.MOVFLAGS
+    
+    def transcode():
+        print(f"\n{'='*70}")
+        print(f"Transcoding: {source['input']}")
+        print(f"{'='*70}")
+        with FFMPEG_SLOTS, ffmpeg_runner.job_context(f"{source['name']}/transcode"):
+            return transcode_ladder.transcode(
+                source["input"], source["output_dir"], source["name"], ladder, movflags, first_segment_duration(source),
+                shares_audio(source)
+            )
+    
+    renditions = state.run_stage(
+        "transcode", source["name"],
+        {
+            "ladder": ladder,
+            "gop": transcode_ladder.GOP_SECONDS,
+            "movflags": movflags,
+            "first_keyframe": first_segment_duration(source),
+            "shared_audio": shares_audio(source)
+        },
+        transcode,
+        inputs=[Path(source["input"])],
+        outputs=lambda renditions: [rendition["file"] for rendition in renditions]
+    )
+    print(f"✅ Encoded {len(renditions)} keyframe-aligned renditions")
+    return [{**rendition, "url": None} for rendition in renditions]
+
+def rendition_pixels(rendition):
+    """Pixel count from a rendition name like "1280x720" (0 if it isn't one)."""
+    width, _, height = rendition["name"].partition("x")
+    return int(width) * int(height) if width.isdigit() and height.isdigit() else 0
+
+def audio_rendition(source):
+    """The pseudo-rendition of a source's shared audio group, taken from its audio_rendition (default: the largest)."""
+    renditions = source["renditions"]
+    origin = next((rendition for rendition in renditions if rendition["name"] == source.get("audio_rendition")), None)
+    if source.get("audio_rendition") and not origin:
+        print(f"⚠️  No rendition named {source['audio_rendition']}, taking the audio from the largest one")
+    origin = origin or max(renditions, key=rendition_pixels)
+    return {**origin, "name": "audio", "origin": origin["name"], "audio_only": True}
+
+def generate_thumbnails(final_file, output_dir, name):
+    """Poster, sprite sheet and tile layout of a rendition in one decode, or None on failure."""
+    print(f"\n🖼️  Thumbnails: {name}")
+    try:
+        with FFMPEG_SLOTS:
+            images = thumbnails.generate(final_file, output_dir, name)
+    except (ValueError, subprocess.CalledProcessError) as e:
+        print(f"⚠️  Could not generate thumbnails for {name}: {e}")
+        return None
+    print(f"✅ Poster and {len(images['tiles'])}-tile sprite from {final_file.name}")
+    return {"poster": str(images["poster"]), "sprite": str(images["sprite"]), "tiles": images["tiles"]}
+
+def publish_thumbnails(state, images, vtt_path, upload_target):
+    """Upload the poster and sprite, then write and upload the WebVTT track pointing at the sprite."""
+    poster = Path(images["poster"])
+    sprite = Path(images["sprite"])
+    if upload_target:
+        poster_url = upload_file(state, poster, *upload_target)
+        sprite_url = upload_file(state, sprite, *upload_target)
+    else:
+        poster_url = f"MANUAL_UPLOAD_REQUIRED/{poster.name}"
+        sprite_url = None
+    # Not uploaded: the track references the sprite next to it
+    thumbnails.write_vtt(images["tiles"], sprite_url or sprite.name, vtt_path)
+    if upload_target and sprite_url:
+        vtt_url = upload_file(state, vtt_path, *upload_target)
+    else:
+        vtt_url = f"MANUAL_UPLOAD_REQUIRED/{vtt_path.name}"
+    return {"poster_url": poster_url, "sprite_url": sprite_url, "thumbnails_vtt_url": vtt_url}
+
+def probe_rendition(final_file, segment_duration):
+    """Get video info and the measured playlist attributes of a rendition."""
+    # One cached ffprobe run serves both lookups
+    with FFMPEG_SLOTS:
+        return {
+            "video_info": media_probe.get_video_info(final_file),
+            "duration": media_probe.get_video_duration(final_file),
+            "variant_stats": media_probe.get_variant_stats(final_file, window=segment_duration)
+        }
+
+def package_fmp4_rendition(state, final_file, segment_duration, upload_target, first_segment_duration=None,
+                           iframes=False):
+    """Split a rendition into init + .m4s segments (and their I-frame playlist) and upload them."""
+    try:
+        with FFMPEG_SLOTS:
+            media_playlist, segment_files = hls_package.package_fmp4(
+                final_file,
+                final_file.with_name(f"{final_file.stem}_hls"),
+                final_file.stem,
+                segment_duration,
+                first_segment_duration,
+                iframes
+            )
+    except (subprocess.CalledProcessError, ValueError) as e:
+        print(f"⚠️  Could not split {final_file.name} into segments: {e}")
+        return None
+    
+    segment_urls = {}
+    if upload_target:
+        for segment_file in segment_files:
+            segment_url = upload_file(state, segment_file, *upload_target)
+            if segment_url:
+                segment_urls[segment_file.name] = segment_url
+    if len(segment_urls) < len(segment_files):
+        print(f"⚠️  Not every segment of {final_file.stem} was uploaded")
+        media_playlist = None
+    iframe_playlist = hls_package.iframe_playlist_path(media_playlist) if media_playlist and iframes else None
+    return {
+        "hls_playlist": str(media_playlist) if media_playlist else None,
+        "iframe_playlist": str(iframe_playlist) if iframe_playlist else None,
+        "segment_urls": segment_urls
+    }
+
+def write_rendition_playlist(result, m3u8_path, hls_layout, segment_duration, duration=TARGET_DURATION,
+                             first_segment_duration=None):
+    """Write the media playlist of one uploaded rendition in the chosen layout."""
+    # URL for the MP4 file
+    video_url = result["url"]
+    
+    try:
+        if hls_layout == "byterange":
+            hls_package.package_byterange(
+                Path(result["file"]), video_url, m3u8_path, segment_duration, first_segment_duration
+            )
+        elif hls_layout == "fmp4" and result["hls_playlist"]:
+            hls_package.rewrite_segment_uris(result["hls_playlist"], result["segment_urls"].get, m3u8_path)
+        else:
+            raise ValueError("no segmented output")
+    except (ValueError, OSError) as e:
+        if hls_layout != "single":
+            print(f"⚠️  {hls_layout} packaging failed for {result['resolution']} ({e}), using a single segment")
+        generate_individual_m3u8(
+            video_url,
+            m3u8_path,
+            result.get("duration") or duration
+        )
+    return str(m3u8_path)
+
+def write_iframe_playlist(result, iframe_path, hls_layout):
+    """Write the I-frame playlist of one uploaded rendition, addressing the same files as its media playlist.
+    
+    Returns the #EXT-X-I-FRAME-STREAM-INF values {"bandwidth",
+    "average_bandwidth", "codecs"}, or None when the rendition has none.
+    """
+    try:
+        if hls_layout == "byterange":
+            hls_package.package_iframes(Path(result["file"]), result["url"], iframe_path)
+        elif hls_layout == "fmp4" and result["iframe_playlist"]:
+            hls_package.rewrite_segment_uris(result["iframe_playlist"], result["segment_urls"].get, iframe_path)
+        else:
+            return None
+        bandwidth = hls_package.iframe_bandwidth(hls_playlist.load(iframe_path))
+    except (ValueError, OSError) as e:
+        print(f"⚠️  No I-frame playlist for {result['resolution']} ({e})")
+        return None
+    stream = media_probe.get_stream(media_probe.probe(result["file"]), "video")
+    return {
+        "bandwidth": bandwidth["peak"],
+        "average_bandwidth": bandwidth["average"],
+        "codecs": media_probe.get_stream_codec_string(stream) if stream else None
+    }
+
+def publish_renditions(state, source, upload_target):
+    """Run every rendition of a source through the download/probe/upload/playlist DAG.
+    
+    Renditions overlap: one can download while another is probed or uploaded.
+    Returns (results, individual_playlists, thumbnail_urls): the first two in
+    rendition order, with None in individual_playlists for renditions whose
+    playlist was not uploaded; thumbnail_urls is None unless thumbnails were
+    published (from the largest rendition, not when streaming). With a
+    shared audio group the video renditions are video only and the audio
+    rendition comes last, its result marked "audio_only".
+    """
+    hls_layout = source["hls_layout"]
+    segment_duration = source["segment_duration"]
+    first_segment = first_segment_duration(source)
+    iframes = bool(source.get("iframes")) and hls_layout != "single"
+    shared_audio = shares_audio(source)
+    output_dir = Path(source["output_dir"])
+    renditions = list(source["renditions"])
+    audio = audio_rendition(source) if shared_audio else None
+    if audio:
+        renditions.append(audio)
+    # Download of the rendition the audio is taken from; the audio is cut where its video ends
+    origin_download = Future()
+    
+    def rendition_file(rendition):
+        return output_dir / f"{source['name']}_{rendition['name']}.mp4"
+    
+    def origin_duration():
+        # The origin was queued before the audio, so it is already downloading
+        if not origin_download.result():
+            raise ValueError(f"{audio['origin']} was not downloaded, its audio can't be cut to match")
+        duration = media_probe.get_video_duration(output_dir / f"{source['name']}_{audio['origin']}.mp4")
+        if duration is None:
+            raise ValueError(f"Could not read the duration of {audio['origin']}")
+        return duration
+    
+    def download(rendition, final_file):
+        if rendition.get("audio_only"):
+            return download_audio_rendition(
+                rendition, final_file, hls_layout, origin_duration(), source["target_duration"], source["auto_trim"]
+            )
+        return download_rendition(
+            rendition, final_file, hls_layout, source["target_duration"], source["frames_to_trim"],
+            source["auto_trim"], first_segment, audio=not shared_audio
+        )
+    
+    # Steps 1-2: Download and trim
+    def download_stage(rendition, _):
+        final_file = rendition_file(rendition)
+        if source.get("input"):
+            # Encoded locally by transcode_source(), nothing to download
+            return {"source_duration": None} if final_file.exists() else None
+        print(f"\n{'='*70}")
+        print(f"Processing: {final_file.stem}")
+        print(f"{'='*70}")
+        download_info = None
+        try:
+            download_info = state.run_stage(
+                "download", final_file.stem,
+                {
+                    "url": rendition["url"],
+                    "resolution": rendition.get("resolution"),
+                    "target_duration": source["target_duration"],
+                    "frames_to_trim": source["frames_to_trim"],
+                    "auto_trim": source["auto_trim"],
+                    "fragmented": hls_layout == "byterange",
+                    "first_segment_duration": first_segment,
+                    "audio": not shared_audio,
+                    "audio_only": bool(rendition.get("audio_only"))
+                },
+                lambda: download(rendition, final_file),
+                outputs=[final_file]
+            )
+        finally:
+            if audio and rendition["name"] == audio["origin"]:
+                origin_download.set_result(download_info)
+        if not download_info:
+            print(f"⚠️  Skipping {final_file.stem} due to download error")
+        return download_info
+    
+    # Poster, scrub sprite and WebVTT track, decoded once from the largest rendition
+    thumbnail_rendition = max(source["renditions"], key=rendition_pixels) if source.get("thumbnails") else None
+    
+    def thumbnails_stage(rendition, _):
+        if rendition is not thumbnail_rendition:
+            return None
+        final_file = rendition_file(rendition)
+        images = state.run_stage(
+            "thumbnails", source["name"],
+            {
+                "count": thumbnails.THUMBNAIL_COUNT,
+                "width": thumbnails.THUMBNAIL_WIDTH,
+                "poster_time": thumbnails.POSTER_TIME,
+                "format": thumbnails.IMAGE_FORMAT
+            },
+            lambda: generate_thumbnails(final_file, output_dir, source["name"]),
+            inputs=[final_file],
+            outputs=lambda images: [images["poster"], images["sprite"]]
+        )
+        if not images:
+            return None
+        return publish_thumbnails(state, images, output_dir / f"{source['name']}_thumbnails.vtt", upload_target)
+    
+    # Step 3: Get video info and measure BANDWIDTH/AVERAGE-BANDWIDTH/CODECS
+    def probe_stage(rendition, _):
+        final_file = rendition_file(rendition)
+        return state.run_stage(
+            "probe", final_file.stem,
+            {"window": segment_duration},
+            lambda: probe_rendition(final_file, segment_duration),
+            inputs=[final_file]
+        )
+    
+    # Step 4: Upload to Firebase Storage
+    def upload_stage(rendition, _):
+        if not upload_target:
+            return {"url": None}
+        return {"url": upload_file(state, rendition_file(rendition), *upload_target)}
+    
+    # Step 5: Split into init + .m4s segments and upload them (fmp4 layout)
+    def package_stage(rendition, _):
+        package = {"hls_playlist": None, "iframe_playlist": None, "segment_urls": {}}
+        if hls_layout != "fmp4":
+            return package
+        final_file = rendition_file(rendition)
+        with_iframes = iframes and not rendition.get("audio_only")
+        return state.run_stage(
+            "package", final_file.stem,
+            {
+                "segment_duration": segment_duration,
+                "upload_target": upload_target,
+                "first_segment_duration": first_segment,
+                "iframes": with_iframes
+            },
+            lambda: package_fmp4_rendition(
+                state, final_file, segment_duration, upload_target, first_segment, with_iframes
+            ),
+            inputs=[final_file],
+            outputs=lambda package: [package["hls_playlist"]] if package["hls_playlist"] else []
+        ) or package
+    
+    def rendition_stage(rendition, inputs):
+        final_file = rendition_file(rendition)
+        probe = inputs["probe"]
+        package = inputs["package"]
+        video_info = probe["video_info"]
+        variant_stats = probe["variant_stats"]
+        return {
+            "resolution": rendition["name"],
+            "bandwidth": variant_stats["bandwidth"] or rendition.get("bandwidth"),
+            "average_bandwidth": variant_stats["average_bandwidth"],
+            "codecs": variant_stats["codecs"],
+            "file": str(final_file),
+            "url": inputs["upload"]["url"] or f"MANUAL_UPLOAD_REQUIRED/{final_file.name}",
+            "width": video_info.get("width") if video_info else None,
+            "height": video_info.get("height") if video_info else None,
+            "codec": video_info.get("codec") if video_info else None,
+            "duration": probe["duration"],
+            "hls_playlist": package["hls_playlist"],
+            "iframe_playlist": package.get("iframe_playlist"),
+            "segment_urls": package["segment_urls"],
+            "audio_only": bool(rendition.get("audio_only"))
+        }
+    
+    # I-frame playlist next to the media playlist, for trick play and scrubbing
+    def iframe_stage(result, m3u8_path):
+        if not iframes or result["audio_only"]:
+            return None
+        iframe_path = hls_package.iframe_playlist_path(m3u8_path)
+        stream = state.run_stage(
+            "iframes", iframe_path.stem,
+            {"video_url": result["url"], "layout": hls_layout, "segment_urls": result["segment_urls"]},
+            lambda: write_iframe_playlist(result, iframe_path, hls_layout),
+            inputs=[result["file"]],
+            outputs=lambda stream: [iframe_path] if stream else []
+        )
+        if not stream:
+            return None
+        if upload_target:
+            iframe_url = upload_file(state, iframe_path, *upload_target)
         else:
-            print(f"⚠️  Missing: {filename}")
+            iframe_url = f"MANUAL_UPLOAD_REQUIRED/{iframe_path.name}"
+        return {**stream, "url": iframe_url}
+    
+    # Step 6: Generate and upload the individual m3u8
+    def playlist_stage(rendition, inputs):
+        result = inputs["rendition"]
+        if not result["url"].startswith("https://"):
+            return None
+        m3u8_path = rendition_file(rendition).with_suffix(".m3u8")
+        
+        state.run_stage(
+            "playlist", m3u8_path.stem,
+            {
+                "video_url": result["url"],
+                "layout": hls_layout,
+                "segment_duration": segment_duration,
+                "first_segment_duration": first_segment,
+                "segment_urls": result["segment_urls"],
+                "duration": result["duration"]
+            },
+            lambda: write_rendition_playlist(
+                result, m3u8_path, hls_layout, segment_duration, source["target_duration"] or TARGET_DURATION,
+                first_segment
+            ),
+            inputs=[result["file"]] if result["file"] else [],
+            outputs=[m3u8_path]
+        )
+        
+        # Upload m3u8 to Firebase Storage
+        if upload_target:
+            m3u8_public_url = upload_file(state, m3u8_path, *upload_target)
+        else:
+            m3u8_public_url = f"MANUAL_UPLOAD_REQUIRED/{m3u8_path.name}"
+        # The fMP4 playlist as packaged still names the local segment files
+        segmented = result["hls_playlist"] if hls_layout == "fmp4" and result["hls_playlist"] else m3u8_path
+        return {
+            "resolution": result["resolution"],
+            "url": m3u8_public_url,
+            "iframes": iframe_stage(result, m3u8_path),
+            "segment_bandwidth": hls_package.segment_bandwidth(segmented)
+        }
+
+    
+    # Streaming: steps 1-4 in one pass, ffmpeg piped into the upload
+    def stream_stage(rendition, _):
+        object_name = f"{source['storage_path']}/{rendition_file(rendition).name}"
+        bucket_name = upload_target[2] or f"{upload_target[1]}.appspot.com"
+        return state.run_stage(
+            "stream", object_name,
+            {
+                "url": rendition["url"],
+                "resolution": rendition.get("resolution"),
+                "target_duration": source["target_duration"],
+                "frames_to_trim": source["frames_to_trim"],
+                "auto_trim": source["auto_trim"],
+                "bucket": bucket_name
+            },
+            lambda: stream_rendition(
+                rendition, object_name, bucket_name, source["target_duration"], source["frames_to_trim"],
+                source["auto_trim"]
+            )
+        )
+    
+    def streamed_rendition_stage(rendition, inputs):
+        upload = inputs["stream"]
+        return {
+            "resolution": rendition["name"],
+            "bandwidth": rendition.get("bandwidth"),
+            "average_bandwidth": None,
+            "codecs": None,
+            "file": None,
+            "url": upload["url"],
+            "width": None,
+            "height": None,
+            "codec": None,
+            "duration": upload["duration"],
+            "hls_playlist": None,
+            "iframe_playlist": None,
+            "segment_urls": {},
+            "audio_only": False
+        }
+    
+    # ffmpeg jobs are reported per source/rendition (see ffmpeg_runner.report)
+    def tagged(func):
+        def stage(rendition, inputs):
+            with ffmpeg_runner.job_context(f"{source['name']}/{rendition['name']}"):
+                return func(rendition, inputs)
+        return stage
+    
+    if source.get("stream"):
+        stages = [
+            pipeline_executor.Stage("stream", stream_stage, workers=DOWNLOAD_WORKERS),
+            pipeline_executor.Stage("rendition", streamed_rendition_stage, after=["stream"]),
+        ]
+    else:
+        stages = [
+            pipeline_executor.Stage("download", tagged(download_stage), workers=DOWNLOAD_WORKERS),
+            pipeline_executor.Stage("probe", probe_stage, workers=PROBE_WORKERS, after=["download"]),
+            pipeline_executor.Stage("upload", upload_stage, workers=UPLOAD_WORKERS, after=["download"]),
+            pipeline_executor.Stage("package", tagged(package_stage), workers=PROBE_WORKERS, after=["download"]),
+            pipeline_executor.Stage("rendition", rendition_stage, after=["probe", "upload", "package"]),
+            pipeline_executor.Stage("thumbnails", tagged(thumbnails_stage), workers=PROBE_WORKERS, after=["download"]),
+        ]
+    stages.append(pipeline_executor.Stage("playlist", playlist_stage, workers=UPLOAD_WORKERS, after=["rendition"]))
+    outputs = pipeline_executor.Pipeline(stages).run(renditions)
+    
+    results = [output["rendition"] for output in outputs if "rendition" in output]
+    individual_playlists = [output.get("playlist") for output in outputs if "rendition" in output]
+    thumbnail_urls = next((output["thumbnails"] for output in outputs if "thumbnails" in output), None)
+    return results, individual_playlists, thumbnail_urls
+
+def publish_source(state, source, project_id, storage_bucket, can_upload):
+    """Download, trim, upload and write playlists for one source.
+    
+    Writes and returns the source's upload_results.json data.
+    """
+    output_dir = Path(source["output_dir"])
+    storage_path = source["storage_path"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    upload_target = (storage_path, project_id, storage_bucket) if can_upload and project_id else None
+    if source.get("input"):
+        if source.get("stream"):
+            raise ValueError("A transcoded source is encoded locally, it can't be streamed")
+        source = {**source, "renditions": transcode_source(state, source)}
+    if source.get("stream"):
+        if not upload_target:
+            raise ValueError("Streaming needs an upload target (Storage credentials and a Firebase project)")
+        if source["hls_layout"] != "single":
+            # Byte ranges and fMP4 segments are cut from a local file
+            print(f"⚠️  Streaming keeps no local MP4, using the single layout instead of {source['hls_layout']}")
+            source = {**source, "hls_layout": "single"}
+    if not upload_target:
+        print(f"\n⏭️  Skipping upload (manual upload required)")
+        print(f"   Upload the files in: {output_dir.absolute()}")
+        print(f"   To: {storage_path}/")
+    
+    # Download, trim, probe, upload and write playlists, overlapping renditions
+    results, individual_playlists, thumbnail_urls = publish_renditions(state, source, upload_target)
+    
+    # Generate master m3u8 playlist
+    master_m3u8_path = output_dir / f"{source['name']}_master.m3u8"
+    master_url = None
+    
+    # BANDWIDTH/AVERAGE-BANDWIDTH from the segments as packaged, where there are several
+    for result, playlist in zip(results, individual_playlists):
+        if playlist and playlist["segment_bandwidth"]:
+            result["bandwidth"] = playlist["segment_bandwidth"]["peak"]
+            result["average_bandwidth"] = playlist["segment_bandwidth"]["average"]
+    
+    # The shared audio rendition, listed once in the master as the AUDIO_GROUP_ID group
+    audio = None
+    for result, playlist in zip(results, individual_playlists):
+        if result["audio_only"] and playlist and playlist["url"] and playlist["url"].startswith("https://"):
+            stream = media_probe.get_stream(media_probe.probe(result["file"]), "audio")
+            audio = {
+                "url": playlist["url"],
+                "bandwidth": result["bandwidth"] or 0,
+                "average_bandwidth": result["average_bandwidth"] or 0,
+                "codecs": result["codecs"],
+                "channels": str(stream["channels"]) if stream and stream.get("channels") else None
+            }
+    if shares_audio(source) and not audio and (upload_target or not any(result["audio_only"] for result in results)):
+        # The video renditions are video only, publishing them would be silent
+        raise ValueError("The audio rendition was not published (--muxed-audio keeps the audio in every rendition)")
+    
+    # Update results with m3u8 URLs for master playlist
+    master_playlist_data = []
+    for result, playlist in zip(results, individual_playlists):
+        if result["audio_only"]:
+            continue
+        if playlist and playlist["url"] and playlist["url"].startswith("https://"):
+            variant = {
+                "name": result["resolution"],
+                "bandwidth": result["bandwidth"],
+                "average_bandwidth": result["average_bandwidth"],
+                "codecs": result["codecs"],
+                "resolution": f"{result['width']}x{result['height']}" if result["width"] else None,
+                "url": playlist["url"],
+                "iframes": playlist["iframes"] if playlist["iframes"] and playlist["iframes"]["url"].startswith("https://") else None
+            }
+            if audio:
+                # BANDWIDTH and CODECS of a variant cover the audio rendition played with it
+                variant["bandwidth"] = (variant["bandwidth"] or 0) + audio["bandwidth"]
+                if variant["average_bandwidth"]:
+                    variant["average_bandwidth"] += audio["average_bandwidth"]
+                if variant["codecs"] and audio["codecs"]:
+                    variant["codecs"] = f"{audio['codecs']},{variant['codecs']}"
+                variant["audio"] = AUDIO_GROUP_ID
+            master_playlist_data.append(variant)
+    
+    if master_playlist_data:
+        generate_m3u8_playlist(master_playlist_data, master_m3u8_path, audio)
+        
+        # Upload master m3u8 (skipped when its content is unchanged)
+        if upload_target:
+            master_url = upload_file(state, master_m3u8_path, *upload_target)
+        else:
+            master_url = f"MANUAL_UPLOAD_REQUIRED/{master_m3u8_path.name}"
+    
+    # Save results to JSON
+    json_output = output_dir / "upload_results.json"
+    output_data = {
+        "master_playlist_url": master_url,
+        "resolutions": results,
+        "individual_playlists": individual_playlists,
+        "audio": audio,
+        "ffmpeg_jobs": ffmpeg_runner.history(source["name"]),
+        "thumbnails": thumbnail_urls,
+        "firebase_storage_path": storage_path,
+        "project_id": project_id,
+        "storage_bucket": storage_bucket
+    }
+    
+    with open(json_output, "w") as f:
+        json.dump(output_data, f, indent=2)
+    
+    print(f"\n📄 Results saved to: {json_output}")
+    return output_data
+
+def upload_existing_files(output_dir, storage_path, project_id, storage_bucket, can_upload, state):
+    """Upload existing files without downloading (unchanged files are skipped)."""
+    # The master playlist and everything it references (media, audio and I-frame playlists, MP4s and segments)
+    master = output_dir / "landing_video_master.m3u8"
+    if not master.exists():
+        print(f"⚠️  Missing: {master.name}")
+        print("\n❌ No files found to upload!")
+        return
+    existing_files, missing_files = gcs_storage.playlist_files(master)
+    for filename in missing_files:
+        print(f"⚠️  Missing: {filename}")
     
     if not existing_files:
         print("\n❌ No files found to upload!")
@@ -277,12 +1084,13 @@ def upload_existing_files(output_dir, storage_path, project_id, storage_bucket,
     
     print(f"\n📦 Found {len(existing_files)} files to upload")
     
-    uploaded_urls = {}
-    for file_path in existing_files:
-        print(f"\n📤 Uploading: {file_path.name}")
-        url = upload_to_firebase_storage(file_path, storage_path, project_id, storage_bucket)
-        if url:
-            uploaded_urls[file_path.name] = url
+    # Upload in parallel over the pooled Storage session
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        urls = executor.map(
+            lambda file_path: upload_file(state, file_path, storage_path, project_id, storage_bucket),
+            existing_files
+        )
+        uploaded_urls = {file_path.name: url for file_path, url in zip(existing_files, urls) if url}
     
     # Find master playlist URL
     master_url = uploaded_urls.get("landing_video_master.m3u8")
@@ -307,7 +1115,29 @@ def main():
     parser = argparse.ArgumentParser(description='Download, trim, and upload m3u8 videos to Firebase Storage')
     parser.add_argument('--skip-download', action='store_true', 
                        help='Skip download/trim, just upload existing files')
+    parser.add_argument('--hls-layout', choices=hls_package.LAYOUTS, default=HLS_LAYOUT,
+                       help='Media playlist layout: byte ranges into one MP4, fMP4 segment files, or one EXTINF per MP4')
+    parser.add_argument('--segment-duration', type=float, default=SEGMENT_DURATION,
+                       help='Target HLS segment duration in seconds')
+    parser.add_argument('--first-segment-duration', type=float, metavar='SECONDS',
+                       default=hls_package.FIRST_SEGMENT_DURATION if FAST_START else 0,
+                       help='Length of a short first segment for a faster start (0: all segments the same length)')
+    parser.add_argument('--force', action='store_true',
+                       help='Ignore the pipeline state and rerun every stage')
+    parser.add_argument('--stream', action='store_true',
+                       help='Pipe ffmpeg straight into resumable uploads instead of writing local MP4s')
+    parser.add_argument('--transcode', type=Path, metavar='VIDEO',
+                       help='Encode the rendition ladder from this local video instead of downloading it')
+    parser.add_argument('--auto-trim', action='store_true',
+                       help='Trim where the end card or watermark starts (see end_card.py) instead of at TARGET_DURATION')
+    parser.add_argument('--muxed-audio', action='store_true',
+                       help='Mux the audio into every rendition instead of publishing one shared audio group')
+    parser.add_argument('--audio-rendition', metavar='NAME', default=AUDIO_RENDITION,
+                       help='Rendition the shared audio group is taken from (default: the largest)')
+    parser.add_argument('--ffmpeg-timeout', type=float, metavar='SECONDS', default=ffmpeg_runner.TIMEOUT,
+                       help='Kill an ffmpeg run that takes longer than this (0: no limit)')
     args = parser.parse_args()
+    ffmpeg_runner.TIMEOUT = args.ffmpeg_timeout or None
     
     print("=" * 70)
     if args.skip_download:
@@ -321,23 +1151,23 @@ def main():
         if not check_ffmpeg():
             sys.exit(1)
     
-    has_gsutil = check_gsutil()
+    can_upload = check_storage_access()
     project_id, storage_bucket = get_firebase_config()
     
-    if not has_gsutil:
-        print("\n⚠️  gsutil not found. You'll need to upload manually.")
-        print("   Option 1: Install gsutil: pip install gsutil")
+    if not can_upload:
+        print("\n⚠️  No Storage credentials. You'll need to upload manually.")
+        print("   Option 1: Install the Google Cloud SDK and run: gcloud auth login")
         print("   Option 2: Use Firebase Console to upload files")
         print("   Option 3: Use Firebase CLI: firebase storage:upload")
         response = input("\nContinue with download/trim only? (y/n): ")
         if response.lower() != 'y':
             sys.exit(0)
     
-    if has_gsutil and not project_id:
+    if can_upload and not project_id:
         print("\n⚠️  Could not detect Firebase project ID.")
         project_id = input("Enter your Firebase project ID (or press Enter to skip upload): ").strip()
         if not project_id:
-            has_gsutil = False
+            can_upload = False
         else:
             storage_bucket = input(f"Enter storage bucket (or press Enter for {project_id}.appspot.com): ").strip()
             if not storage_bucket:
@@ -348,147 +1178,30 @@ def main():
     OUTPUT_DIR.mkdir(exist_ok=True)
     print(f"\n📁 Output directory: {OUTPUT_DIR.absolute()}")
     
+    # Stages whose inputs and outputs are unchanged since the last run are skipped
+    state = pipeline_state.PipelineState(force=args.force)
+    
     # If skipping download, just upload existing files
     if args.skip_download:
-        upload_existing_files(OUTPUT_DIR, FIREBASE_STORAGE_PATH, project_id, storage_bucket, has_gsutil)
+        upload_existing_files(OUTPUT_DIR, FIREBASE_STORAGE_PATH, project_id, storage_bucket, can_upload, state)
         return
     
-    results = []
-    
-    # Process each resolution
-    for resolution in RESOLUTIONS:
-        name = resolution["name"]
-        url = resolution["url"]
-        bandwidth = resolution["bandwidth"]
-        
-        print(f"\n{'='*70}")
-        print(f"Processing: {name}")
-        print(f"{'='*70}")
-        
-        # File paths
-        temp_file = OUTPUT_DIR / f"temp_{name}.mp4"
-        final_file = OUTPUT_DIR / f"landing_video_{name}.mp4"
-        
-        # Step 1: Download
-        if not download_m3u8(url, temp_file):
-            print(f"⚠️  Skipping {name} due to download error")
-            continue
-        
-        # Step 2: Trim
-        if not trim_video(temp_file, final_file, TARGET_DURATION):
-            print(f"⚠️  Trim failed for {name}, keeping original")
-            if temp_file.exists():
-                temp_file.rename(final_file)
-        
-        # Clean up temp file
-        if temp_file.exists() and final_file.exists():
-            temp_file.unlink()
-        
-        # Step 3: Get video info
-        video_info = get_video_info(final_file)
-        duration = get_video_duration(final_file)
-        
-        # Step 4: Upload to Firebase Storage
-        public_url = None
-        if has_gsutil and project_id:
-            public_url = upload_to_firebase_storage(
-                final_file,
-                FIREBASE_STORAGE_PATH,
-                project_id,
-                storage_bucket
-            )
-        else:
-            print(f"\n⏭️  Skipping upload (manual upload required)")
-            print(f"   Upload this file: {final_file.absolute()}")
-            print(f"   To: {FIREBASE_STORAGE_PATH}/{final_file.name}")
-        
-        results.append({
-            "resolution": name,
-            "bandwidth": bandwidth,
-            "file": str(final_file),
-            "url": public_url or f"MANUAL_UPLOAD_REQUIRED/{final_file.name}",
-            "width": video_info.get("width") if video_info else None,
-            "height": video_info.get("height") if video_info else None,
-            "codec": video_info.get("codec") if video_info else None,
-            "duration": duration
-        })
-    
-    # Generate m3u8 playlists
-    print(f"\n{'='*70}")
-    print("Generating M3U8 Playlists")
-    print(f"{'='*70}")
-    
-    # Determine base URL
-    if project_id:
-        # Use storage_bucket if available, otherwise use project_id
-        bucket_name = storage_bucket if storage_bucket else f"{project_id}.appspot.com"
-        base_url = f"https://firebasestorage.googleapis.com/v0/b/{bucket_name}/o/{quote(FIREBASE_STORAGE_PATH, safe='')}"
-    else:
-        base_url = "YOUR_CDN_BASE_URL"  # User needs to replace this
-    
-    # Generate individual m3u8 files for each resolution
-    individual_playlists = []
-    for result in results:
-        if result["url"].startswith("https://"):
-            # Generate individual m3u8
-            m3u8_name = f"landing_video_{result['resolution']}.m3u8"
-            m3u8_path = OUTPUT_DIR / m3u8_name
-            
-            # URL for the MP4 file
-            video_url = result["url"]
-            
-            generate_individual_m3u8(
-                video_url,
-                m3u8_path,
-                result.get("duration", TARGET_DURATION)
-            )
-            
-            # Upload m3u8 to Firebase Storage
-            if has_gsutil and project_id:
-                m3u8_public_url = upload_to_firebase_storage(
-                    m3u8_path,
-                    FIREBASE_STORAGE_PATH,
-                    project_id
-                )
-                individual_playlists.append({
-                    "resolution": result["resolution"],
-                    "url": m3u8_public_url
-                })
-            else:
-                individual_playlists.append({
-                    "resolution": result["resolution"],
-                    "url": f"MANUAL_UPLOAD_REQUIRED/{m3u8_name}"
-                })
-    
-    # Generate master m3u8 playlist
-    master_m3u8_path = OUTPUT_DIR / "landing_video_master.m3u8"
-    
-    # Update results with m3u8 URLs for master playlist
-    master_playlist_data = []
-    for result, playlist in zip(results, individual_playlists):
-        if playlist["url"].startswith("https://"):
-            master_playlist_data.append({
-                "name": result["resolution"],
-                "bandwidth": result["bandwidth"],
-                "url": playlist["url"]
-            })
-    
-    if master_playlist_data:
-        generate_m3u8_playlist(
-            master_playlist_data,
-            master_m3u8_path,
-            base_url
-        )
-        
-        # Upload master m3u8
-        if has_gsutil and project_id:
-            master_url = upload_to_firebase_storage(
-                master_m3u8_path,
-                FIREBASE_STORAGE_PATH,
-                project_id
-            )
-        else:
-            master_url = f"MANUAL_UPLOAD_REQUIRED/{master_m3u8_path.name}"
+    source = default_source()
+    source["hls_layout"] = args.hls_layout
+    source["segment_duration"] = args.segment_duration
+    source["first_segment_duration"] = args.first_segment_duration or None
+    source["stream"] = args.stream
+    source["auto_trim"] = args.auto_trim or AUTO_TRIM
+    source["input"] = args.transcode
+    source["audio_group"] = AUDIO_GROUP and not args.muxed_audio
+    source["audio_rendition"] = args.audio_rendition
+    try:
+        output_data = publish_source(state, source, project_id, storage_bucket, can_upload)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    results = output_data["resolutions"]
+    master_url = output_data["master_playlist_url"]
     
     # Summary
     print(f"\n{'='*70}")
@@ -496,6 +1209,10 @@ def main():
     print(f"{'='*70}")
     
     for result in results:
+        if not result["file"]:
+            print(f"\n✅ {result['resolution']} (streamed):")
+            print(f"   URL: {result['url']}")
+            continue
         file_path = Path(result["file"])
         if file_path.exists():
             size_mb = file_path.stat().st_size / (1024 * 1024)
@@ -505,32 +1222,27 @@ def main():
             if result.get("duration"):
                 print(f"   Duration: {result['duration']:.2f}s")
     
-    # Save results to JSON
-    json_output = OUTPUT_DIR / "upload_results.json"
-    output_data = {
-        "master_playlist_url": master_url if 'master_url' in locals() else None,
-        "resolutions": results,
-        "individual_playlists": individual_playlists,
-        "firebase_storage_path": FIREBASE_STORAGE_PATH,
-        "project_id": project_id,
-        "storage_bucket": storage_bucket if 'storage_bucket' in locals() else None
-    }
+    if output_data["thumbnails"]:
+        print(f"\n✅ Thumbnails:")
+        print(f"   Poster: {output_data['thumbnails']['poster_url']}")
+        print(f"   Track:  {output_data['thumbnails']['thumbnails_vtt_url']}")
     
-    with open(json_output, "w") as f:
-        json.dump(output_data, f, indent=2)
-    
-    print(f"\n📄 Results saved to: {json_output}")
+    ffmpeg_report = ffmpeg_runner.report()
+    if ffmpeg_report:
+        print(f"\n⏱️  ffmpeg (slowest first):")
+        for line in ffmpeg_report:
+            print(f"   {line}")
     
     print(f"\n{'='*70}")
     print("💡 Next Steps")
     print(f"{'='*70}")
     
-    if has_gsutil and project_id:
+    if can_upload and project_id:
         print(f"\n✅ All files uploaded to Firebase Storage!")
-        print(f"   Master Playlist URL: {master_url if 'master_url' in locals() else 'N/A'}")
+        print(f"   Master Playlist URL: {master_url or 'N/A'}")
         print(f"\n📝 Update your landing page config:")
         print(f"   Firebase Firestore → app/landingPage")
-        print(f"   Set backgroundVideoUrl to: {master_url if 'master_url' in locals() else 'YOUR_MASTER_M3U8_URL'}")
+        print(f"   Set backgroundVideoUrl to: {master_url or 'YOUR_MASTER_M3U8_URL'}")
     else:
         print(f"\n📤 Manual Upload Required:")
         print(f"   1. Upload all files from: {OUTPUT_DIR.absolute()}")
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Find where an end card or watermark starts, to compute the trim point.
+
+TARGET_DURATION and FRAMES_TO_TRIM are tuned by hand per source. detect()
+instead decodes only the last TAIL_SECONDS of the video (-sseof, so ffmpeg
+starts at the keyframe before the tail, however long the source is), at
+ANALYSIS_SIZE in grayscale, and looks at the raw frames with NumPy:
+
+  cut    a hard scene change after which the picture stays (nearly) still,
+         i.e. an end card
+  logo   a corner where part of the picture turns static and stays that way
+         while the picture around it keeps moving, i.e. a watermark appearing
+
+The earliest finding wins. Its frames_to_trim counts the frames from there
+to the end, ready for smart_cut(frames_to_trim=...). Works on local files
+and on media playlist URLs.
+
+Requirements:
+    pip install numpy
+
+Usage:
+  python3 end_card.py downloaded_videos/landing_video_640x360.mp4
+  python3 end_card.py video.mp4 --tail 8
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+import ffmpeg_runner
+import media_probe
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Configuration
+TAIL_SECONDS = 6.0  # Only this much of the end is decoded
+ANALYSIS_SIZE = (160, 90)  # Frames are scaled to this (width, height), aspect ignored
+MIN_CARD_SECONDS = 0.3  # Shorter still tails are ignored
+MIN_LOGO_SECONDS = 1.0  # Shorter-lived overlays are ignored (a still patch of the picture can last that long)
+CUT_THRESHOLD = 25.0  # Mean absolute luma change (0-255) between frames that counts as a cut
+CUT_RATIO = 4.0  # ...and how much larger than the tail's median change it must be
+STILL_THRESHOLD = 0.15  # Median luma change per frame for a shot to count as still (typing text passes)
+CORNER_FRACTION = 0.3  # Width and height of the corner regions searched for a watermark
+STABLE_STD = 8.0  # Luma deviation over the final frames below which a pixel is part of the overlay
+MIN_LOGO_PIXELS = 0.03  # Fraction of a corner the overlay must cover
+MAX_LOGO_PIXELS = 0.6  # ...and leave uncovered, to tell an overlay from a still corner
+PIXEL_TOLERANCE = 20.0  # Luma difference for a pixel to still match the overlay
+LOGO_MATCH = 0.9  # Fraction of overlay pixels that must match for a frame to show the overlay
+LOGO_ABSENT = 0.5  # ...and the most that may match, on average, in the frames before it appeared
+LOGO_CUT_GAP = 0.25  # Seconds after a cut in which an overlay can't be told from the new shot
+CORNERS = ("top-left", "top-right", "bottom-left", "bottom-right")
+
+def decode_tail(input_path, tail=TAIL_SECONDS, size=ANALYSIS_SIZE, input_args=()):
+    """Decode the last tail seconds of the video as a (frames, height, width) uint8 array."""
+    width, height = size
+    cmd = [
+        "ffmpeg", "-v", "error",
+        *input_args,
+        "-sseof", f"-{tail:.3f}",
+        "-i", str(input_path),
+        "-map", "0:v:0",
+        "-vf", f"scale={width}:{height}:flags=area,format=gray",
+        "-f", "rawvideo",
+        "pipe:1"
+    ]
+    frames = ffmpeg_runner.run(cmd, label=f"end card scan of {input_path}")["stdout"]
+    count = len(frames) // (width * height)
+    if not count:
+        raise ValueError(f"No video frames decoded from the end of {input_path}")
+    return np.frombuffer(frames[:count * width * height], dtype=np.uint8).reshape(count, height, width)
+
+def find_cuts(frames):
+    """Per-frame luma change and the indices of frames that start a new shot (hard cuts)."""
+    changes = np.abs(np.diff(frames, axis=0)).mean(axis=(1, 2))  # changes[i]: frame i -> i + 1
+    if not len(changes):
+        return changes, []
+    threshold = max(CUT_THRESHOLD, CUT_RATIO * float(np.median(changes)))
+    return changes, [int(i) + 1 for i in np.flatnonzero(changes >= threshold)]
+
+def find_card(changes, cuts, min_frames):
+    """Index of the first frame of a still tail that starts with a hard cut, or None."""
+    found = None
+    end = len(changes) + 1
+    # Walk back through the cuts while the shot after each one stays still
+    # (an end card can be several still cards in a row, or black then a logo)
+    for start in reversed(cuts):
+        shot = changes[start:end - 1]
+        if len(shot) and float(np.median(shot)) >= STILL_THRESHOLD:
+            break
+        found = end = start
+    if found is None or len(changes) + 1 - found < min_frames:
+        return None
+    return found
+
+def corner_slices(height, width, corner):
+    """Row and column slices of a corner region."""
+    rows = int(height * CORNER_FRACTION)
+    cols = int(width * CORNER_FRACTION)
+    vertical = slice(0, rows) if corner.startswith("top") else slice(height - rows, height)
+    horizontal = slice(0, cols) if corner.endswith("left") else slice(width - cols, width)
+    return vertical, horizontal
+
+def find_logo(frames, cuts, min_frames, cut_gap):
+    """(index of the first frame showing a corner overlay, corner), or (None, None)."""
+    found, found_corner = None, None
+    count, height, width = frames.shape
+    if count <= min_frames:
+        return found, found_corner
+    for corner in CORNERS:
+        rows, cols = corner_slices(height, width, corner)
+        region = frames[:, rows, cols]
+        # Overlay pixels: unchanged over the final frames
+        final = region[-min_frames:]
+        reference = final.mean(axis=0)
+        mask = final.std(axis=0) < STABLE_STD
+        if not MIN_LOGO_PIXELS <= mask.mean() <= MAX_LOGO_PIXELS:
+            continue
+        # Per frame, the fraction of overlay pixels that already look like the end
+        matched = (np.abs(region[:, mask] - reference[mask]) < PIXEL_TOLERANCE).mean(axis=1)
+        missing = np.flatnonzero(matched < LOGO_MATCH)
+        if not len(missing):
+            continue  # Static since before the tail: part of the picture, not an overlay appearing
+        start = int(missing[-1]) + 1
+        # It must appear: missing for a while before, not a flicker in a patch that was always there
+        if matched[max(start - min_frames, 0):start].mean() >= LOGO_ABSENT:
+            continue
+        # Right after a cut, a still patch of the new shot looks just like an overlay appearing
+        if any(0 <= start - cut < cut_gap for cut in cuts):
+            continue
+        # The picture around an overlay keeps moving; otherwise this is a still shot (see find_cut)
+        around = region[start:][:, ~mask]
+        if len(around) < 2 or float(np.median(np.abs(np.diff(around, axis=0)).mean(axis=1))) < STILL_THRESHOLD:
+            continue
+        if count - start >= min_frames and (found is None or start < found):
+            found, found_corner = start, corner
+    return found, found_corner
+
+def detect(input_path, tail=TAIL_SECONDS, input_args=()):
+    """Find where the end card or watermark starts in the last tail seconds.
+
+    Returns None if nothing was found, otherwise a dict with "frames_to_trim"
+    (frames from the start of the end card to the end of the video), "time"
+    (its start in seconds from the first video frame, approximate for
+    variable frame rates), "kind" ("cut" or "logo") and "corner" for a logo.
+    Raises ValueError when NumPy is missing or the video can't be read and
+    CalledProcessError if ffmpeg fails.
+    """
+    if np is None:
+        raise ValueError("End card detection needs NumPy: pip install numpy")
+    data = media_probe.probe(input_path, use_cache=False, input_args=input_args)
+    stream = media_probe.get_stream(data, "video") if data else None
+    if not stream:
+        raise ValueError(f"{input_path} has no video stream")
+    fps = media_probe.parse_frame_rate(stream.get("avg_frame_rate")) \
+        or media_probe.parse_frame_rate(stream.get("r_frame_rate")) or media_probe.DEFAULT_FPS
+    duration = float(stream.get("duration") or data.get("format", {}).get("duration") or 0)
+
+    frames = decode_tail(input_path, tail, input_args=input_args).astype(np.float32)
+    changes, cuts = find_cuts(frames)
+    cut = find_card(changes, cuts, max(2, round(MIN_CARD_SECONDS * fps)))
+    # A watermark shows over the content, so only the frames before an end card are searched
+    logo, corner = find_logo(frames[:cut], cuts, max(2, round(MIN_LOGO_SECONDS * fps)), round(LOGO_CUT_GAP * fps))
+    starts = [(start, kind) for start, kind in ((cut, "cut"), (logo, "logo")) if start is not None]
+    if not starts:
+        return None
+    start, kind = min(starts)
+    frames_to_trim = len(frames) - start
+    result = {
+        "frames_to_trim": frames_to_trim,
+        "time": max(duration - frames_to_trim / fps, 0.0) if duration else None,
+        "kind": kind,
+    }
+    if kind == "logo":
+        result["corner"] = corner
+    return result
+
+def describe(result):
+    """One-line summary of a detect() result."""
+    where = f" ({result['corner']})" if result.get("corner") else ""
+    at = f" at {result['time']:.3f}s" if result["time"] is not None else ""
+    return f"{'End card' if result['kind'] == 'cut' else 'Watermark'}{where}{at}, last {result['frames_to_trim']} frames"
+
+def main():
+    parser = argparse.ArgumentParser(description='Find where the end card or watermark of a video starts')
+    parser.add_argument('input', help='Video file or media playlist URL')
+    parser.add_argument('--tail', type=float, default=TAIL_SECONDS, help='Seconds at the end to analyse')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        result = detect(args.input, args.tail)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ ffmpeg failed: {(e.stderr or b'').decode(errors='replace').strip()}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    if result is None:
+        print(f"✅ No end card or watermark in the last {args.tail:g}s ({elapsed:.2f}s)")
+        return
+    print(f"✅ {describe(result)} ({elapsed:.2f}s)")
+    print(f"   python3 smart_cut.py {args.input} trimmed.mp4 --frames-to-trim {result['frames_to_trim']}")
+
+if __name__ == "__main__":
+    main()
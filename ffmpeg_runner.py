@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Run ffmpeg with live progress, per-job timeouts and the end of stderr kept for errors.
+
+run() adds "-progress pipe:1" to an ffmpeg command and parses the key=value
+blocks ffmpeg writes there about twice a second: out_time (media seconds
+written), total_size (output bytes) and speed (multiple of realtime). Each
+block is passed to an optional on_progress callback as a progress dict,
+with percent done and ETA when the output duration is known. A job that
+runs longer than its timeout is killed. Only the last STDERR_LINES lines of
+stderr are kept, and a failed job raises FfmpegError with them in its
+message. FfmpegError is a subprocess.CalledProcessError, so callers that
+already handle failed ffmpeg runs need no changes.
+
+Every finished job's metrics (label, wall time, media time, speed, output
+size) are kept in memory; report() lists the slowest, to see which sources
+are slow and whether encodes keep up with realtime. Jobs run inside a
+job_context(name) block are tagged with that name (e.g. source/rendition),
+also in worker threads that set their own.
+
+Commands that write their output to stdout (pipe:1) can't share it with
+the progress stream; they run without progress and return what ffmpeg
+wrote as metrics["stdout"]. start() instead runs such a command in the
+background, for callers that consume stdout as it is written (e.g. a
+streaming upload): progress then comes over stderr, which is drained as
+the job runs, and the job has the same timeout, stderr tail and metrics.
+
+Usage:
+  metrics = ffmpeg_runner.run(cmd, duration=63, on_progress=ffmpeg_runner.progress_printer("720p"))
+  print("\\n".join(ffmpeg_runner.report()))
+  job = ffmpeg_runner.start(cmd_writing_to_pipe); consume(job.stdout); metrics = job.wait()
+  python3 ffmpeg_runner.py -i input.mp4 -c:v libx264 -y output.mp4   # Any ffmpeg arguments, with progress
+"""
+
+import collections
+import contextlib
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Configuration
+TIMEOUT = 3600.0  # Seconds a job may run before it is killed (None: no limit)
+STDERR_LINES = 40  # Lines of stderr kept per job for error reports
+HISTORY_SIZE = 1000  # Finished jobs kept for report()
+PRINT_INTERVAL = 1.0  # Seconds between lines of progress_printer()
+STDOUT_OUTPUTS = ("-", "pipe:", "pipe:1")
+PROGRESS_LINE = re.compile(rb"^[a-z0-9_]+=")  # -progress key=value lines, when they share stderr
+
+_history = collections.deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+_context = threading.local()
+
+class FfmpegError(subprocess.CalledProcessError):
+    """ffmpeg failed or was killed at its timeout.
+
+    stderr holds the last STDERR_LINES lines ffmpeg wrote there (bytes, as
+    with capture_output), metrics the progress it made before it stopped.
+    """
+
+    def __init__(self, returncode, cmd, stderr, metrics, timed_out=False):
+        super().__init__(returncode, cmd, stderr=stderr)
+        self.metrics = metrics
+        self.timed_out = timed_out
+
+    def __str__(self):
+        if self.timed_out:
+            reason = f"timed out after {self.metrics['elapsed']:.1f}s"
+        else:
+            reason = f"exited with status {self.returncode}"
+        lines = [line for line in (self.stderr or b"").decode(errors="replace").splitlines() if line.strip()]
+        return f"ffmpeg {reason} ({self.metrics['label']})" + (f": {lines[-1].strip()}" if lines else "")
+
+def parse_time(value):
+    """Seconds from an ffmpeg HH:MM:SS.micro time (None for N/A)."""
+    try:
+        hours, minutes, seconds = value.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+def parse_number(value):
+    """A float from a -progress value like "1.52x" or "29.97" (None for N/A)."""
+    try:
+        return float(value.rstrip("x"))
+    except (AttributeError, ValueError):
+        return None
+
+def parse_progress(block, elapsed, duration=None):
+    """Progress dict from one -progress block ({key: value} strings).
+
+    out_time is in media seconds, total_size in bytes, speed a multiple of
+    realtime, elapsed in wall-clock seconds. percent and eta (seconds) need
+    the output duration.
+    """
+    out_time = None
+    if block.get("out_time_us", "N/A") != "N/A":
+        out_time = max(int(block["out_time_us"]), 0) / 1000000
+    elif "out_time" in block:
+        out_time = parse_time(block["out_time"])
+    total_size = parse_number(block.get("total_size"))
+    speed = parse_number(block.get("speed"))
+    progress = {
+        "out_time": out_time,
+        "total_size": int(total_size) if total_size is not None else None,
+        "speed": speed,
+        "fps": parse_number(block.get("fps")),
+        "frame": int(block["frame"]) if block.get("frame", "").isdigit() else None,
+        "elapsed": elapsed,
+        "throughput": total_size / elapsed if total_size is not None and elapsed > 0 else None,
+        "percent": None,
+        "eta": None,
+        "done": block.get("progress") == "end"
+    }
+    if duration and out_time is not None:
+        progress["percent"] = min(out_time / duration * 100, 100.0)
+        if speed:
+            progress["eta"] = max(duration - out_time, 0) / speed
+    return progress
+
+def _drain(stream, lines):
+    """Read a pipe to the end, keeping its last lines (lines is a bounded deque)."""
+    for line in iter(stream.readline, b""):
+        lines.append(line)
+    stream.close()
+
+def _read_all(stream, chunks):
+    """Read a pipe to the end into chunks."""
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        chunks.append(chunk)
+    stream.close()
+
+@contextlib.contextmanager
+def job_context(name):
+    """Tag the jobs this thread runs inside the block with name (metrics["context"])."""
+    previous = getattr(_context, "name", None)
+    _context.name = name
+    try:
+        yield
+    finally:
+        _context.name = previous
+
+def job_label(cmd):
+    """Default job label: the name of the command's output file."""
+    return Path(str(cmd[-1])).name if len(cmd) > 1 else str(cmd[0])
+
+def _record(progress, elapsed, label, context, returncode):
+    """Metrics of a finished job (see run()), kept for history() and report()."""
+    metrics = {**progress, "elapsed": elapsed, "label": label, "context": context, "returncode": returncode}
+    if metrics["out_time"] and metrics["elapsed"] > 0 and metrics["speed"] is None:
+        metrics["speed"] = metrics["out_time"] / metrics["elapsed"]
+    with _history_lock:
+        _history.append(dict(metrics))
+    return metrics
+
+def run(cmd, duration=None, on_progress=None, timeout=None, label=None):
+    """Run an ffmpeg command to completion. Returns its metrics.
+
+    duration (seconds of output, if known) gives progress a percent and
+    ETA; on_progress(progress) is called from this thread for every
+    -progress block (see parse_progress). timeout defaults to TIMEOUT and
+    label to the output file name. The metrics are the last progress dict
+    plus "label", "context" (see job_context), "returncode" and "stdout"
+    (bytes, only for commands that write to pipe:1). Raises FfmpegError if
+    ffmpeg fails or times out, and FileNotFoundError if it isn't installed.
+    """
+    cmd = [str(arg) for arg in cmd]
+    label = label or job_label(cmd)
+    timeout = TIMEOUT if timeout is None else timeout
+    to_stdout = cmd[-1] in STDOUT_OUTPUTS
+    if not to_stdout:
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+
+    start = time.monotonic()
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_lines = collections.deque(maxlen=STDERR_LINES)
+    stderr_reader = threading.Thread(target=_drain, args=(process.stderr, stderr_lines), daemon=True)
+    stderr_reader.start()
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+
+    progress = parse_progress({}, 0.0, duration)
+    stdout = None
+    try:
+        if to_stdout:
+            chunks = []
+            _read_all(process.stdout, chunks)
+            stdout = b"".join(chunks)
+        else:
+            block = {}
+            for line in iter(process.stdout.readline, b""):
+                key, _, value = line.decode(errors="replace").strip().partition("=")
+                block[key] = value.strip()
+                if key == "progress":
+                    progress = parse_progress(block, time.monotonic() - start, duration)
+                    if on_progress:
+                        on_progress(progress)
+                    block = {}
+            process.stdout.close()
+        returncode = process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        if timer:
+            timer.cancel()
+        stderr_reader.join()
+
+    metrics = _record(progress, time.monotonic() - start, label, getattr(_context, "name", None), returncode)
+    if returncode != 0 or timed_out.is_set():
+        raise FfmpegError(returncode, cmd, b"".join(stderr_lines), metrics, timed_out.is_set())
+    metrics["stdout"] = stdout
+    return metrics
+
+class StreamingJob:
+    """An ffmpeg job writing its output to stdout, started by start().
+
+    Read stdout (or kill() the job), then call wait(). stderr is drained in
+    a background thread: -progress blocks go to on_progress (called from
+    that thread), other lines to the STDERR_LINES tail.
+    """
+
+    def __init__(self, cmd, duration=None, on_progress=None, timeout=None, label=None):
+        cmd = [str(arg) for arg in cmd]
+        self.label = label or job_label(cmd)
+        self.context = getattr(_context, "name", None)
+        self.duration = duration
+        self.on_progress = on_progress
+        self.cmd = [cmd[0], "-progress", "pipe:2", "-nostats", *cmd[1:]]
+        self.progress = parse_progress({}, 0.0, duration)
+        self.stderr_lines = collections.deque(maxlen=STDERR_LINES)
+        self.timed_out = threading.Event()
+        self.metrics = None
+        self.start = time.monotonic()
+        self.process = subprocess.Popen(
+            self.cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self.stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self.stderr_reader.start()
+        timeout = TIMEOUT if timeout is None else timeout
+        self.timer = threading.Timer(timeout, self._time_out) if timeout else None
+        if self.timer:
+            self.timer.daemon = True
+            self.timer.start()
+
+    @property
+    def stdout(self):
+        return self.process.stdout
+
+    def _read_stderr(self):
+        block = {}
+        for line in iter(self.process.stderr.readline, b""):
+            if not PROGRESS_LINE.match(line):
+                self.stderr_lines.append(line)
+                continue
+            key, _, value = line.decode(errors="replace").strip().partition("=")
+            block[key] = value.strip()
+            if key == "progress":
+                self.progress = parse_progress(block, time.monotonic() - self.start, self.duration)
+                if self.on_progress:
+                    self.on_progress(self.progress)
+                block = {}
+        self.process.stderr.close()
+
+    def _time_out(self):
+        self.timed_out.set()
+        self.process.kill()
+
+    def kill(self):
+        """Stop the job (e.g. when its output can't be used); wait() then raises FfmpegError."""
+        self.process.kill()
+
+    def wait(self, check=True):
+        """Wait for ffmpeg to exit and return its metrics (see run()).
+
+        Raises FfmpegError if it failed or timed out, unless check is False.
+        """
+        if self.metrics is None:
+            returncode = self.process.wait()
+            if self.timer:
+                self.timer.cancel()
+            self.stderr_reader.join()
+            self.process.stdout.close()
+            self.metrics = _record(self.progress, time.monotonic() - self.start, self.label, self.context, returncode)
+        if check and (self.metrics["returncode"] != 0 or self.timed_out.is_set()):
+            raise FfmpegError(
+                self.metrics["returncode"], self.cmd, b"".join(self.stderr_lines), self.metrics,
+                self.timed_out.is_set()
+            )
+        return self.metrics
+
+def start(cmd, duration=None, on_progress=None, timeout=None, label=None):
+    """Start an ffmpeg command that writes its output to stdout. Returns its StreamingJob.
+
+    The arguments are those of run(); raises FileNotFoundError if ffmpeg
+    isn't installed.
+    """
+    return StreamingJob(cmd, duration, on_progress, timeout, label)
+
+def format_progress(label, progress):
+    """One status line for a progress dict."""
+    parts = [label]
+    if progress["out_time"] is not None:
+        parts.append(f"{progress['out_time']:.1f}s")
+        if progress["percent"] is not None:
+            parts[-1] += f" ({progress['percent']:.0f}%)"
+    if progress["speed"] is not None:
+        parts.append(f"{progress['speed']:.2f}x realtime")
+    if progress["total_size"]:
+        parts.append(f"{progress['total_size'] / (1024 * 1024):.1f} MB")
+    if progress["eta"] is not None and not progress["done"]:
+        parts.append(f"ETA {progress['eta']:.0f}s")
+    return ", ".join(parts)
+
+def progress_printer(label, interval=PRINT_INTERVAL):
+    """on_progress callback printing a status line at most every interval seconds (and at the end)."""
+    last = [None]
+
+    def on_progress(progress):
+        if progress["done"] or last[0] is None or progress["elapsed"] - last[0] >= interval:
+            last[0] = progress["elapsed"]
+            print(f"   ⏱️  {format_progress(label, progress)}", flush=True)
+
+    return on_progress
+
+def history(context=None):
+    """Metrics of the finished jobs (failed ones too), oldest first.
+
+    With context only the jobs tagged with it or below it ("name/...").
+    """
+    with _history_lock:
+        jobs = list(_history)
+    if context is None:
+        return jobs
+    return [job for job in jobs if job["context"] and (job["context"] + "/").startswith(context + "/")]
+
+def report(limit=10, context=None):
+    """Lines summarising the finished jobs (see history): totals, then the limit slowest by wall time."""
+    jobs = history(context)
+    if not jobs:
+        return []
+    total = sum(job["elapsed"] for job in jobs)
+    media = sum(job["out_time"] or 0 for job in jobs)
+    failed = sum(1 for job in jobs if job["returncode"] != 0)
+    lines = [f"{len(jobs)} ffmpeg jobs, {total:.1f}s total for {media:.1f}s of media"
+             + (f", {failed} failed" if failed else "")]
+    for job in sorted(jobs, key=lambda job: job["elapsed"], reverse=True)[:limit]:
+        speed = f"{job['speed']:.2f}x" if job["speed"] is not None else "?"
+        media_time = f"{job['out_time']:.1f}s" if job["out_time"] is not None else "?"
+        status = "" if job["returncode"] == 0 else f", exit {job['returncode']}"
+        label = f"{job['context']}: {job['label']}" if job["context"] else job["label"]
+        lines.append(f"  {job['elapsed']:6.1f}s  {speed:>7}  {media_time:>7} media  {label}{status}")
+    return lines
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 ffmpeg_runner.py <ffmpeg arguments>")
+        sys.exit(2)
+    cmd = ["ffmpeg", *sys.argv[1:]]
+    try:
+        run(cmd, on_progress=progress_printer(job_label(cmd)))
+    except FfmpegError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print("\n".join(report()))
+
+if __name__ == "__main__":
+    main()
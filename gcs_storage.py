@@ -0,0 +1,956 @@
+#!/usr/bin/env python3
+"""
+Cloud Storage uploads over the JSON API, without gsutil.
+
+All uploads share one pooled HTTP session. upload_file() sends a small file
+and its metadata, public-read ACL and hashes in a single multipart request;
+upload_files() runs many of them concurrently.
+
+Larger files go through chunked resumable sessions whose URIs are saved in
+SESSIONS_FILE, so an interrupted upload (even in a later run) resumes from
+the last byte Storage acknowledged; each chunk is retried on its own.
+upload_stream() does the same for pipes (e.g. ffmpeg's stdout), reading
+ahead in a background thread so the producer keeps running while chunks
+are in flight.
+
+Objects get a Content-Type and Cache-Control by name: media files are
+published under content-hashed names (object_name_for()) and cached as
+immutable, playlists keep stable names with a short max-age.
+
+sync_files() lists a prefix once and uploads only the files whose size and
+hash differ from the remote objects (local hashes are cached in
+HASH_CACHE_FILE, written once at exit or by save_hash_cache()),
+optionally deleting stale versions of the synced files that no published
+playlist references any more.
+
+CRC32C (google_crc32c or crcmod if installed) and MD5 are computed as the
+data passes and sent with the final request, so Storage only commits a
+matching object; the stored hashes are checked again before an upload
+returns its URL. Files whose hashes are already cached (e.g. by
+object_name_for) aren't hashed again while uploading.
+
+Authentication uses $GOOGLE_OAUTH_ACCESS_TOKEN, or a token from
+`gcloud auth print-access-token`. $STORAGE_API_URL overrides the API
+endpoint (e.g. for a local emulator).
+
+Requirements:
+    pip install requests   (optional: pip install google-crc32c (or crcmod) for fast CRC32C)
+
+Usage:
+  python3 gcs_storage.py <bucket> <storage_path> <file>... [--workers 8]
+  ffmpeg ... -f mp4 pipe:1 | python3 gcs_storage.py <bucket> <object_name> - [--content-type video/mp4]
+"""
+
+import argparse
+import atexit
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote, unquote, urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import hls_playlist
+
+try:
+    import google_crc32c
+except ImportError:
+    google_crc32c = None
+
+try:
+    import crcmod.predefined
+except ImportError:
+    crcmod = None
+
+# Configuration
+STORAGE_API_URL = os.environ.get("STORAGE_API_URL", "https://storage.googleapis.com").rstrip("/")
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Must be a multiple of 256 KiB
+READ_AHEAD_CHUNKS = 2  # Chunks buffered while the previous one uploads
+UPLOAD_RETRIES = 5  # Attempts per chunk before giving up
+RETRY_BACKOFF = 0.5  # Seconds, doubled after every failed attempt
+REQUEST_TIMEOUT = 60  # Seconds
+UPLOAD_WORKERS = 8  # Concurrent file uploads (and pooled connections)
+MULTIPART_LIMIT = 8 * 1024 * 1024  # Larger files use a resumable session
+SESSIONS_FILE = Path("downloaded_videos") / ".upload_sessions.json"  # Open resumable sessions
+HASH_CACHE_FILE = Path("downloaded_videos") / ".hash_cache.json"  # Local MD5/CRC32C by file signature
+
+# Cache policy: content-hashed media never changes under its name, playlists do
+HASHED_SUFFIXES = (".mp4", ".m4s", ".ts", ".jpg", ".webp")  # Published under content-hashed names
+HASHED_NAME = re.compile(r"\.[0-9a-f]{16}(\.[A-Za-z0-9]+)$")
+CACHE_CONTROL_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_CONTROL_PLAYLIST = "public, max-age=60"
+CACHE_CONTROL_DEFAULT = "public, max-age=3600"
+
+# Content types mimetypes doesn't know (or gets wrong) for HLS output and thumbnails
+CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".webp": "image/webp",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".ts": "video/mp2t",
+    ".vtt": "text/vtt",
+}
+
+_access_token = None
+_token_lock = threading.Lock()
+_session = None
+_sessions_lock = threading.Lock()
+_hash_cache = None
+_hash_cache_dirty = False
+_hash_cache_lock = threading.Lock()
+
+class UploadError(Exception):
+    """A Storage upload failed or its checksum did not match."""
+
+def get_access_token():
+    """OAuth access token from $GOOGLE_OAUTH_ACCESS_TOKEN or gcloud (fetched once)."""
+    global _access_token
+    with _token_lock:
+        if _access_token is None:
+            token = os.environ.get("GOOGLE_OAUTH_ACCESS_TOKEN")
+            if not token:
+                try:
+                    result = subprocess.run(
+                        ["gcloud", "auth", "print-access-token"],
+                        capture_output=True, text=True, check=True
+                    )
+                except (subprocess.CalledProcessError, FileNotFoundError) as e:
+                    raise UploadError(f"No access token (set GOOGLE_OAUTH_ACCESS_TOKEN or log in with gcloud): {e}")
+                token = result.stdout.strip()
+            _access_token = token
+        return _access_token
+
+def create_session(pool_size=UPLOAD_WORKERS):
+    """HTTP session authorized for the Storage API, pooled for pool_size workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Authorization"] = f"Bearer {get_access_token()}"
+    return session
+
+def default_session():
+    """The process-wide pooled session (created on first use)."""
+    global _session
+    with _token_lock:
+        if _session is not None:
+            return _session
+    session = create_session()
+    with _token_lock:
+        if _session is None:
+            _session = session
+        return _session
+
+def content_type_for(path):
+    """Content-Type for a file, by extension."""
+    suffix = Path(path).suffix.lower()
+    return CONTENT_TYPES.get(suffix) or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+
+def public_url(bucket, object_name):
+    """Firebase download URL of an object (as printed by the upload scripts)."""
+    return f"https://firebasestorage.googleapis.com/v0/b/{bucket}/o/{quote(object_name, safe='')}?alt=media"
+
+def cache_control_for(object_name):
+    """Cache-Control for an object: immutable when content-hashed, short for playlists."""
+    if HASHED_NAME.search(object_name):
+        return CACHE_CONTROL_IMMUTABLE
+    if object_name.endswith(".m3u8"):
+        return CACHE_CONTROL_PLAYLIST
+    return CACHE_CONTROL_DEFAULT
+
+def content_hashed_name(path):
+    """Object name with the file's content hash, e.g. video.3f2a9c0d1e4b5a67.mp4."""
+    path = Path(path)
+    digest = base64.b64decode(file_hashes(path)["md5Hash"]).hex()[:16]
+    return f"{path.stem}.{digest}{path.suffix}"
+
+def object_name_for(path):
+    """Published name of a local file: content-hashed for media, as-is otherwise."""
+    path = Path(path)
+    if path.suffix.lower() in HASHED_SUFFIXES:
+        return content_hashed_name(path)
+    return path.name
+
+def unhashed_name(object_name):
+    """Object name without its content hash: video.3f2a9c0d1e4b5a67.mp4 -> video.mp4."""
+    return HASHED_NAME.sub(r"\1", object_name)
+
+def parse_object_url(url):
+    """(bucket, object name) of a public_url() or storage.googleapis.com URL, else None."""
+    parsed = urlparse(url)
+    parts = parsed.path.split("/")
+    if parsed.netloc == "firebasestorage.googleapis.com" and parts[1:3] == ["v0", "b"] and len(parts) > 5:
+        return parts[3], unquote("/".join(parts[5:]))
+    if parsed.netloc == "storage.googleapis.com" and len(parts) > 2:
+        return parts[1], unquote("/".join(parts[2:]))
+    return None
+
+def playlist_uris(playlist):
+    """Every URI a parsed playlist names: variants, renditions and I-frame playlists, or segments and the init section."""
+    if isinstance(playlist, hls_playlist.MasterPlaylist):
+        uris = [variant.uri for variant in playlist.variants]
+        uris += [media.uri for media in playlist.media if media.uri]
+        uris += [stream.uri for stream in playlist.iframe_streams]
+    else:
+        uris = [segment.uri for segment in playlist.segments]
+        if playlist.init:
+            uris.append(playlist.init.uri)
+    return uris
+
+def playlist_references(playlist, playlist_url=None):
+    """(bucket, object name) of every object a parsed playlist points to.
+
+    Relative URIs are resolved against playlist_url; URIs that aren't
+    Storage objects are skipped.
+    """
+    references = set()
+    for uri in playlist_uris(playlist):
+        reference = parse_object_url(urljoin(playlist_url, uri) if playlist_url else uri)
+        if reference:
+            references.add(reference)
+    return references
+
+def object_resource(object_name, content_type, metadata=None):
+    """Object resource for an upload: name, Content-Type, the Cache-Control policy and extra fields."""
+    return {
+        "name": object_name,
+        "contentType": content_type,
+        "cacheControl": cache_control_for(object_name),
+        **(metadata or {})
+    }
+
+def is_transient(status_code):
+    """Whether a Storage response status is worth retrying."""
+    return status_code in (408, 429) or status_code >= 500
+
+def request_with_retry(session, method, url, **kwargs):
+    """Send a request, retrying connection errors and transient statuses with backoff.
+
+    Returns the last response; re-raises the last connection error.
+    """
+    delay = RETRY_BACKOFF
+    for attempt in range(UPLOAD_RETRIES):
+        last = attempt == UPLOAD_RETRIES - 1
+        try:
+            response = session.request(method, url, timeout=REQUEST_TIMEOUT, **kwargs)
+            if last or not is_transient(response.status_code):
+                return response
+        except requests.RequestException:
+            if last:
+                raise
+        time.sleep(delay)
+        delay *= 2
+
+def start_resumable_upload(session, bucket, object_name, content_type, predefined_acl="publicRead", metadata=None):
+    """Open a resumable upload session and return its session URI."""
+    params = {"uploadType": "resumable", "name": object_name}
+    if predefined_acl:
+        params["predefinedAcl"] = predefined_acl
+    response = request_with_retry(
+        session, "POST",
+        f"{STORAGE_API_URL}/upload/storage/v1/b/{quote(bucket, safe='')}/o",
+        params=params,
+        json=object_resource(object_name, content_type, metadata),
+        headers={"X-Upload-Content-Type": content_type}
+    )
+    if response.status_code != 200:
+        raise UploadError(f"Could not start upload of {object_name}: {response.status_code} {response.text}")
+    return response.headers["Location"]
+
+def cancel_upload(session, session_uri):
+    """Abandon a resumable upload session (nothing is committed)."""
+    try:
+        session.delete(session_uri, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        pass
+
+def persisted_offset(response):
+    """Bytes Storage has persisted, from the Range header of a 308 response."""
+    range_header = response.headers.get("Range")
+    if not range_header:
+        return 0
+    return int(range_header.rsplit("-", 1)[1]) + 1
+
+def query_upload(session, session_uri, total=None):
+    """Ask Storage how much of an upload it has. Returns (offset, resource or None)."""
+    response = request_with_retry(
+        session, "PUT", session_uri,
+        headers={"Content-Range": f"bytes */{total if total is not None else '*'}"}
+    )
+    if response.status_code in (200, 201):
+        return None, response.json()
+    if response.status_code == 308:
+        return persisted_offset(response), None
+    raise UploadError(f"Upload status query failed: {response.status_code} {response.text}")
+
+def _crc32c_table():
+    """Lookup table for the reflected CRC32C (Castagnoli) polynomial."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+_CRC32C_TABLE = _crc32c_table()
+
+_fallback_warned = False
+
+class Crc32c:
+    """Incremental CRC32C, using google_crc32c or crcmod when installed."""
+
+    def __init__(self):
+        global _fallback_warned
+        if google_crc32c:
+            self._checksum = google_crc32c.Checksum()
+        elif crcmod:
+            self._checksum = crcmod.predefined.Crc("crc-32c")
+        else:
+            self._checksum = None
+            if not _fallback_warned:
+                _fallback_warned = True
+                print("⚠️  Neither google-crc32c nor crcmod is installed, using a slow pure-Python CRC32C "
+                      "(pip install google-crc32c)")
+        self._crc = 0
+
+    def update(self, data):
+        if self._checksum is not None:
+            self._checksum.update(data)
+            return
+        # Pure-Python fallback (slow, but only used without google_crc32c/crcmod)
+        table = _CRC32C_TABLE
+        crc = self._crc ^ 0xFFFFFFFF
+        for byte in data:
+            crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+        self._crc = crc ^ 0xFFFFFFFF
+
+    def digest(self):
+        if self._checksum is not None:
+            return self._checksum.digest()
+        return self._crc.to_bytes(4, "big")
+
+class ObjectHashes:
+    """CRC32C and MD5 of an upload, updated as its data passes.
+
+    With known values (see cached_file_hashes) nothing is hashed: update()
+    does nothing and values() returns them.
+    """
+
+    def __init__(self, known=None):
+        self.known = known
+        self.crc32c = Crc32c() if known is None else None
+        self.md5 = hashlib.md5()
+
+    def update(self, data):
+        if self.known is not None:
+            return
+        self.crc32c.update(data)
+        self.md5.update(data)
+
+    def values(self):
+        """Base64 hashes as Storage reports them: {"crc32c", "md5Hash"}."""
+        if self.known is not None:
+            return {"crc32c": self.known["crc32c"], "md5Hash": self.known["md5Hash"]}
+        return {
+            "crc32c": base64.b64encode(self.crc32c.digest()).decode(),
+            "md5Hash": base64.b64encode(self.md5.digest()).decode(),
+        }
+
+    def header(self):
+        """X-Goog-Hash value for the final request of an upload."""
+        values = self.values()
+        return f"crc32c={values['crc32c']},md5={values['md5Hash']}"
+
+def verify_upload(session, bucket, object_name, resource, hashes):
+    """Check the committed object's hashes against ours, deleting it on a mismatch.
+
+    Returns {"url", "size", "md5", "crc32c"} for a verified object.
+    """
+    expected = hashes.values()
+    for field, value in expected.items():
+        # md5Hash is missing only for composite objects; crc32c is always set
+        if field in resource or field == "crc32c":
+            if resource.get(field) != value:
+                delete_object(session, bucket, object_name)
+                raise UploadError(f"{field} mismatch for {object_name}: sent {value}, stored {resource.get(field)}")
+    return {
+        "url": public_url(bucket, object_name),
+        "size": int(resource.get("size", 0)),
+        "md5": expected["md5Hash"],
+        "crc32c": expected["crc32c"],
+    }
+
+def send_chunk(session, session_uri, data, offset, total=None, hashes=None):
+    """Upload data at offset, resuming after partial writes and transient errors.
+
+    total is set only on the final chunk, which also carries the hashes of the
+    whole object (X-Goog-Hash). Returns the object resource once committed,
+    else None.
+    """
+    sent = 0
+    delay = RETRY_BACKOFF
+    for attempt in range(UPLOAD_RETRIES):
+        start = offset + sent
+        end = offset + len(data) - 1
+        if start <= end:
+            content_range = f"bytes {start}-{end}/{total if total is not None else '*'}"
+        else:
+            content_range = f"bytes */{total}"  # Empty final chunk
+        headers = {"Content-Range": content_range}
+        if hashes:
+            headers["X-Goog-Hash"] = hashes
+
+        try:
+            response = session.put(session_uri, data=data[sent:], headers=headers, timeout=REQUEST_TIMEOUT)
+            if response.status_code in (200, 201):
+                return response.json()
+            if response.status_code == 308:
+                sent = max(persisted_offset(response) - offset, 0)
+                if sent >= len(data):
+                    return None
+                continue
+            if not is_transient(response.status_code):
+                raise UploadError(f"Upload rejected: {response.status_code} {response.text}")
+        except requests.RequestException as e:
+            print(f"   Chunk at {start} failed ({e}), retrying")
+
+        time.sleep(delay)
+        delay *= 2
+        try:
+            persisted, resource = query_upload(session, session_uri, total)
+        except requests.RequestException:
+            continue
+        if resource is not None:
+            return resource
+        sent = max(persisted - offset, 0)
+    raise UploadError(f"Chunk at {offset} failed after {UPLOAD_RETRIES} attempts")
+
+def read_chunks(stream, chunk_size, chunks, stop):
+    """Read fixed-size chunks from stream into a queue; a final b"" marks the end."""
+    try:
+        while not stop.is_set():
+            data = bytearray()
+            while len(data) < chunk_size:
+                block = stream.read(chunk_size - len(data))
+                if not block:
+                    break
+                data += block
+            chunks.put(bytes(data))
+            if len(data) < chunk_size:
+                if data:
+                    chunks.put(b"")
+                return
+    except (OSError, ValueError) as e:
+        chunks.put(e)
+
+def upload_stream(bucket, object_name, stream, content_type="video/mp4", chunk_size=UPLOAD_CHUNK_SIZE,
+                  before_commit=None, session=None, metadata=None):
+    """Upload a stream of unknown length through a resumable session.
+
+    before_commit() is called once the stream has ended, before the final
+    chunk is sent; if it returns False the session is cancelled and nothing
+    is committed (e.g. when the producing ffmpeg process failed).
+    Returns {"url", "size", "md5", "crc32c"} once Storage has committed and
+    verified the object.
+    """
+    session = session or default_session()
+    chunks = queue.Queue(maxsize=READ_AHEAD_CHUNKS)
+    stop = threading.Event()
+    reader = threading.Thread(target=read_chunks, args=(stream, chunk_size, chunks, stop), daemon=True)
+    session_uri = None
+    try:
+        session_uri = start_resumable_upload(session, bucket, object_name, content_type, metadata=metadata)
+        reader.start()
+        hashes = ObjectHashes()
+        offset = 0
+        data = chunks.get()
+        while True:
+            if isinstance(data, Exception):
+                raise UploadError(f"Reading {object_name} failed: {data}")
+            next_data = chunks.get() if data else None
+            if isinstance(next_data, Exception):
+                raise UploadError(f"Reading {object_name} failed: {next_data}")
+            hashes.update(data)
+
+            if next_data:
+                send_chunk(session, session_uri, data, offset)
+                offset += len(data)
+                data = next_data
+                continue
+
+            # Last chunk: only commit if the producer succeeded, with the checksums attached
+            if before_commit and not before_commit():
+                raise UploadError(f"Producer failed, {object_name} not committed")
+            total = offset + len(data)
+            resource = send_chunk(session, session_uri, data, offset, total, hashes.header())
+            if resource is None:
+                _, resource = query_upload(session, session_uri, total)
+            if resource is None:
+                raise UploadError(f"{object_name} was not committed")
+            session_uri = None
+            return verify_upload(session, bucket, object_name, resource, hashes)
+    except requests.RequestException as e:
+        raise UploadError(f"Upload of {object_name} failed: {e}")
+    finally:
+        stop.set()
+        if session_uri:
+            cancel_upload(session, session_uri)
+
+def _load_sessions():
+    """Saved resumable session URIs by bucket/object (caller holds _sessions_lock)."""
+    try:
+        with open(SESSIONS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _update_sessions(key, entry):
+    """Save (or with entry None, forget) the resumable session of an upload."""
+    with _sessions_lock:
+        sessions = _load_sessions()
+        if entry is None:
+            if sessions.pop(key, None) is None:
+                return
+        else:
+            sessions[key] = entry
+        SESSIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = SESSIONS_FILE.with_name(SESSIONS_FILE.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(sessions, f, indent=2)
+        tmp_path.replace(SESSIONS_FILE)
+
+def resume_session(session, key, signature, size):
+    """Reopen a saved session for the same file. Returns (session_uri, offset, resource)."""
+    with _sessions_lock:
+        saved = _load_sessions().get(key)
+    if not saved or saved["signature"] != signature:
+        return None, 0, None
+    try:
+        offset, resource = query_upload(session, saved["uri"], size)
+    except (UploadError, requests.RequestException):
+        # Expired (sessions last a week) or unknown: start over
+        _update_sessions(key, None)
+        return None, 0, None
+    return saved["uri"], offset or 0, resource
+
+def upload_resumable_file(session, bucket, object_name, path, content_type, metadata=None,
+                          chunk_size=UPLOAD_CHUNK_SIZE):
+    """Upload a local file in chunks through a resumable session that survives restarts.
+
+    The session URI is saved in SESSIONS_FILE, so an interrupted upload (even
+    in another run) continues from the last byte Storage acknowledged. The
+    bytes already sent are re-read locally to carry the CRC32C/MD5 forward.
+    Returns {"url", "size", "md5", "crc32c"} once the object is verified.
+    """
+    path = Path(path)
+    stat = path.stat()
+    size = stat.st_size
+    key = f"{bucket}/{object_name}"
+    signature = [size, stat.st_mtime_ns]
+
+    session_uri, offset, resource = resume_session(session, key, signature, size)
+    known = cached_file_hashes(path)
+    hashes = ObjectHashes(known)
+    with open(path, "rb") as f:
+        if resource is not None:
+            # Committed before the last run could record it
+            if known is None:
+                for block in iter(lambda: f.read(chunk_size), b""):
+                    hashes.update(block)
+            _update_sessions(key, None)
+            return verify_upload(session, bucket, object_name, resource, hashes)
+
+        if session_uri:
+            print(f"   Resuming {object_name} at {offset / (1024 * 1024):.1f}/{size / (1024 * 1024):.1f} MB")
+        else:
+            session_uri = start_resumable_upload(session, bucket, object_name, content_type, metadata=metadata)
+            _update_sessions(key, {"uri": session_uri, "signature": signature})
+
+        remaining = offset
+        if known is not None:
+            f.seek(offset)
+            remaining = 0
+        while remaining:
+            block = f.read(min(chunk_size, remaining))
+            if not block:
+                raise UploadError(f"{path} is shorter than the {offset} bytes already uploaded")
+            hashes.update(block)
+            remaining -= len(block)
+
+        while True:
+            data = f.read(chunk_size)
+            hashes.update(data)
+            if offset + len(data) < size:
+                send_chunk(session, session_uri, data, offset)
+                offset += len(data)
+                continue
+            resource = send_chunk(session, session_uri, data, offset, size, hashes.header())
+            if resource is None:
+                _, resource = query_upload(session, session_uri, size)
+            if resource is None:
+                raise UploadError(f"{object_name} was not committed")
+            _update_sessions(key, None)
+            uploaded = verify_upload(session, bucket, object_name, resource, hashes)
+            if known is None:
+                _store_file_hashes(path, stat, {"size": size, **hashes.values()})
+            return uploaded
+
+def upload_multipart(session, bucket, object_name, data, content_type, metadata=None, predefined_acl="publicRead",
+                     known=None):
+    """Upload data with its metadata, ACL and hashes in one request. Returns the verified upload.
+
+    known: the data's hashes if already computed (see cached_file_hashes).
+    """
+    hashes = ObjectHashes(known)
+    hashes.update(data)
+    resource = {**object_resource(object_name, content_type, metadata), **hashes.values()}
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+        f"{json.dumps(resource)}\r\n"
+        f"--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    params = {"uploadType": "multipart"}
+    if predefined_acl:
+        params["predefinedAcl"] = predefined_acl
+
+    delay = RETRY_BACKOFF
+    for attempt in range(UPLOAD_RETRIES):
+        try:
+            response = session.post(
+                f"{STORAGE_API_URL}/upload/storage/v1/b/{quote(bucket, safe='')}/o",
+                params=params,
+                data=body,
+                headers={"Content-Type": f"multipart/related; boundary={boundary}"},
+                timeout=REQUEST_TIMEOUT
+            )
+            if response.status_code in (200, 201):
+                return verify_upload(session, bucket, object_name, response.json(), hashes)
+            if not is_transient(response.status_code):
+                raise UploadError(f"Upload of {object_name} rejected: {response.status_code} {response.text}")
+        except requests.RequestException as e:
+            print(f"   Upload of {object_name} failed ({e}), retrying")
+        time.sleep(delay)
+        delay *= 2
+    raise UploadError(f"Upload of {object_name} failed after {UPLOAD_RETRIES} attempts")
+
+def upload_file(bucket, object_name, path, content_type=None, metadata=None, session=None):
+    """Upload a local file as a public-read object (multipart, or resumable when large).
+
+    The URL is only returned once Storage's CRC32C/MD5 match the file.
+    Returns {"url", "size", "md5", "crc32c"}; raises UploadError on failure.
+    """
+    path = Path(path)
+    session = session or default_session()
+    content_type = content_type or content_type_for(path)
+    try:
+        if path.stat().st_size > MULTIPART_LIMIT:
+            return upload_resumable_file(session, bucket, object_name, path, content_type, metadata)
+        return upload_multipart(session, bucket, object_name, path.read_bytes(), content_type, metadata,
+                                known=cached_file_hashes(path))
+    except requests.RequestException as e:
+        raise UploadError(f"Upload of {object_name} failed: {e}")
+
+def list_objects(bucket, prefix, session=None):
+    """List objects under prefix: {name: {"size", "md5Hash", "crc32c"}} (one paged listing)."""
+    session = session or default_session()
+    objects = {}
+    params = {"prefix": prefix, "fields": "items(name,size,md5Hash,crc32c),nextPageToken"}
+    while True:
+        try:
+            response = request_with_retry(
+                session, "GET", f"{STORAGE_API_URL}/storage/v1/b/{quote(bucket, safe='')}/o", params=params
+            )
+        except requests.RequestException as e:
+            raise UploadError(f"Could not list {prefix}: {e}")
+        if response.status_code != 200:
+            raise UploadError(f"Could not list {prefix}: {response.status_code} {response.text}")
+        listing = response.json()
+        for item in listing.get("items", []):
+            objects[item["name"]] = {
+                "size": int(item.get("size", 0)),
+                "md5Hash": item.get("md5Hash"),
+                "crc32c": item.get("crc32c"),
+            }
+        if not listing.get("nextPageToken"):
+            return objects
+        params["pageToken"] = listing["nextPageToken"]
+
+def _load_hash_cache():
+    """Cached local file hashes by path (caller holds _hash_cache_lock)."""
+    global _hash_cache
+    if _hash_cache is None:
+        try:
+            with open(HASH_CACHE_FILE) as f:
+                _hash_cache = json.load(f)
+        except (OSError, ValueError):
+            _hash_cache = {}
+    return _hash_cache
+
+def save_hash_cache():
+    """Write the local hash cache to disk atomically, if it changed.
+
+    Files that no longer exist are left out.
+    """
+    global _hash_cache_dirty
+    with _hash_cache_lock:
+        if not _hash_cache_dirty:
+            return
+        entries = {key: entry for key, entry in _load_hash_cache().items() if os.path.exists(key)}
+        HASH_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = HASH_CACHE_FILE.with_name(HASH_CACHE_FILE.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        tmp_path.replace(HASH_CACHE_FILE)
+        _hash_cache_dirty = False
+
+atexit.register(save_hash_cache)
+
+def cached_file_hashes(path, stat=None):
+    """Cached file_hashes() of a local file, or None if it changed or was never hashed."""
+    path = Path(path)
+    stat = stat or path.stat()
+    signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+    with _hash_cache_lock:
+        cached = _load_hash_cache().get(str(path.resolve()))
+    if cached and cached["signature"] == signature:
+        return cached["hashes"]
+    return None
+
+def _store_file_hashes(path, stat, values):
+    """Cache a local file's hashes under its current signature (written at exit, see save_hash_cache)."""
+    global _hash_cache_dirty
+    signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+    with _hash_cache_lock:
+        _load_hash_cache()[str(Path(path).resolve())] = {"signature": signature, "hashes": values}
+        _hash_cache_dirty = True
+
+def file_hashes(path):
+    """{"size", "md5Hash", "crc32c"} of a local file as Storage reports them.
+
+    Cached by path, size, mtime and inode, so unchanged files aren't re-read.
+    """
+    path = Path(path)
+    stat = path.stat()
+    cached = cached_file_hashes(path, stat)
+    if cached:
+        return cached
+
+    hashes = ObjectHashes()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            hashes.update(block)
+    values = {"size": stat.st_size, **hashes.values()}
+    _store_file_hashes(path, stat, values)
+    return values
+
+def is_same_object(local, remote):
+    """Whether a remote object already holds a local file (size and MD5, or CRC32C)."""
+    if not remote or remote["size"] != local["size"]:
+        return False
+    if remote.get("md5Hash"):
+        return remote["md5Hash"] == local["md5Hash"]
+    return remote.get("crc32c") == local["crc32c"]
+
+def playlist_files(playlist_path):
+    """Local files a playlist publishes: itself and every file it names, following media playlists.
+
+    Referenced objects and relative URIs are matched to local files under
+    the playlist's directory by their unhashed names. Returns (paths,
+    missing names).
+    """
+    playlist_path = Path(playlist_path)
+    local = {}
+    for path in sorted(playlist_path.parent.rglob("*")):
+        if path.is_file():
+            local.setdefault(path.name, path)
+    paths, missing = [playlist_path], []
+    pending = [playlist_path]
+    while pending:
+        playlist = hls_playlist.load(pending.pop())
+        for uri in playlist_uris(playlist):
+            reference = parse_object_url(uri)
+            if reference:
+                object_name = reference[1]
+            elif not urlparse(uri).scheme:
+                object_name = unquote(urlparse(uri).path)  # Relative to the playlist
+            else:
+                continue
+            name = unhashed_name(object_name.rsplit("/", 1)[-1])
+            path = local.get(name)
+            if path is None:
+                if name not in missing:
+                    missing.append(name)
+            elif path not in paths:
+                paths.append(path)
+                if path.suffix == ".m3u8":
+                    pending.append(path)
+    return paths, missing
+
+def read_object(session, bucket, object_name):
+    """Contents of an object (bytes), or None if it does not exist."""
+    try:
+        response = request_with_retry(
+            session, "GET",
+            f"{STORAGE_API_URL}/storage/v1/b/{quote(bucket, safe='')}/o/{quote(object_name, safe='')}",
+            params={"alt": "media"}
+        )
+    except requests.RequestException as e:
+        raise UploadError(f"Could not read {object_name}: {e}")
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise UploadError(f"Could not read {object_name}: {response.status_code} {response.text}")
+    return response.content
+
+def referenced_objects(session, bucket, playlists):
+    """Object names in bucket referenced by playlists: local paths or remote object names."""
+    references = set()
+    for playlist in playlists:
+        if isinstance(playlist, Path):
+            parsed = hls_playlist.load(playlist)
+        else:
+            data = read_object(session, bucket, playlist)
+            if data is None:
+                continue
+            parsed = hls_playlist.parse_text(data.decode(errors="replace"))
+        references |= {name for ref_bucket, name in playlist_references(parsed) if ref_bucket == bucket}
+    return references
+
+def sync_files(bucket, prefix, paths, delete=False, max_workers=UPLOAD_WORKERS, metadata=None, session=None):
+    """Make prefix/ match the given local files, uploading only what changed.
+
+    Files are published under object_name_for() names. The prefix is listed
+    once and local files are hashed in parallel (with cached hashes).
+    Missing or changed objects are uploaded.
+
+    With delete, only stale versions of the given files are removed: objects
+    whose unhashed name is one of theirs (other files under prefix/ are
+    left alone) and that neither the local playlists nor the remote ones
+    they replace reference, so players still holding the previous playlists
+    keep working.
+
+    Returns {"uploaded": {name: url}, "unchanged": {name: url},
+    "failed": [names], "deleted": [object names]}.
+    """
+    session = session or default_session()
+    prefix = prefix.strip("/")
+    paths = [Path(p) for p in paths]
+    remote = list_objects(bucket, f"{prefix}/", session)
+    if delete:
+        # Read before the uploads replace them
+        previous = [f"{prefix}/{path.name}" for path in paths
+                    if path.suffix == ".m3u8" and f"{prefix}/{path.name}" in remote]
+        keep = referenced_objects(session, bucket, previous)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        local = dict(zip(paths, executor.map(file_hashes, paths)))
+    save_hash_cache()
+
+    result = {"uploaded": {}, "unchanged": {}, "failed": [], "deleted": []}
+    object_names = {path: f"{prefix}/{object_name_for(path)}" for path in paths}
+    uploads = []
+    for path in paths:
+        object_name = object_names[path]
+        if is_same_object(local[path], remote.get(object_name)):
+            result["unchanged"][path.name] = public_url(bucket, object_name)
+        else:
+            uploads.append((path, object_name))
+
+    sent = 0
+    for (path, _), upload in zip(uploads, upload_files(bucket, uploads, max_workers, metadata, session).values()):
+        if upload:
+            result["uploaded"][path.name] = upload["url"]
+            sent += local[path]["size"]
+        else:
+            result["failed"].append(path.name)
+    print(f"   {len(result['uploaded'])} uploaded ({sent / 1024:.1f} KB), {len(result['unchanged'])} unchanged")
+
+    if delete:
+        wanted = set(object_names.values())
+        keep |= wanted | referenced_objects(session, bucket, [path for path in paths if path.suffix == ".m3u8"])
+        managed = {unhashed_name(object_name) for object_name in wanted}
+        for object_name in sorted(set(remote) - keep):
+            if unhashed_name(object_name) not in managed:
+                continue
+            try:
+                delete_object(session, bucket, object_name)
+                result["deleted"].append(object_name)
+            except (UploadError, requests.RequestException) as e:
+                print(f"   ❌ Could not delete {object_name}: {e}")
+    return result
+
+def upload_files(bucket, uploads, max_workers=UPLOAD_WORKERS, metadata=None, session=None):
+    """Upload [(path, object_name)] concurrently over the pooled session.
+
+    Pass a session from create_session(max_workers) when using more workers
+    than the default pool holds. Returns {object_name: upload_file() result,
+    or None if it failed}.
+    """
+    session = session or default_session()
+
+    def upload(job):
+        path, object_name = job
+        try:
+            return object_name, upload_file(bucket, object_name, path, metadata=metadata, session=session)
+        except (UploadError, OSError) as e:
+            print(f"   ❌ {object_name}: {e}")
+            return object_name, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(executor.map(upload, uploads))
+
+def delete_object(session, bucket, object_name):
+    """Delete an object (ignoring one that does not exist)."""
+    response = request_with_retry(
+        session, "DELETE",
+        f"{STORAGE_API_URL}/storage/v1/b/{quote(bucket, safe='')}/o/{quote(object_name, safe='')}"
+    )
+    if response.status_code not in (200, 204, 404):
+        raise UploadError(f"Could not delete {object_name}: {response.status_code} {response.text}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Upload files (or stdin) to Cloud Storage as public-read objects')
+    parser.add_argument('bucket', help='Bucket name, e.g. my-project.appspot.com')
+    parser.add_argument('path', help='Storage path for files, or the object name when reading stdin')
+    parser.add_argument('files', nargs='+', help='Files to upload, or - to stream stdin')
+    parser.add_argument('--content-type', help='Content-Type (default: by extension, video/mp4 for stdin)')
+    parser.add_argument('--workers', type=int, default=UPLOAD_WORKERS, help='Concurrent uploads')
+    args = parser.parse_args()
+
+    if args.files == ["-"]:
+        try:
+            result = upload_stream(args.bucket, args.path, sys.stdin.buffer, args.content_type or "video/mp4")
+        except UploadError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Uploaded {result['size'] / (1024 * 1024):.2f} MB (md5 {result['md5']})")
+        print(f"   {result['url']}")
+        return
+
+    uploads = [(Path(f), f"{args.path.strip('/')}/{object_name_for(f)}") for f in args.files]
+    results = upload_files(args.bucket, uploads, args.workers)
+    for object_name, result in results.items():
+        if result:
+            print(f"✅ {object_name}: {result['url']}")
+    if not all(results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,77 +2,147 @@
 """
 Generate m3u8 playlists for already downloaded videos.
 Use this after videos are downloaded and trimmed.
+If landing_video_audio.mp4 exists (see download_and_trim_m3u8.AUDIO_GROUP),
+it is listed once as an audio group that every resolution refers to.
 """
 
 import json
 from pathlib import Path
 from urllib.parse import quote
 
+import gcs_storage
+import hls_package
+import hls_playlist
+import media_probe
+
 OUTPUT_DIR = Path("downloaded_videos")
 FIREBASE_STORAGE_PATH = "videos/landing"
 PROJECT_ID = "genaivideogenerator"
 STORAGE_BUCKET = "genaivideogenerator.firebasestorage.app"
+HLS_LAYOUT = "byterange"  # "byterange" (segmented, MP4s are fragmented in place) or "single"
+SEGMENT_DURATION = 6.0  # Target HLS segment length in seconds
+IFRAME_PLAYLISTS = True  # I-frame playlist per byte-range rendition, for trick play and scrubbing
+AUDIO_GROUP_ID = "audio"  # GROUP-ID of landing_video_audio.mp4, when the resolutions are video only
+
+# Fallback CODECS attribute when a video can't be probed
+DEFAULT_CODECS = "mp4a.40.2,avc1.640020"
 
-# Resolution data
+# Resolution data (bandwidth is only a fallback; playlists use the measured bitrate)
 RESOLUTIONS = [
     {"name": "1280x720", "bandwidth": 2372879},
     {"name": "640x360", "bandwidth": 889250},
     {"name": "480x270", "bandwidth": 308531},
 ]
 
-def get_video_duration(video_path):
-    """Get video duration using ffprobe."""
-    import subprocess
-    try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(video_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
-    except:
-        return 63.0  # Default
-
 def generate_individual_m3u8(video_url, output_path, duration):
     """Generate individual m3u8 playlist."""
-    lines = [
-        "#EXTM3U",
-        "#EXT-X-VERSION:6",
-        f"#EXTINF:{duration:.6f},",
-        video_url,
-        "#EXT-X-ENDLIST"
-    ]
-    
-    with open(output_path, "w") as f:
-        f.write("\n".join(lines))
+    playlist = hls_playlist.MediaPlaylist(segments=[hls_playlist.Segment(video_url, duration)])
+    hls_playlist.write(playlist, output_path)
     
     print(f"✅ Generated: {output_path.name}")
 
-def generate_master_playlist(resolutions_data, output_path, base_url_prefix):
-    """Generate master m3u8 playlist pointing directly to MP4 files."""
-    lines = [
-        "#EXTM3U",
-        "#EXT-X-VERSION:6",
-        "#EXT-X-INDEPENDENT-SEGMENTS",
-        ""
-    ]
+def master_variant(res):
+    """Master playlist entry for a resolution, preferring values measured from the output file."""
+    # Byte-range layout: point to the segmented m3u8 playlists.
+    # Single layout: point directly to MP4 files (not individual m3u8 files),
+    # HLS can work with regular MP4 files when pointed to directly
+    return hls_playlist.Variant(
+        res['playlist_url'],
+        res['bandwidth'],
+        average_bandwidth=res.get("average_bandwidth"),
+        resolution=res.get('resolution') or res['name'],
+        codecs=res.get("codecs") or DEFAULT_CODECS,
+        audio=res.get("audio")
+    )
+
+def master_iframe_stream(res):
+    """I-frame stream entry for a resolution with an I-frame playlist."""
+    iframes = res["iframes"]
+    return hls_playlist.IFrameStream(
+        iframes["url"],
+        iframes["bandwidth"],
+        average_bandwidth=iframes["average_bandwidth"],
+        resolution=res.get('resolution') or res['name'],
+        codecs=iframes["codecs"]
+    )
+
+def generate_iframe_playlist(mp4_file, mp4_url, output_path, url):
+    """Write a rendition's I-frame playlist. Returns its master entry values, or None if it fails."""
+    try:
+        hls_package.package_iframes(mp4_file, mp4_url, output_path)
+        bandwidth = hls_package.iframe_bandwidth(hls_playlist.load(output_path))
+    except ValueError as e:
+        print(f"⚠️  No I-frame playlist for {mp4_file.name} ({e})")
+        return None
+    print(f"✅ Generated: {output_path.name}")
+    stream = media_probe.get_stream(media_probe.probe(mp4_file), "video")
+    return {
+        "url": url,
+        "bandwidth": bandwidth["peak"],
+        "average_bandwidth": bandwidth["average"],
+        "codecs": media_probe.get_stream_codec_string(stream) if stream else None
+    }
+
+def measured_bandwidth(m3u8_file):
+    """BANDWIDTH/AVERAGE-BANDWIDTH of a byte-range playlist's segments (see hls_package.segment_bandwidth)."""
+    bandwidth = hls_package.segment_bandwidth(m3u8_file)
+    if not bandwidth:
+        return {}
+    return {"bandwidth": bandwidth["peak"], "average_bandwidth": bandwidth["average"]}
+
+def generate_audio_playlist(base_url_prefix):
+    """Write the playlist of the shared audio file, if there is one. Returns its master entry values, or None."""
+    mp4_file = OUTPUT_DIR / "landing_video_audio.mp4"
+    m3u8_file = OUTPUT_DIR / "landing_video_audio.m3u8"
+    if not mp4_file.exists():
+        return None
     
-    for res in sorted(resolutions_data, key=lambda x: x['bandwidth'], reverse=True):
-        name = res['name']
-        bandwidth = res['bandwidth']
-        # Point directly to MP4 files (not individual m3u8 files)
-        # HLS can work with regular MP4 files when pointed to directly
-        mp4_url = res['mp4_url']
-        
-        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={name},CODECS="mp4a.40.2,avc1.640020"')
-        lines.append(mp4_url)
-        lines.append("")
+    segmented = HLS_LAYOUT == "byterange" and hls_package.ensure_fragmented(mp4_file)
+    mp4_path = f"{FIREBASE_STORAGE_PATH}/{gcs_storage.object_name_for(mp4_file)}"
+    mp4_url = f"{base_url_prefix}{quote(mp4_path, safe='')}?alt=media"
+    if segmented:
+        try:
+            hls_package.package_byterange(mp4_file, mp4_url, m3u8_file, SEGMENT_DURATION)
+            print(f"✅ Generated: {m3u8_file.name}")
+        except ValueError as e:
+            print(f"⚠️  Byte-range packaging failed for the audio ({e}), using a single segment")
+            segmented = False
+    if not segmented:
+        # The audio group needs a media playlist, even in the single layout
+        generate_individual_m3u8(mp4_url, m3u8_file, media_probe.get_video_duration(mp4_file) or 63.0)
+    
+    m3u8_path = f"{FIREBASE_STORAGE_PATH}/{m3u8_file.name}"
+    variant_stats = media_probe.get_variant_stats(mp4_file, window=SEGMENT_DURATION)
+    if segmented:
+        variant_stats.update(measured_bandwidth(m3u8_file))
+    stream = media_probe.get_stream(media_probe.probe(mp4_file), "audio")
+    return {
+        "url": f"{base_url_prefix}{quote(m3u8_path, safe='')}?alt=media",
+        "bandwidth": variant_stats["bandwidth"] or 0,
+        "average_bandwidth": variant_stats["average_bandwidth"] or 0,
+        "codecs": variant_stats["codecs"],
+        "channels": str(stream["channels"]) if stream and stream.get("channels") else None
+    }
+
+def generate_master_playlist(resolutions_data, output_path, audio=None):
+    """Generate master m3u8 playlist pointing to each resolution's playlist URL (and I-frame playlist).
     
-    with open(output_path, "w") as f:
-        f.write("\n".join(lines))
+    With audio (see generate_audio_playlist) it is listed once as the
+    AUDIO_GROUP_ID group.
+    """
+    resolutions_data = sorted(resolutions_data, key=lambda x: x['bandwidth'], reverse=True)
+    media = []
+    if audio:
+        media.append(hls_playlist.Media(
+            "AUDIO", AUDIO_GROUP_ID, "Audio", uri=audio["url"], default=True, autoselect=True,
+            channels=audio["channels"]
+        ))
+    master = hls_playlist.MasterPlaylist(
+        variants=[master_variant(res) for res in resolutions_data],
+        media=media,
+        iframe_streams=[master_iframe_stream(res) for res in resolutions_data if res.get("iframes")]
+    )
+    hls_playlist.write(master, output_path)
     
     print(f"✅ Generated: {output_path.name}")
 
@@ -85,6 +155,12 @@ def main():
     
     resolutions_data = []
     
+    # Probe all videos in parallel up front; later lookups hit the probe cache
+    media_probe.probe_directory(OUTPUT_DIR, "landing_video_*.mp4")
+    
+    # Shared audio group, when the resolutions were downloaded video only
+    audio = generate_audio_playlist(base_url_prefix)
+    
     # Generate individual playlists
     for res in RESOLUTIONS:
         name = res["name"]
@@ -95,31 +171,67 @@ def main():
             print(f"⚠️  Skipping {name}: MP4 file not found")
             continue
         
-        # Get duration
-        duration = get_video_duration(mp4_file)
+        # Byte-range playlists need a fragmented MP4 (rewritten in place if it isn't one)
+        segmented = HLS_LAYOUT == "byterange" and hls_package.ensure_fragmented(mp4_file)
+        
+        # Get duration and measured bitrate/codecs
+        duration = media_probe.get_video_duration(mp4_file) or 63.0  # Default
+        variant_stats = media_probe.get_variant_stats(mp4_file, window=SEGMENT_DURATION)
         
         # Generate MP4 URL - encode the full path including the slash
-        mp4_path = f"{FIREBASE_STORAGE_PATH}/landing_video_{name}.mp4"
+        # (content-hashed, as uploaded by download_upload_m3u8_complete.py / upload_existing_videos.py)
+        mp4_path = f"{FIREBASE_STORAGE_PATH}/{gcs_storage.object_name_for(mp4_file)}"
         mp4_url = f"{base_url_prefix}{quote(mp4_path, safe='')}?alt=media"
         
         # Generate individual m3u8
-        generate_individual_m3u8(mp4_url, m3u8_file, duration)
+        if segmented:
+            try:
+                hls_package.package_byterange(mp4_file, mp4_url, m3u8_file, SEGMENT_DURATION)
+                print(f"✅ Generated: {m3u8_file.name}")
+            except ValueError as e:
+                print(f"⚠️  Byte-range packaging failed for {name} ({e}), using a single segment")
+                segmented = False
+        if segmented:
+            variant_stats.update(measured_bandwidth(m3u8_file))
+        else:
+            generate_individual_m3u8(mp4_url, m3u8_file, duration)
         
         # Generate m3u8 URL - encode the full path including the slash
         m3u8_path = f"{FIREBASE_STORAGE_PATH}/landing_video_{name}.m3u8"
         m3u8_url = f"{base_url_prefix}{quote(m3u8_path, safe='')}?alt=media"
         
-        resolutions_data.append({
+        iframes = None
+        if segmented and IFRAME_PLAYLISTS:
+            iframe_file = hls_package.iframe_playlist_path(m3u8_file)
+            iframe_path = f"{FIREBASE_STORAGE_PATH}/{iframe_file.name}"
+            iframe_url = f"{base_url_prefix}{quote(iframe_path, safe='')}?alt=media"
+            iframes = generate_iframe_playlist(mp4_file, mp4_url, iframe_file, iframe_url)
+        
+        data = {
             "name": name,
-            "bandwidth": res["bandwidth"],
+            "bandwidth": variant_stats["bandwidth"] or res["bandwidth"],
+            "average_bandwidth": variant_stats["average_bandwidth"],
+            "codecs": variant_stats["codecs"],
+            "resolution": variant_stats["resolution"],
             "mp4_url": mp4_url,
-            "m3u8_url": m3u8_url
-        })
+            "m3u8_url": m3u8_url,
+            "playlist_url": m3u8_url if segmented else mp4_url,
+            "iframes": iframes
+        }
+        if audio:
+            # BANDWIDTH and CODECS of a variant cover the audio rendition played with it
+            data["bandwidth"] += audio["bandwidth"]
+            if data["average_bandwidth"]:
+                data["average_bandwidth"] += audio["average_bandwidth"]
+            if data["codecs"] and audio["codecs"]:
+                data["codecs"] = f"{audio['codecs']},{data['codecs']}"
+            data["audio"] = AUDIO_GROUP_ID
+        resolutions_data.append(data)
     
     # Generate master playlist
     if resolutions_data:
         master_file = OUTPUT_DIR / "landing_video_master.m3u8"
-        generate_master_playlist(resolutions_data, master_file, base_url_prefix)
+        generate_master_playlist(resolutions_data, master_file, audio)
         
         master_path = f"{FIREBASE_STORAGE_PATH}/landing_video_master.m3u8"
         master_url = f"{base_url_prefix}{quote(master_path, safe='')}?alt=media"
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Native HLS client used by the m3u8 download scripts.
+Resolves master and media playlists (see hls_playlist.py), downloads .ts/fMP4 segments concurrently
+over a pooled HTTP session, and remuxes the local copies to MP4 with ffmpeg.
+
+Segments are cached per playlist under CACHE_DIR, so an interrupted download
+resumes where it stopped instead of starting over. Concurrent downloads of
+the same playlist share its cache: one fetches while the others wait, and
+the last one to finish removes it. download_audio() fetches only the audio
+rendition of a variant (for a shared audio group). stream_hls() instead
+remuxes straight from the network to a pipe, for uploads without local files
+(its trims cut at packet boundaries, a pipe can't be smart cut).
+
+Requirements:
+    pip install requests   (ffmpeg is still used for the final remux)
+
+Usage:
+  python3 hls_client.py <m3u8_url> <output.mp4> [--resolution 1280x720]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import end_card
+import ffmpeg_runner
+import hls_playlist
+import media_probe
+import smart_cut
+
+# Configuration
+CACHE_DIR = Path("downloaded_videos") / ".hls_cache"
+MAX_WORKERS = 8  # Concurrent segment downloads per playlist
+SEGMENT_RETRIES = 4  # Attempts per segment before giving up
+RETRY_BACKOFF = 0.5  # Seconds, doubled after every failed attempt
+REQUEST_TIMEOUT = 30  # Seconds
+CHUNK_SIZE = 64 * 1024
+SMART_CUT = True  # Frame-exact trims (see smart_cut.py); False cuts at packet boundaries
+LOCAL_PLAYLIST_ARGS = ["-allowed_extensions", "ALL"]  # ffmpeg input options for the local playlists
+
+_segment_caches = {}  # Cache directory: [fetch lock, downloads using it]
+_segment_caches_lock = threading.Lock()
+
+def create_session(pool_size=MAX_WORKERS):
+    """Create an HTTP session whose connection pool fits pool_size workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_playlist(session, url):
+    """Fetch and parse a playlist, streaming its lines (see hls_playlist.parse)."""
+    with session.get(url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        return hls_playlist.parse(response.iter_lines(), url)
+
+def fetch_media_playlist(session, url):
+    """Fetch a media playlist; raises ValueError for a master or an encrypted playlist."""
+    playlist = fetch_playlist(session, url)
+    if isinstance(playlist, hls_playlist.MasterPlaylist):
+        raise ValueError(f"Expected a media playlist: {url}")
+    if playlist.encrypted:
+        raise ValueError("Encrypted HLS streams are not supported")
+    return playlist
+
+def select_variant(master, resolution=None):
+    """Pick the variant matching resolution (e.g. "1280x720"), else the highest bandwidth."""
+    variants = master.variants
+    if not variants:
+        raise ValueError("Master playlist has no variant streams")
+    if resolution:
+        for variant in variants:
+            if variant.resolution == resolution or resolution in variant.uri:
+                return variant
+        raise ValueError(f"No variant with resolution {resolution}")
+    return max(variants, key=lambda v: v.bandwidth)
+
+def select_audio(master, variant):
+    """Pick the audio rendition for a variant's AUDIO group (default rendition first)."""
+    if not variant.audio:
+        return None
+    renditions = [
+        m for m in master.media
+        if m.type == "AUDIO" and m.group_id == variant.audio and m.uri
+    ]
+    if not renditions:
+        return None
+    return next((m for m in renditions if m.default), renditions[0])
+
+def select_window(segments, max_duration):
+    """Select the leading segments that cover max_duration seconds.
+
+    One extra segment past the window is kept as the keyframe-aligned
+    boundary, so a stream-copy trim can still cut exactly at max_duration.
+    """
+    if max_duration is None:
+        return segments
+    elapsed = 0.0
+    for index, segment in enumerate(segments):
+        if elapsed >= max_duration:
+            return segments[:index + 1]
+        elapsed += segment.duration
+    return segments
+
+def segment_filename(index, uri):
+    """Local cache name for a segment, keeping the original extension."""
+    suffix = Path(urlparse(uri).path).suffix or ".ts"
+    return f"seg_{index:05d}{suffix}"
+
+def write_range(response, dest, start, length):
+    """Write bytes start..start+length of a full (200) response body to dest."""
+    position = 0
+    with open(dest, "wb") as f:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            end = position + len(chunk)
+            if end > start:
+                f.write(chunk[max(start - position, 0):start + length - position])
+            position = end
+            if position >= start + length:
+                break
+
+def download_segment(session, uri, dest, byterange=None):
+    """Download one segment to dest, resuming a .part file and retrying on failure."""
+    if dest.exists():
+        return dest.stat().st_size  # Finished on a previous run
+
+    part = dest.with_name(dest.name + ".part")
+    delay = RETRY_BACKOFF
+    for attempt in range(1, SEGMENT_RETRIES + 1):
+        try:
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {}
+            if byterange:
+                start, length = byterange
+                if offset >= length:
+                    offset = 0
+                headers["Range"] = f"bytes={start + offset}-{start + length - 1}"
+            elif offset:
+                headers["Range"] = f"bytes={offset}-"
+
+            with session.get(uri, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                response.raise_for_status()
+                if byterange and response.status_code != 206:
+                    # The server ignored our Range header and sent the whole
+                    # resource: keep only the segment's byte range
+                    write_range(response, part, start, length)
+                else:
+                    # A 200 means the server ignored our Range header, so start over
+                    mode = "ab" if offset and response.status_code == 206 else "wb"
+                    with open(part, mode) as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+
+            if byterange and part.stat().st_size != length:
+                size = part.stat().st_size
+                part.unlink()
+                raise ValueError(f"{uri} returned {size} bytes for a {length}-byte range")
+            part.replace(dest)
+            return dest.stat().st_size
+        except (requests.RequestException, OSError) as e:
+            if attempt == SEGMENT_RETRIES:
+                raise
+            print(f"   ⚠️  Segment {dest.name} failed ({e}), retry {attempt}/{SEGMENT_RETRIES - 1}")
+            time.sleep(delay)
+            delay *= 2
+
+@contextlib.contextmanager
+def segment_cache(playlist_url, keep=False):
+    """Use the segment cache directory of a playlist; yields (work_dir, fetch lock).
+
+    Downloads of the same playlist running at once share the directory.
+    The last one to leave removes it, unless keep is set or it failed (so
+    a rerun resumes).
+    """
+    work_dir = CACHE_DIR / hashlib.sha1(playlist_url.encode()).hexdigest()[:16]
+    with _segment_caches_lock:
+        entry = _segment_caches.setdefault(work_dir, [threading.Lock(), 0])
+        entry[1] += 1
+    succeeded = False
+    try:
+        yield work_dir, entry[0]
+        succeeded = True
+    finally:
+        with _segment_caches_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _segment_caches[work_dir]
+                if succeeded and not keep:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+
+def download_media_playlist(session, playlist_url, cache, max_workers=MAX_WORKERS, max_duration=None):
+    """Download the segments of a media playlist and write a local playlist for them.
+
+    cache is the (work_dir, fetch lock) of segment_cache(); segments another
+    download already fetched there are reused. With max_duration only the
+    segments covering the first max_duration seconds (plus one boundary
+    segment) are fetched.
+    Returns (local_playlist, source_duration): the local .m3u8 that ffmpeg
+    can remux from, and the full stream duration from #EXTINF (None when the
+    playlist has no #EXT-X-ENDLIST or is missing segment durations).
+    """
+    playlist = fetch_media_playlist(session, playlist_url)
+    all_segments = playlist.segments
+    if not all_segments:
+        raise ValueError(f"Media playlist has no segments: {playlist_url}")
+    source_duration = playlist.duration()
+
+    segments = select_window(all_segments, max_duration)
+    if len(segments) < len(all_segments):
+        kept = sum(s.duration for s in segments)
+        total = sum(s.duration for s in all_segments)
+        print(f"   Fetching {len(segments)}/{len(all_segments)} segments ({kept:.1f}s of {total:.1f}s) for a {max_duration}s window")
+
+    work_dir, fetch_lock = cache
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    local = hls_playlist.MediaPlaylist(target_duration=playlist.target_duration, independent_segments=False)
+    jobs = []
+    init = playlist.init
+    if init:
+        init_name = "init" + (Path(urlparse(init.uri).path).suffix or ".mp4")
+        jobs.append((init.uri, work_dir / init_name, init.byterange))
+        local.init = hls_playlist.InitSection(init_name)
+
+    for index, segment in enumerate(segments):
+        name = segment_filename(index, segment.uri)
+        jobs.append((segment.uri, work_dir / name, segment.byterange))
+        local.segments.append(hls_playlist.Segment(name, segment.duration, discontinuity=segment.discontinuity))
+
+    # One download at a time writes the .part files, the others then reuse its segments
+    with fetch_lock:
+        cached = sum(1 for _, dest, _ in jobs if dest.exists())
+        print(f"   {len(segments)} segments, {max_workers} workers" + (f", {cached} already cached" if cached else ""))
+
+        total_bytes = 0
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(download_segment, session, uri, dest, byterange) for uri, dest, byterange in jobs]
+            try:
+                for future in as_completed(futures):
+                    total_bytes += future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        elapsed = max(time.time() - started, 1e-6)
+        print(f"   Fetched {total_bytes / (1024 * 1024):.2f} MB in {elapsed:.1f}s ({total_bytes / elapsed / (1024 * 1024):.2f} MB/s)")
+
+        # Named by window, downloads of different lengths share the directory
+        local_playlist = work_dir / f"local_{len(segments)}.m3u8"
+        with open(local_playlist, "w") as f:
+            f.write(hls_playlist.dumps(local))
+    return local_playlist, source_duration
+
+def probe_frame_rate(local_playlist):
+    """Read the video frame rate of a downloaded local playlist with ffprobe."""
+    data = media_probe.probe(local_playlist, use_cache=False, input_args=LOCAL_PLAYLIST_ARGS)
+    stream = media_probe.get_stream(data, "video")
+    return media_probe.parse_frame_rate(stream.get("r_frame_rate")) if stream else None
+
+def resolve_trim(source_duration, target_duration=None, frames_to_trim=None, fps=None):
+    """Work out the output duration for a trim, or None when no trim applies.
+
+    Mirrors trim_video(): target_duration wins over frames_to_trim, and a
+    trim that would keep the whole source (or nothing) is skipped.
+    """
+    if source_duration is None:
+        return None
+    if target_duration is not None:
+        new_duration = min(target_duration, source_duration)
+    elif frames_to_trim is not None and fps:
+        new_duration = source_duration - frames_to_trim / fps
+    else:
+        return None
+    if new_duration <= 0 or new_duration >= source_duration:
+        return None
+    return new_duration
+
+def remux_command(inputs, output, duration=None, movflags=None, input_args=(), audio=True, frames=None, video=True):
+    """ffmpeg command remuxing playlists (video first, then optional audio) into one MP4.
+
+    With duration the output is cut to that many seconds in the same pass,
+    and with frames the video to that many frames; movflags (e.g. to write
+    a fragmented MP4) are passed through to the muxer. Without audio only
+    the video streams are kept, without video only the audio streams.
+    """
+    cmd = ["ffmpeg", "-v", "error"]
+    for playlist in inputs:
+        cmd += [*input_args, "-i", str(playlist)]
+    for index in range(len(inputs)):
+        cmd += ["-map", f"{index}:a" if not video else f"{index}" if audio else f"{index}:v"]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.6f}"]  # Keep first N seconds
+    if frames is not None:
+        cmd += ["-frames:v", str(frames)]
+    if movflags:
+        cmd += ["-movflags", movflags]
+    cmd += [
+        "-c", "copy",
+        "-bsf:a", "aac_adtstoasc",
+        "-f", "mp4",
+        "-y",
+        str(output)
+    ]
+    return cmd
+
+def remux(local_playlists, output_path, duration=None, movflags=None, audio=True, frames=None, video=True):
+    """Remux local playlists (video first, then optional audio) into one MP4 file."""
+    cmd = remux_command(
+        local_playlists, output_path, duration, movflags, input_args=LOCAL_PLAYLIST_ARGS, audio=audio, frames=frames,
+        video=video
+    )
+    ffmpeg_runner.run(cmd, duration=duration)
+
+def detect_end_card(input_path):
+    """end_card.detect() on input_path, or None when nothing was found or detection isn't possible."""
+    try:
+        card = end_card.detect(input_path)
+    except (ValueError, subprocess.CalledProcessError) as e:
+        print(f"   ⚠️  End card detection failed ({e}), using the configured trim")
+        return None
+    print(f"   🔎 {end_card.describe(card)}" if card else "   🔎 No end card found, using the configured trim")
+    return card
+
+def remux_trimmed(local_playlists, output_path, duration, movflags=None, frames_to_trim=None, auto_trim=False,
+                  audio=True):
+    """Remux local playlists and cut them to duration seconds, frame-exactly.
+
+    With frames_to_trim the smart cut drops exactly that many video frames
+    instead (duration is then only used by the fallback). With auto_trim the
+    end card or watermark found by end_card.py is cut off instead, when there
+    is one; otherwise duration applies (None leaves the output untrimmed).
+    Falls back to a copy cut at packet boundaries when the smart cut fails.
+
+    When a copy cut already ends right before a keyframe (e.g. on a segment
+    boundary) it is frame-exact, and the playlists are remuxed straight to
+    the output. Otherwise the smart cut and end card detection work on an
+    untrimmed MP4 remuxed first: they seek, and ffmpeg's HLS demuxer can't
+    seek reliably in local (fMP4) playlists.
+
+    Returns the trimmed duration, or None if the output was left untrimmed.
+    """
+    if not auto_trim and (not SMART_CUT or (duration is None and not frames_to_trim)):
+        remux(local_playlists, output_path, duration, movflags, audio)
+        return duration
+    untrimmed = output_path.with_name(f"untrimmed_{output_path.name}")
+    try:
+        if not auto_trim:
+            exact = smart_cut.copy_cut_end(
+                local_playlists[0], None if frames_to_trim else duration, frames_to_trim, LOCAL_PLAYLIST_ARGS
+            )
+            if exact:
+                remux(local_playlists, output_path, exact["t"], movflags, audio, exact["frames"])
+                print(f"   ✂️  Cut to {exact['duration']:.3f}s at a keyframe, no re-encode needed")
+                return exact["duration"]
+        remux(local_playlists, untrimmed, audio=audio)
+        card = detect_end_card(untrimmed) if auto_trim else None
+        if card:
+            frames_to_trim = card["frames_to_trim"]
+            duration = card["time"] if card["time"] is not None else duration
+        if duration is None and not card:
+            remux(local_playlists, output_path, None, movflags, audio)
+            return None
+        if not SMART_CUT:
+            remux(local_playlists, output_path, duration, movflags, audio)
+            return duration
+        if frames_to_trim:
+            cut = smart_cut.smart_cut(untrimmed, output_path, movflags=movflags, frames_to_trim=frames_to_trim)
+        else:
+            cut = smart_cut.smart_cut(untrimmed, output_path, duration, movflags=movflags)
+        return cut["duration"]
+    except (ValueError, subprocess.CalledProcessError) as e:
+        print(f"   ⚠️  Smart cut failed ({e}), cutting at packet boundaries")
+        remux(local_playlists, output_path, duration, movflags, audio)
+        return duration
+    finally:
+        untrimmed.unlink(missing_ok=True)
+
+def resolve_playlists(session, m3u8_url, resolution=None, audio=True):
+    """Media playlist URLs of a stream (video first, then optional audio) and its frame rate.
+
+    For a master playlist the variant is chosen by resolution (highest
+    bandwidth by default) together with its audio rendition, unless audio
+    is False.
+    """
+    master = fetch_playlist(session, m3u8_url)
+    if not isinstance(master, hls_playlist.MasterPlaylist):
+        return [m3u8_url], None
+    variant = select_variant(master, resolution)
+    audio = select_audio(master, variant) if audio else None
+    print(f"   Variant: {variant.resolution} @ {variant.bandwidth} bps" + (f" + audio '{audio.name}'" if audio else ""))
+    return [variant.uri] + ([audio.uri] if audio else []), variant.frame_rate
+
+def download_hls(m3u8_url, output_path, resolution=None, max_workers=MAX_WORKERS, keep_segments=False,
+                 max_duration=None, frames_to_trim=None, fps=None, movflags=None, auto_trim=False, audio=True):
+    """Download an HLS stream (master or media playlist) to an MP4 file.
+
+    For a master playlist the variant is chosen by resolution (highest
+    bandwidth by default) and its audio rendition is muxed in; without audio
+    the output is video only (for renditions sharing a separate audio group).
+    With max_duration only the segments covering that window are fetched.
+
+    The trim (max_duration, or frames_to_trim counted back from the end)
+    is a frame-exact smart cut of the remuxed segments (see smart_cut.py).
+    The source duration comes from the playlist, so a trim is only applied
+    when the playlist is complete. With auto_trim every segment is fetched
+    and the trim point is where end_card.py finds the end card or watermark,
+    falling back to max_duration/frames_to_trim when it finds none. movflags are passed to the remux (used to
+    write fragmented MP4s for byte-range HLS without another pass).
+
+    Returns None on failure, otherwise a dict with "duration" (the trimmed
+    length, or None if the output was left untrimmed) and "source_duration".
+    """
+    session = create_session(max_workers)
+    try:
+        playlist_urls, frame_rate = resolve_playlists(session, m3u8_url, resolution, audio)
+
+        fetch_duration = None if auto_trim else max_duration  # The end card is at the very end
+        with contextlib.ExitStack() as stack:
+            downloads = [
+                download_media_playlist(
+                    session, url, stack.enter_context(segment_cache(url, keep_segments)), max_workers, fetch_duration
+                )
+                for url in playlist_urls
+            ]
+            local_playlists = [local_playlist for local_playlist, _ in downloads]
+            source_duration = downloads[0][1]  # The video playlist
+
+            if frames_to_trim is not None and max_duration is None and frame_rate is None:
+                frame_rate = probe_frame_rate(local_playlists[0]) or fps
+            duration = resolve_trim(source_duration, max_duration, frames_to_trim, frame_rate or fps)
+            if duration is not None and not auto_trim:
+                print(f"   Trimming to {duration:.2f}s (source {source_duration:.2f}s)")
+
+            if duration is not None or auto_trim:
+                by_frames = frames_to_trim if max_duration is None else None
+                duration = remux_trimmed(local_playlists, output_path, duration, movflags, by_frames, auto_trim, audio)
+            else:
+                remux(local_playlists, output_path, duration, movflags, audio)
+        return {"duration": duration, "source_duration": source_duration}
+    except (requests.RequestException, ValueError, OSError, subprocess.CalledProcessError) as e:
+        print(f"❌ HLS download failed: {e}")
+        return None
+    finally:
+        session.close()
+
+def download_audio(m3u8_url, output_path, resolution=None, max_workers=MAX_WORKERS, max_duration=None, duration=None,
+                   movflags=None):
+    """Download only the audio of an HLS stream to an audio-only MP4, cut to duration seconds.
+
+    For a master playlist that is the AUDIO group rendition of the variant
+    chosen by resolution, so no video is fetched; a variant (or media
+    playlist) with muxed audio is downloaded and its audio kept. With
+    max_duration only the segments covering that window are fetched.
+
+    Returns None on failure, otherwise {"duration", "source_duration"} as
+    download_hls() does.
+    """
+    session = create_session(max_workers)
+    try:
+        playlist = fetch_playlist(session, m3u8_url)
+        playlist_url = m3u8_url
+        if isinstance(playlist, hls_playlist.MasterPlaylist):
+            variant = select_variant(playlist, resolution)
+            audio = select_audio(playlist, variant)
+            playlist_url = audio.uri if audio else variant.uri
+            print(f"   Audio: " + (f"rendition '{audio.name}'" if audio else f"muxed in the {variant.resolution} variant"))
+        with segment_cache(playlist_url) as cache:
+            local_playlist, source_duration = download_media_playlist(
+                session, playlist_url, cache, max_workers, max_duration
+            )
+            if duration is not None and source_duration is not None and duration >= source_duration:
+                duration = None
+            remux([local_playlist], output_path, duration, movflags, video=False)
+        return {"duration": duration, "source_duration": source_duration}
+    except (requests.RequestException, ValueError, OSError, subprocess.CalledProcessError) as e:
+        print(f"❌ HLS audio download failed: {e}")
+        return None
+    finally:
+        session.close()
+
+def stream_hls(m3u8_url, resolution=None, max_duration=None, frames_to_trim=None, fps=None, movflags=None,
+               auto_trim=False, on_progress=None, label=None):
+    """Start remuxing an HLS stream from the network straight to ffmpeg's stdout.
+
+    Nothing is written to disk: ffmpeg reads the remote playlists itself.
+    A pipe is not seekable, so movflags must write a fragmented MP4 (with
+    empty_moov). The trim is resolved as in download_hls(); with auto_trim
+    end_card.py reads the tail of the remote playlist to find the trim point.
+    ffmpeg runs as an ffmpeg_runner.start() job (progress, timeout, stderr
+    tail); on_progress and label are passed to it.
+
+    Returns None on failure, otherwise (job, {"duration", "source_duration"});
+    the caller reads job.stdout and then wait()s for the job.
+    """
+    session = create_session()
+    try:
+        playlist_urls, frame_rate = resolve_playlists(session, m3u8_url, resolution)
+        playlist = fetch_media_playlist(session, playlist_urls[0])
+    except (requests.RequestException, ValueError) as e:
+        print(f"❌ HLS stream failed: {e}")
+        return None
+    finally:
+        session.close()
+
+    source_duration = playlist.duration()
+    duration = resolve_trim(source_duration, max_duration, frames_to_trim, frame_rate or fps)
+    card = detect_end_card(playlist_urls[0]) if auto_trim and source_duration is not None else None
+    if card and card["time"] is not None:
+        duration = card["time"]
+    if duration is not None:
+        print(f"   Trimming to {duration:.2f}s while streaming (source {source_duration:.2f}s)")
+    cmd = remux_command(playlist_urls, "pipe:1", duration, movflags)
+    job = ffmpeg_runner.start(cmd, duration=duration or source_duration, on_progress=on_progress, label=label)
+    return job, {"duration": duration, "source_duration": source_duration}
+
+def main():
+    parser = argparse.ArgumentParser(description='Download an HLS stream with concurrent segment fetches')
+    parser.add_argument('url', help='Master or media m3u8 URL')
+    parser.add_argument('output', type=Path, help='Output MP4 path')
+    parser.add_argument('--resolution', help='Variant resolution to select, e.g. 1280x720')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Concurrent segment downloads')
+    parser.add_argument('--keep-segments', action='store_true', help='Keep cached segments after remuxing')
+    parser.add_argument('--max-duration', type=float, help='Only fetch segments covering the first N seconds')
+    parser.add_argument('--auto-trim', action='store_true', help='Cut off the end card or watermark (see end_card.py)')
+    parser.add_argument('--no-audio', action='store_true', help='Video only, without the audio rendition')
+    args = parser.parse_args()
+
+    print(f"📥 Downloading: {args.url}")
+    if not download_hls(args.url, args.output, args.resolution, args.workers, args.keep_segments, args.max_duration,
+                        auto_trim=args.auto_trim, audio=not args.no_audio):
+        sys.exit(1)
+    print(f"✅ Downloaded: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Package trimmed MP4 renditions as real segmented HLS.
+
+Layouts:
+  single    - legacy: one #EXTINF covering the whole MP4
+  byterange - one fragmented MP4 per rendition; the media playlist addresses
+              keyframe-aligned segments with #EXT-X-BYTERANGE, computed from
+              the file's moof boxes (nothing extra to upload)
+  fmp4      - an init segment plus numbered .m4s segment files (ffmpeg hls muxer)
+
+Audio-only renditions (a shared #EXT-X-MEDIA audio group, see
+hls_client.download_audio) package the same way, in AUDIO_FRAGMENT_DURATION
+fragments instead of GOPs.
+
+Fast start (first_segment_duration): byterange and fmp4 playlists can end
+the first segment at the first keyframe after FIRST_SEGMENT_DURATION, then
+continue on the usual SEGMENT_DURATION grid. A player needs the init section and
+one whole segment before it shows a frame, so a short first segment trades
+one extra request for a much smaller first download. The init section of a
+fragmented MP4 is only ftyp plus an empty moov at the front of the file, a
+few KB. The source needs a keyframe there (smart_cut.split_first_gop, or
+transcode_ladder's first_keyframe); measure with benchmark_startup.py.
+
+I-frame playlists (#EXT-X-I-FRAMES-ONLY) list every keyframe of a rendition
+as a byte range: its fragment's moof up to the end of the keyframe sample.
+Keyframe offsets come from a packet scan (no decoding), and the ranges point
+into the same files as the media playlist, so trick play and hover-scrubbing
+fetch one frame per position instead of whole segments.
+
+Usage:
+  python3 hls_package.py <input.mp4> <media_url> <output.m3u8> [--segment-duration 6]
+  python3 hls_package.py <input.mp4> <media_url> <output.m3u8> --first-segment-duration 1
+  python3 hls_package.py <input.mp4> <media_url> <output.m3u8> --iframes
+"""
+
+import argparse
+import struct
+import subprocess
+import sys
+from pathlib import Path
+
+import ffmpeg_runner
+import hls_playlist
+import media_probe
+
+# Configuration
+SEGMENT_DURATION = 6.0  # Target segment length in seconds (segments end on keyframes)
+FIRST_SEGMENT_DURATION = 1.0  # Fast start: length of the short first segment
+LAYOUTS = ("single", "byterange", "fmp4")
+FRAGMENT_MOVFLAGS = "+frag_keyframe+empty_moov+default_base_moof"
+AUDIO_FRAGMENT_DURATION = 1.0  # Seconds per fragment of audio-only MP4s, which have no keyframes to split at
+
+def iter_boxes(f, start, end):
+    """Yield (type, offset, size, header_size) for the ISO BMFF boxes in [start, end)."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            break
+        yield box_type.decode("latin-1"), offset, size, header_size
+        offset += size
+
+def child_boxes(f, box, box_type=None):
+    """Children of a container box, optionally filtered by type."""
+    _, offset, size, header_size = box
+    return [
+        child for child in iter_boxes(f, offset + header_size, offset + size)
+        if box_type is None or child[0] == box_type
+    ]
+
+def read_full_box(f, box, length):
+    """Return (version, payload) of a full box, reading length payload bytes."""
+    _, offset, _, header_size = box
+    f.seek(offset + header_size)
+    version = f.read(4)[0]
+    return version, f.read(length)
+
+def read_media_track(f, moov):
+    """Return (track_id, timescale) of the first video track in moov, else of the first audio track."""
+    tracks = {}
+    for trak in child_boxes(f, moov, "trak"):
+        mdia = child_boxes(f, trak, "mdia")
+        if not mdia:
+            continue
+        hdlr = child_boxes(f, mdia[0], "hdlr")
+        handler = read_full_box(f, hdlr[0], 8)[1][4:8] if hdlr else None
+        if handler not in (b"vide", b"soun") or handler in tracks:
+            continue
+
+        version, payload = read_full_box(f, child_boxes(f, trak, "tkhd")[0], 20)
+        track_id = struct.unpack(">I", payload[16:20] if version == 1 else payload[8:12])[0]
+
+        version, payload = read_full_box(f, child_boxes(f, mdia[0], "mdhd")[0], 20)
+        timescale = struct.unpack(">I", payload[16:20] if version == 1 else payload[8:12])[0]
+        tracks[handler] = (track_id, timescale)
+    if not tracks:
+        raise ValueError("No video or audio track found")
+    return tracks.get(b"vide") or tracks[b"soun"]
+
+def index_fragments(mp4_path):
+    """Index a fragmented MP4.
+
+    Returns {"init_size": bytes of ftyp+moov, "fragments": [{"offset", "size",
+    "time"}]} where each fragment is a moof plus its media data and time is the
+    video track's decode time in seconds (the audio track's in an audio-only
+    file).
+    """
+    file_size = Path(mp4_path).stat().st_size
+    with open(mp4_path, "rb") as f:
+        boxes = list(iter_boxes(f, 0, file_size))
+        moov = next((box for box in boxes if box[0] == "moov"), None)
+        if moov is None:
+            raise ValueError(f"{mp4_path} has no moov box")
+        if not child_boxes(f, moov, "mvex"):
+            raise ValueError(f"{mp4_path} is not a fragmented MP4")
+        track_id, timescale = read_media_track(f, moov)
+
+        init_size = None
+        fragments = []
+        for box in boxes:
+            box_type, offset, size, _ = box
+            if box_type == "moof":
+                if init_size is None:
+                    init_size = offset
+                time = None
+                for traf in child_boxes(f, box, "traf"):
+                    _, payload = read_full_box(f, child_boxes(f, traf, "tfhd")[0], 4)
+                    if struct.unpack(">I", payload)[0] != track_id:
+                        continue
+                    version, payload = read_full_box(f, child_boxes(f, traf, "tfdt")[0], 8)
+                    decode_time = struct.unpack(">Q", payload)[0] if version == 1 else struct.unpack(">I", payload[:4])[0]
+                    time = decode_time / timescale
+                fragments.append({"offset": offset, "size": size, "time": time})
+            elif fragments and box_type in ("mdat", "free", "skip"):
+                fragments[-1]["size"] = offset + size - fragments[-1]["offset"]
+
+    # Fragments with no video (audio-only moofs) join the previous video fragment
+    merged = []
+    for fragment in fragments:
+        if fragment["time"] is None and merged:
+            merged[-1]["size"] = fragment["offset"] + fragment["size"] - merged[-1]["offset"]
+        elif fragment["time"] is not None:
+            merged.append(fragment)
+    if init_size is None or not merged:
+        raise ValueError(f"{mp4_path} has no video fragments")
+    return {"init_size": init_size, "fragments": merged}
+
+def is_fragmented(mp4_path):
+    """Check whether an MP4 is fragmented (its moov has an mvex box)."""
+    try:
+        index_fragments(mp4_path)
+        return True
+    except (ValueError, OSError, IndexError, struct.error):
+        return False
+
+def fragment_args(has_video=True):
+    """Muxer options for a fragmented MP4: a fragment per video keyframe, or per AUDIO_FRAGMENT_DURATION without video."""
+    args = ["-movflags", FRAGMENT_MOVFLAGS]
+    if not has_video:
+        # frag_keyframe only splits at video keyframes, audio alone would be one fragment
+        args += ["-frag_duration", str(int(AUDIO_FRAGMENT_DURATION * 1000000))]
+    return args
+
+def fragment_mp4(input_path, output_path):
+    """Rewrite an MP4 as a fragmented MP4 with one fragment per keyframe (stream copy)."""
+    cmd = [
+        "ffmpeg",
+        "-i", str(input_path),
+        "-map", "0",
+        "-c", "copy",
+        *fragment_args(media_probe.get_stream(media_probe.probe(input_path), "video") is not None),
+        "-y",
+        str(output_path)
+    ]
+    ffmpeg_runner.run(cmd, duration=media_probe.get_video_duration(input_path))
+
+def ensure_fragmented(mp4_path):
+    """Fragment an MP4 in place unless it already is. Returns True on success."""
+    mp4_path = Path(mp4_path)
+    if is_fragmented(mp4_path):
+        return True
+    tmp_path = mp4_path.with_name(f"fragmenting_{mp4_path.name}")
+    try:
+        fragment_mp4(mp4_path, tmp_path)
+        tmp_path.replace(mp4_path)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Error fragmenting {mp4_path.name}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return False
+
+def group_segments(fragments, total_duration, segment_duration=SEGMENT_DURATION, first_segment_duration=None):
+    """Group keyframe fragments into segments of about segment_duration seconds.
+
+    With first_segment_duration the first segment ends at the first keyframe
+    at or after that instead, so playback starts after a small download; the
+    second one then ends at segment_duration, keeping the later boundaries on
+    the same grid as without it.
+    Returns [{"offset", "size", "duration"}]; every segment starts on a keyframe.
+    """
+    start_time = fragments[0]["time"]
+    segments = []
+    for index, fragment in enumerate(fragments):
+        if index + 1 < len(fragments):
+            end_time = fragments[index + 1]["time"]
+        else:
+            end_time = start_time + total_duration
+        duration = max(end_time - fragment["time"], 0.0)
+
+        limit = segment_duration
+        if first_segment_duration and 1 <= len(segments) <= 2:
+            limit = first_segment_duration if len(segments) == 1 else segment_duration - segments[0]["duration"]
+        if segments and segments[-1]["duration"] < limit - 1e-3:
+            segment = segments[-1]
+            segment["size"] = fragment["offset"] + fragment["size"] - segment["offset"]
+            segment["duration"] += duration
+        else:
+            segments.append({"offset": fragment["offset"], "size": fragment["size"], "duration": duration})
+    return segments
+
+def index_iframes(mp4_path, index=None):
+    """Byte ranges of the keyframes of a fragmented MP4, for an I-frame playlist.
+
+    Keyframe offsets come from media_probe's packet scan. Each range starts at
+    the moof of the keyframe's fragment, so a player can parse it alone, and
+    ends with the keyframe sample. index is index_fragments(mp4_path) if the
+    caller has it. Returns [{"offset", "size", "duration"}].
+    """
+    index = index or index_fragments(mp4_path)
+    stream = media_probe.get_stream(media_probe.probe(mp4_path), "video")
+    total_duration = media_probe.get_video_duration(mp4_path)
+    if not stream or total_duration is None:
+        raise ValueError(f"Could not probe the video of {mp4_path}")
+    keyframes = sorted(
+        (time, pos, size) for stream_index, time, size, pos, is_keyframe in media_probe.probe_packets(mp4_path)
+        if stream_index == stream["index"] and is_keyframe and pos is not None
+    )
+    if not keyframes:
+        raise ValueError(f"No keyframes found in {mp4_path}")
+
+    end_time = keyframes[0][0] + total_duration
+    iframes = []
+    for number, (time, pos, size) in enumerate(keyframes):
+        fragment = next((f for f in reversed(index["fragments"]) if f["offset"] <= pos), None)
+        if fragment is None:
+            continue
+        next_time = keyframes[number + 1][0] if number + 1 < len(keyframes) else end_time
+        iframes.append({
+            "offset": fragment["offset"],
+            "size": pos + size - fragment["offset"],
+            "duration": max(next_time - time, 0.001)
+        })
+    return iframes
+
+def iframe_playlist_path(playlist_path):
+    """Where the I-frame playlist of a media playlist is written (<name>_iframes.m3u8)."""
+    playlist_path = Path(playlist_path)
+    return playlist_path.with_name(f"{playlist_path.stem}_iframes.m3u8")
+
+def iframe_bandwidth(playlist):
+    """Peak and average bits/s of a parsed I-frame playlist, for #EXT-X-I-FRAME-STREAM-INF.
+
+    A last keyframe shorter than half the first interval (the trimmed end of
+    the last GOP) is left out of the peak, where it would dominate.
+    Returns {"peak": int, "average": int}.
+    """
+    sizes = [(segment.byterange[1], segment.duration) for segment in playlist.segments if segment.byterange]
+    total_time = sum(duration for _, duration in sizes)
+    if not total_time:
+        raise ValueError("I-frame playlist without byte ranges")
+    average = sum(size for size, _ in sizes) * 8 / total_time
+    if len(sizes) > 1 and sizes[-1][1] < sizes[0][1] / 2:
+        sizes = sizes[:-1]
+    peak = max(size * 8 / duration for size, duration in sizes)
+    return {"peak": int(round(max(peak, average))), "average": int(round(average))}
+
+def segment_bandwidth(playlist_path):
+    """Peak and average bits/s of a media playlist's segments, for BANDWIDTH/AVERAGE-BANDWIDTH.
+
+    Measured on the segments as packaged: their byte ranges, or the segment
+    files next to the playlist. So a short first segment (see
+    group_segments) counts at its real rate, which fixed time windows over
+    the file miss. Every segment counts towards the peak: BANDWIDTH must
+    cover each one. Returns {"peak": int, "average": int}, or None for a
+    single-segment playlist or segments whose sizes aren't known locally.
+    """
+    playlist_path = Path(playlist_path)
+    playlist = hls_playlist.load(playlist_path)
+    if len(playlist.segments) < 2:
+        return None
+    sizes = []
+    for segment in playlist.segments:
+        if segment.byterange:
+            size = segment.byterange[1]
+        else:
+            path = playlist_path.parent / segment.uri
+            if "://" in segment.uri or not path.is_file():
+                return None
+            size = path.stat().st_size
+        sizes.append((size, segment.duration))
+    total_time = sum(duration for _, duration in sizes)
+    if not total_time:
+        return None
+    average = sum(size for size, _ in sizes) * 8 / total_time
+    peak = max(size * 8 / duration for size, duration in sizes if duration > 0)
+    return {"peak": int(round(max(peak, average))), "average": int(round(average))}
+
+def write_media_playlist(output_path, segments, init_uri=None, init_range=None, byterange=False, iframes_only=False):
+    """Write a VOD media playlist for segments with "uri", "duration" (and "offset"/"size")."""
+    playlist = hls_playlist.MediaPlaylist(
+        segments=[
+            hls_playlist.Segment(
+                segment["uri"],
+                segment["duration"],
+                (segment["offset"], segment["size"]) if byterange else None
+            )
+            for segment in segments
+        ],
+        init=hls_playlist.InitSection(init_uri, init_range) if init_uri else None,
+        iframes_only=iframes_only
+    )
+    return hls_playlist.write(playlist, output_path)
+
+def package_byterange(mp4_path, media_url, output_path, segment_duration=SEGMENT_DURATION, first_segment_duration=None):
+    """Write a single-file #EXT-X-BYTERANGE playlist for a fragmented MP4 at media_url."""
+    index = index_fragments(mp4_path)
+    total_duration = media_probe.get_video_duration(mp4_path)
+    if total_duration is None:
+        raise ValueError(f"Could not determine duration of {mp4_path}")
+    segments = group_segments(index["fragments"], total_duration, segment_duration, first_segment_duration)
+    for segment in segments:
+        segment["uri"] = media_url
+    print(f"   {len(segments)} byte-range segments (~{segment_duration:g}s) in {Path(mp4_path).name}")
+    return write_media_playlist(
+        output_path,
+        segments,
+        init_uri=media_url,
+        init_range=(0, index["init_size"]),
+        byterange=True
+    )
+
+def package_iframes(mp4_path, media_url, output_path, index=None):
+    """Write the I-frame playlist of a fragmented MP4 at media_url (byte ranges into the file)."""
+    index = index or index_fragments(mp4_path)
+    iframes = index_iframes(mp4_path, index)
+    for iframe in iframes:
+        iframe["uri"] = media_url
+    print(f"   {len(iframes)} I-frames in {Path(mp4_path).name}")
+    return write_media_playlist(
+        output_path,
+        iframes,
+        init_uri=media_url,
+        init_range=(0, index["init_size"]),
+        byterange=True,
+        iframes_only=True
+    )
+
+def slice_fragments(mp4_path, output_dir, name, segment_duration=SEGMENT_DURATION, first_segment_duration=None,
+                    iframes=False):
+    """Cut a fragmented MP4 into an init segment and .m4s segments at group_segments() boundaries.
+
+    The files are byte ranges of the MP4 (ftyp+moov, then moof+mdat runs),
+    so nothing is remuxed. With iframes an I-frame playlist addressing the
+    keyframes inside the .m4s files is written too (iframe_playlist_path()).
+    Returns (playlist_path, [init_path, segment paths...]).
+    """
+    index = index_fragments(mp4_path)
+    total_duration = media_probe.get_video_duration(mp4_path)
+    if total_duration is None:
+        raise ValueError(f"Could not determine duration of {mp4_path}")
+    segments = group_segments(index["fragments"], total_duration, segment_duration, first_segment_duration)
+
+    init_path = output_dir / f"{name}_init.mp4"
+    files = [init_path]
+    with open(mp4_path, "rb") as f:
+        init_path.write_bytes(f.read(index["init_size"]))
+        for number, segment in enumerate(segments):
+            path = output_dir / f"{name}_{number:03d}.m4s"
+            f.seek(segment["offset"])
+            path.write_bytes(f.read(segment["size"]))
+            segment["uri"] = path.name
+            files.append(path)
+    playlist_path = output_dir / f"{name}.m3u8"
+    write_media_playlist(playlist_path, segments, init_uri=init_path.name)
+
+    if iframes:
+        keyframes = index_iframes(mp4_path, index)
+        for iframe in keyframes:
+            # Re-address each keyframe inside the segment file that holds it
+            segment = next(s for s in reversed(segments) if s["offset"] <= iframe["offset"])
+            iframe["uri"] = segment["uri"]
+            iframe["offset"] -= segment["offset"]
+        write_media_playlist(
+            iframe_playlist_path(playlist_path), keyframes, init_uri=init_path.name, byterange=True, iframes_only=True
+        )
+    return playlist_path, files
+
+def package_fmp4(mp4_path, output_dir, name, segment_duration=SEGMENT_DURATION, first_segment_duration=None,
+                 iframes=False):
+    """Split an MP4 into an init segment and .m4s segments with ffmpeg's hls muxer.
+
+    With first_segment_duration the first segment is cut short (see
+    group_segments), and with iframes an I-frame playlist is written too
+    (iframe_playlist_path()). The hls muxer can do neither for VOD, so then
+    the MP4 is fragmented and sliced instead (slice_fragments).
+    Returns (playlist_path, [init_path, segment paths...]). The playlist refers
+    to files by name; use rewrite_segment_uris() once their URLs are known.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    playlist_path = output_dir / f"{name}.m3u8"
+    if first_segment_duration or iframes:
+        for stale in output_dir.glob(f"{name}_*.m4s"):
+            stale.unlink()
+        if is_fragmented(mp4_path):
+            playlist_path, files = slice_fragments(
+                mp4_path, output_dir, name, segment_duration, first_segment_duration, iframes
+            )
+        else:
+            fragmented = output_dir / f"fragmenting_{name}.mp4"
+            try:
+                fragment_mp4(mp4_path, fragmented)
+                playlist_path, files = slice_fragments(
+                    fragmented, output_dir, name, segment_duration, first_segment_duration, iframes
+                )
+            finally:
+                fragmented.unlink(missing_ok=True)
+        first = f"first ~{first_segment_duration:g}s, then " if first_segment_duration else ""
+        print(f"   {len(files) - 1} fMP4 segments ({first}~{segment_duration:g}s) in {output_dir}")
+        return playlist_path, files
+    cmd = [
+        "ffmpeg",
+        "-i", str(mp4_path),
+        "-map", "0",
+        "-c", "copy",
+        "-f", "hls",
+        "-hls_time", str(segment_duration),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_flags", "independent_segments",
+        "-hls_fmp4_init_filename", f"{name}_init.mp4",
+        "-hls_segment_filename", str(output_dir / f"{name}_%03d.m4s"),
+        "-y",
+        str(playlist_path)
+    ]
+    ffmpeg_runner.run(cmd, duration=media_probe.get_video_duration(mp4_path))
+    files = [output_dir / f"{name}_init.mp4"] + sorted(output_dir.glob(f"{name}_*.m4s"))
+    print(f"   {len(files) - 1} fMP4 segments (~{segment_duration:g}s) in {output_dir}")
+    return playlist_path, files
+
+def rewrite_segment_uris(playlist_path, url_for, output_path=None):
+    """Replace segment/init file names in a playlist with url_for(name).
+
+    Writes to output_path (default: in place).
+    """
+    playlist = hls_playlist.load(playlist_path)
+    if playlist.init:
+        playlist.init.uri = url_for(playlist.init.uri)
+    for segment in playlist.segments:
+        segment.uri = url_for(segment.uri)
+    return hls_playlist.write(playlist, output_path or playlist_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a byte-range HLS playlist for an MP4 rendition')
+    parser.add_argument('input', type=Path, help='MP4 rendition (fragmented in place if needed)')
+    parser.add_argument('media_url', help='URL the MP4 is served from')
+    parser.add_argument('output', type=Path, help='Output media playlist')
+    parser.add_argument('--segment-duration', type=float, default=SEGMENT_DURATION,
+                       help='Target segment duration in seconds')
+    parser.add_argument('--first-segment-duration', type=float,
+                       help='Cut the first segment short for a faster start (ends at the next keyframe)')
+    parser.add_argument('--iframes', action='store_true',
+                       help='Also write the I-frame playlist (<output>_iframes.m3u8)')
+    args = parser.parse_args()
+
+    if not ensure_fragmented(args.input):
+        sys.exit(1)
+    package_byterange(args.input, args.media_url, args.output, args.segment_duration, args.first_segment_duration)
+    print(f"✅ Generated: {args.output}")
+    if args.iframes:
+        package_iframes(args.input, args.media_url, iframe_playlist_path(args.output))
+        print(f"✅ Generated: {iframe_playlist_path(args.output)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Typed HLS playlists: parse, write and validate master and media playlists.
+
+Every script used to build playlists by joining strings, and hls_client had
+its own dict-based parser. This module is the one place that knows the
+format:
+
+  parse()     one pass over lines (a string's splitlines(), an open file or
+              a streamed HTTP response), so multi-thousand-segment playlists
+              are never held as text; returns a MasterPlaylist or a
+              MediaPlaylist made of __slots__ records
+  dumps()     playlist text; write() validates and writes it to a file
+  validate()  the problems players reject (or trip over) in a playlist
+
+URIs are resolved against base_url when parsing if one is given, and are
+written exactly as they are on the objects.
+
+Usage:
+  python3 hls_playlist.py downloaded_videos/landing_video_master.m3u8
+  python3 hls_playlist.py downloaded_videos/landing_video_640x360.m3u8
+"""
+
+import argparse
+import math
+import sys
+from pathlib import Path
+from urllib.parse import urljoin
+
+# Configuration
+MASTER_VERSION = 6
+MEDIA_VERSION = 7
+
+class Segment:
+    """One media segment: #EXTINF duration, optional byte range (offset, length) and URI."""
+    __slots__ = ("uri", "duration", "byterange", "discontinuity")
+
+    def __init__(self, uri, duration, byterange=None, discontinuity=False):
+        self.uri = uri
+        self.duration = duration
+        self.byterange = byterange
+        self.discontinuity = discontinuity
+
+class InitSection:
+    """#EXT-X-MAP: the fMP4 initialization section, optionally a byte range of uri."""
+    __slots__ = ("uri", "byterange")
+
+    def __init__(self, uri, byterange=None):
+        self.uri = uri
+        self.byterange = byterange
+
+class MediaPlaylist:
+    """A media playlist: segments with an optional init section."""
+    __slots__ = ("segments", "init", "target_duration", "version", "media_sequence", "playlist_type",
+                 "endlist", "independent_segments", "encrypted", "iframes_only")
+
+    def __init__(self, segments=None, init=None, target_duration=None, version=MEDIA_VERSION, media_sequence=0,
+                 playlist_type="VOD", endlist=True, independent_segments=True, encrypted=False, iframes_only=False):
+        self.segments = segments if segments is not None else []
+        self.init = init
+        self.target_duration = target_duration
+        self.version = version
+        self.media_sequence = media_sequence
+        self.playlist_type = playlist_type
+        self.endlist = endlist
+        self.independent_segments = independent_segments
+        self.encrypted = encrypted  # An #EXT-X-KEY other than METHOD=NONE was seen
+        self.iframes_only = iframes_only  # #EXT-X-I-FRAMES-ONLY: each segment is one keyframe (trick play)
+
+    def duration(self):
+        """Sum of the #EXTINF durations (None for a live playlist or missing durations)."""
+        if self.endlist and self.segments and all(segment.duration > 0 for segment in self.segments):
+            return sum(segment.duration for segment in self.segments)
+        return None
+
+class Variant:
+    """One #EXT-X-STREAM-INF entry of a master playlist."""
+    __slots__ = ("uri", "bandwidth", "average_bandwidth", "resolution", "codecs", "frame_rate", "audio")
+
+    def __init__(self, uri, bandwidth, average_bandwidth=None, resolution=None, codecs=None, frame_rate=None,
+                 audio=None):
+        self.uri = uri
+        self.bandwidth = bandwidth
+        self.average_bandwidth = average_bandwidth
+        self.resolution = resolution  # "1280x720"
+        self.codecs = codecs
+        self.frame_rate = frame_rate
+        self.audio = audio  # GROUP-ID of its audio renditions
+
+class Media:
+    """One #EXT-X-MEDIA rendition (an alternative audio track, subtitles, ...)."""
+    __slots__ = ("type", "group_id", "name", "uri", "language", "default", "autoselect", "channels")
+
+    def __init__(self, type, group_id, name, uri=None, language=None, default=False, autoselect=False,
+                 channels=None):
+        self.type = type
+        self.group_id = group_id
+        self.name = name
+        self.uri = uri
+        self.language = language
+        self.default = default
+        self.autoselect = autoselect
+        self.channels = channels
+
+class IFrameStream:
+    """One #EXT-X-I-FRAME-STREAM-INF entry: the I-frame playlist of a variant, for trick play."""
+    __slots__ = ("uri", "bandwidth", "average_bandwidth", "resolution", "codecs")
+
+    def __init__(self, uri, bandwidth, average_bandwidth=None, resolution=None, codecs=None):
+        self.uri = uri
+        self.bandwidth = bandwidth
+        self.average_bandwidth = average_bandwidth
+        self.resolution = resolution
+        self.codecs = codecs  # Video codec only
+
+class MasterPlaylist:
+    """A master (multivariant) playlist: variant streams, their media renditions and I-frame streams."""
+    __slots__ = ("variants", "media", "iframe_streams", "version", "independent_segments")
+
+    def __init__(self, variants=None, media=None, iframe_streams=None, version=MASTER_VERSION,
+                 independent_segments=True):
+        self.variants = variants if variants is not None else []
+        self.media = media if media is not None else []
+        self.iframe_streams = iframe_streams if iframe_streams is not None else []
+        self.version = version
+        self.independent_segments = independent_segments
+
+def parse_attributes(text):
+    """Parse an HLS attribute list (KEY=VALUE,KEY="quoted,value") into a dict, quotes removed."""
+    attributes = {}
+    key = None
+    in_quotes = False
+    current = []
+    for char in text + ",":
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == "=" and key is None and not in_quotes:
+            key = "".join(current).strip()
+            current = []
+        elif char == "," and not in_quotes:
+            if key:
+                attributes[key] = "".join(current).strip()
+            key = None
+            current = []
+        else:
+            current.append(char)
+    return attributes
+
+def parse_byterange(text, previous_end=0):
+    """Parse a byte range ("length[@offset]") into (offset, length)."""
+    if "@" in text:
+        length, offset = text.split("@")
+        return int(offset), int(length)
+    return previous_end, int(text)
+
+def parse(lines, base_url=None):
+    """Parse playlist lines in one pass into a MasterPlaylist or a MediaPlaylist.
+
+    lines may be str or bytes (e.g. requests' iter_lines()). Raises
+    ValueError when the input doesn't start with #EXTM3U.
+    """
+    resolve = (lambda uri: urljoin(base_url, uri)) if base_url else (lambda uri: uri)
+    master = MasterPlaylist(independent_segments=False)
+    media = MediaPlaylist(version=None, playlist_type=None, endlist=False, independent_segments=False)
+    is_master = False
+    version = None
+    started = False
+    pending = None  # Variant waiting for its URI line
+    duration = None
+    byterange = None
+    discontinuity = False
+    previous_end = 0
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        if not started:
+            if line.lstrip("\ufeff") != "#EXTM3U":
+                raise ValueError("Not an HLS playlist (no #EXTM3U header)")
+            started = True
+            continue
+        if not line.startswith("#"):
+            if pending is not None:
+                pending.uri = resolve(line)
+                master.variants.append(pending)
+                pending = None
+            else:
+                media.segments.append(Segment(resolve(line), duration or 0.0, byterange, discontinuity))
+                if byterange:
+                    previous_end = byterange[0] + byterange[1]
+                duration = None
+                byterange = None
+                discontinuity = False
+            continue
+
+        tag, _, value = line.partition(":")
+        if tag == "#EXTINF":
+            duration = float(value.split(",")[0])
+        elif tag == "#EXT-X-BYTERANGE":
+            byterange = parse_byterange(value, previous_end)
+        elif tag == "#EXT-X-DISCONTINUITY":
+            discontinuity = True
+        elif tag == "#EXT-X-STREAM-INF":
+            is_master = True
+            attributes = parse_attributes(value)
+            pending = Variant(
+                None,
+                int(attributes.get("BANDWIDTH", 0)),
+                int(attributes["AVERAGE-BANDWIDTH"]) if "AVERAGE-BANDWIDTH" in attributes else None,
+                attributes.get("RESOLUTION"),
+                attributes.get("CODECS"),
+                float(attributes["FRAME-RATE"]) if "FRAME-RATE" in attributes else None,
+                attributes.get("AUDIO")
+            )
+        elif tag == "#EXT-X-I-FRAME-STREAM-INF":
+            is_master = True
+            attributes = parse_attributes(value)
+            master.iframe_streams.append(IFrameStream(
+                resolve(attributes["URI"]) if "URI" in attributes else None,
+                int(attributes.get("BANDWIDTH", 0)),
+                int(attributes["AVERAGE-BANDWIDTH"]) if "AVERAGE-BANDWIDTH" in attributes else None,
+                attributes.get("RESOLUTION"),
+                attributes.get("CODECS")
+            ))
+        elif tag == "#EXT-X-MEDIA":
+            is_master = True
+            attributes = parse_attributes(value)
+            master.media.append(Media(
+                attributes.get("TYPE"),
+                attributes.get("GROUP-ID"),
+                attributes.get("NAME"),
+                resolve(attributes["URI"]) if "URI" in attributes else None,
+                attributes.get("LANGUAGE"),
+                attributes.get("DEFAULT") == "YES",
+                attributes.get("AUTOSELECT") == "YES",
+                attributes.get("CHANNELS")
+            ))
+        elif tag == "#EXT-X-MAP":
+            attributes = parse_attributes(value)
+            media.init = InitSection(
+                resolve(attributes["URI"]),
+                parse_byterange(attributes["BYTERANGE"]) if "BYTERANGE" in attributes else None
+            )
+        elif tag == "#EXT-X-TARGETDURATION":
+            media.target_duration = int(float(value))
+        elif tag == "#EXT-X-MEDIA-SEQUENCE":
+            media.media_sequence = int(value)
+        elif tag == "#EXT-X-PLAYLIST-TYPE":
+            media.playlist_type = value
+        elif tag == "#EXT-X-KEY":
+            if parse_attributes(value).get("METHOD", "NONE") != "NONE":
+                media.encrypted = True
+        elif tag == "#EXT-X-I-FRAMES-ONLY":
+            media.iframes_only = True
+        elif tag == "#EXT-X-ENDLIST":
+            media.endlist = True
+        elif tag == "#EXT-X-VERSION":
+            version = int(value)
+        elif tag == "#EXT-X-INDEPENDENT-SEGMENTS":
+            master.independent_segments = media.independent_segments = True
+
+    if not started:
+        raise ValueError("Empty playlist")
+    if is_master:
+        master.version = version
+        return master
+    media.version = version
+    return media
+
+def parse_text(text, base_url=None):
+    """parse() playlist text."""
+    return parse(text.splitlines(), base_url)
+
+def load(path, base_url=None):
+    """parse() a playlist file, streaming its lines."""
+    with open(path, encoding="utf-8") as f:
+        return parse(f, base_url)
+
+def format_byterange(byterange):
+    """(offset, length) as "length@offset"."""
+    offset, length = byterange
+    return f"{length}@{offset}"
+
+def format_attributes(attributes):
+    """Attribute list from (key, value, quoted) triples, skipping None values."""
+    return ",".join(
+        f'{key}="{value}"' if quoted else f"{key}={value}"
+        for key, value, quoted in attributes if value is not None
+    )
+
+def target_duration(playlist):
+    """#EXT-X-TARGETDURATION: the playlist's own, else its longest segment rounded up."""
+    if playlist.target_duration:
+        return playlist.target_duration
+    return max((math.ceil(segment.duration) for segment in playlist.segments), default=1)
+
+def required_version(playlist):
+    """Lowest protocol version the features of a playlist need."""
+    if isinstance(playlist, MasterPlaylist):
+        return 1
+    if playlist.iframes_only:
+        return 5 if playlist.init else 4
+    if playlist.init:
+        return 6  # EXT-X-MAP outside an I-frame playlist
+    if any(segment.byterange for segment in playlist.segments):
+        return 4
+    if any(segment.duration != int(segment.duration) for segment in playlist.segments):
+        return 3  # Decimal #EXTINF
+    return 1
+
+def iter_master_lines(playlist):
+    """Lines of a master playlist."""
+    yield "#EXTM3U"
+    yield f"#EXT-X-VERSION:{playlist.version or required_version(playlist)}"
+    if playlist.independent_segments:
+        yield "#EXT-X-INDEPENDENT-SEGMENTS"
+    for media in playlist.media:
+        yield "#EXT-X-MEDIA:" + format_attributes([
+            ("TYPE", media.type, False),
+            ("GROUP-ID", media.group_id, True),
+            ("NAME", media.name, True),
+            ("LANGUAGE", media.language, True),
+            ("DEFAULT", "YES" if media.default else "NO", False),
+            ("AUTOSELECT", "YES" if media.autoselect else None, False),
+            ("CHANNELS", media.channels, True),
+            ("URI", media.uri, True),
+        ])
+    for variant in playlist.variants:
+        yield "#EXT-X-STREAM-INF:" + format_attributes([
+            ("BANDWIDTH", variant.bandwidth, False),
+            ("AVERAGE-BANDWIDTH", variant.average_bandwidth, False),
+            ("RESOLUTION", variant.resolution, False),
+            ("CODECS", variant.codecs, True),
+            ("FRAME-RATE", f"{variant.frame_rate:.3f}" if variant.frame_rate else None, False),
+            ("AUDIO", variant.audio, True),
+        ])
+        yield variant.uri
+    for stream in playlist.iframe_streams:
+        yield "#EXT-X-I-FRAME-STREAM-INF:" + format_attributes([
+            ("BANDWIDTH", stream.bandwidth, False),
+            ("AVERAGE-BANDWIDTH", stream.average_bandwidth, False),
+            ("RESOLUTION", stream.resolution, False),
+            ("CODECS", stream.codecs, True),
+            ("URI", stream.uri, True),
+        ])
+
+def iter_media_lines(playlist):
+    """Lines of a media playlist."""
+    yield "#EXTM3U"
+    yield f"#EXT-X-VERSION:{playlist.version or required_version(playlist)}"
+    yield f"#EXT-X-TARGETDURATION:{target_duration(playlist)}"
+    if playlist.media_sequence:
+        yield f"#EXT-X-MEDIA-SEQUENCE:{playlist.media_sequence}"
+    if playlist.playlist_type:
+        yield f"#EXT-X-PLAYLIST-TYPE:{playlist.playlist_type}"
+    if playlist.independent_segments:
+        yield "#EXT-X-INDEPENDENT-SEGMENTS"
+    if playlist.iframes_only:
+        yield "#EXT-X-I-FRAMES-ONLY"
+    if playlist.init:
+        yield "#EXT-X-MAP:" + format_attributes([
+            ("URI", playlist.init.uri, True),
+            ("BYTERANGE", format_byterange(playlist.init.byterange) if playlist.init.byterange else None, True),
+        ])
+    for segment in playlist.segments:
+        if segment.discontinuity:
+            yield "#EXT-X-DISCONTINUITY"
+        yield f"#EXTINF:{segment.duration:.6f},"
+        if segment.byterange:
+            yield f"#EXT-X-BYTERANGE:{format_byterange(segment.byterange)}"
+        yield segment.uri
+    if playlist.endlist:
+        yield "#EXT-X-ENDLIST"
+
+def dumps(playlist):
+    """Playlist text of a MasterPlaylist or MediaPlaylist."""
+    lines = iter_master_lines(playlist) if isinstance(playlist, MasterPlaylist) else iter_media_lines(playlist)
+    return "\n".join(lines) + "\n"
+
+def validate(playlist):
+    """Problems with a playlist as a list of messages (empty when it is valid)."""
+    problems = []
+    version = playlist.version or required_version(playlist)
+    if version < required_version(playlist):
+        problems.append(f"Version {version} is too low for its features (needs {required_version(playlist)})")
+
+    if isinstance(playlist, MasterPlaylist):
+        if not playlist.variants:
+            problems.append("No variant streams")
+        audio_groups = {media.group_id for media in playlist.media if media.type == "AUDIO"}
+        for variant in playlist.variants:
+            name = variant.resolution or variant.uri
+            if not variant.uri:
+                problems.append(f"Variant {name} has no URI")
+            if not variant.bandwidth or variant.bandwidth <= 0:
+                problems.append(f"Variant {name} has no BANDWIDTH")
+            elif variant.average_bandwidth and variant.average_bandwidth > variant.bandwidth:
+                problems.append(f"Variant {name} has AVERAGE-BANDWIDTH above its BANDWIDTH")
+            if not variant.codecs:
+                problems.append(f"Variant {name} has no CODECS")
+            if variant.audio and variant.audio not in audio_groups:
+                problems.append(f"Variant {name} refers to undefined audio group '{variant.audio}'")
+        for stream in playlist.iframe_streams:
+            name = stream.resolution or stream.uri
+            if not stream.uri:
+                problems.append(f"I-frame stream {name} has no URI")
+            if not stream.bandwidth or stream.bandwidth <= 0:
+                problems.append(f"I-frame stream {name} has no BANDWIDTH")
+        seen = set()
+        for media in playlist.media:
+            if (media.type, media.group_id, media.name) in seen:
+                problems.append(f"Duplicate {media.type} rendition '{media.name}' in group '{media.group_id}'")
+            seen.add((media.type, media.group_id, media.name))
+        return problems
+
+    if not playlist.segments:
+        problems.append("No segments")
+    limit = target_duration(playlist)
+    for index, segment in enumerate(playlist.segments):
+        if not segment.uri:
+            problems.append(f"Segment {index} has no URI")
+        if playlist.iframes_only and not segment.byterange:
+            problems.append(f"I-frame {index} has no byte range")
+        if segment.duration <= 0:
+            problems.append(f"Segment {index} has no duration")
+        elif round(segment.duration) > limit:
+            problems.append(f"Segment {index} ({segment.duration:.3f}s) is longer than the target duration {limit}s")
+    if playlist.playlist_type == "VOD" and not playlist.endlist:
+        problems.append("VOD playlist without #EXT-X-ENDLIST")
+    return problems
+
+def write(playlist, path):
+    """Validate playlist and write it to path. Returns the text; raises ValueError if invalid."""
+    problems = validate(playlist)
+    if problems:
+        raise ValueError(f"Invalid playlist {Path(path).name}: {'; '.join(problems)}")
+    content = dumps(playlist)
+    with open(path, "w") as f:
+        f.write(content)
+    return content
+
+def describe(playlist):
+    """One-line summary of a parsed playlist."""
+    if isinstance(playlist, MasterPlaylist):
+        audio = sum(1 for media in playlist.media if media.type == "AUDIO")
+        return (f"Master playlist: {len(playlist.variants)} variants, {audio} audio renditions, "
+                f"{len(playlist.iframe_streams)} I-frame streams")
+    duration = playlist.duration()
+    length = f", {duration:.3f}s" if duration is not None else " (live or incomplete)"
+    if playlist.iframes_only:
+        return f"I-frame playlist: {len(playlist.segments)} keyframes{length}"
+    return f"Media playlist: {len(playlist.segments)} segments{length}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse and validate an HLS playlist')
+    parser.add_argument('playlist', type=Path, help='Master or media .m3u8 file')
+    args = parser.parse_args()
+
+    try:
+        playlist = load(args.playlist)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"📄 {describe(playlist)}")
+    problems = validate(playlist)
+    for problem in problems:
+        print(f"   ⚠️  {problem}")
+    if problems:
+        sys.exit(1)
+    print("✅ Valid")
+
+if __name__ == "__main__":
+    main()
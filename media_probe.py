@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Shared ffprobe helpers with a persistent probe cache.
+Each file is probed once with -show_format -show_streams and the parsed
+result is cached on disk, keyed by path, size, mtime and inode, so repeated
+duration/FPS/info lookups (and reruns of the scripts) don't spawn ffprobe again.
+Packet scans (used for measured HLS bitrates) are only cached for the life of
+the process, and temporary files (TEMP_PREFIXES) aren't written to disk.
+The cache is written once at exit (or by save_cache()), without the entries
+of files that no longer exist.
+
+Usage:
+  python3 media_probe.py [directory]   # Probe every MP4 in a directory in parallel
+"""
+
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Configuration
+PROBE_CACHE_FILE = Path("downloaded_videos") / ".probe_cache.json"
+DEFAULT_FPS = 30.0
+BITRATE_WINDOW = 6.0  # Seconds per window when measuring peak bitrate (one HLS segment)
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+PERSISTED_FIELDS = ("probe",)  # Cached fields written to disk; packet lists are too large
+TEMP_PREFIXES = ("untrimmed_", "muxed_", "faststart_", "fragmenting_", "temp_")  # Probed once, then deleted
+
+_cache = None
+_cache_dirty = False
+_cache_lock = threading.Lock()
+
+def _file_signature(path):
+    """Size, mtime and inode of a file; any change invalidates its cache entry."""
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+
+def _load_cache():
+    """Load the probe cache from disk (once per process)."""
+    global _cache
+    if _cache is None:
+        try:
+            with open(PROBE_CACHE_FILE) as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+def _persisted(key, entry):
+    """The part of a cache entry worth writing to disk (None to drop it)."""
+    if Path(key).name.startswith(TEMP_PREFIXES) or not os.path.exists(key):
+        return None
+    fields = {field: entry[field] for field in PERSISTED_FIELDS if field in entry}
+    return {"signature": entry["signature"], **fields} if fields else None
+
+def save_cache():
+    """Write the probe cache to disk atomically, if it changed.
+
+    Packet lists, temporary files and files that no longer exist are left out.
+    """
+    global _cache_dirty
+    # Held while writing too: threads probing in parallel share the tmp file
+    with _cache_lock:
+        if not _cache_dirty:
+            return
+        entries = {}
+        for key, entry in _load_cache().items():
+            entry = _persisted(key, entry)
+            if entry:
+                entries[key] = entry
+        PROBE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = PROBE_CACHE_FILE.with_name(PROBE_CACHE_FILE.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        tmp_path.replace(PROBE_CACHE_FILE)
+        _cache_dirty = False
+
+atexit.register(save_cache)
+
+def run_ffprobe(path, input_args=()):
+    """Run ffprobe once and return the parsed -show_format -show_streams JSON."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        *input_args,
+        "-show_format",
+        "-show_streams",
+        "-of", "json",
+        str(path)
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+def _cached(path, field, compute, use_cache=True):
+    """Return a cached per-file result, computing and storing it on a miss.
+
+    The cache is written at exit (see save_cache), not after every probe.
+    """
+    global _cache_dirty
+    path = Path(path)
+    try:
+        key = str(path.resolve())
+        signature = _file_signature(path)
+    except OSError as e:
+        print(f"Warning: Could not probe {path}: {e}")
+        return None
+
+    if use_cache:
+        with _cache_lock:
+            entry = _load_cache().get(key)
+        if entry and entry["signature"] == signature and field in entry:
+            return entry[field]
+
+    try:
+        value = compute(path)
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
+        print(f"Warning: Could not probe {path}: {e}")
+        return None
+
+    if use_cache:
+        with _cache_lock:
+            cache = _load_cache()
+            entry = cache.get(key)
+            if not entry or entry["signature"] != signature:
+                entry = cache[key] = {"signature": signature}
+            entry[field] = value
+            _cache_dirty = _cache_dirty or field in PERSISTED_FIELDS
+    return value
+
+def probe(path, use_cache=True, input_args=()):
+    """Probe a media file, returning {"format": {...}, "streams": [...]} or None."""
+    return _cached(path, "probe", lambda p: run_ffprobe(p, input_args), use_cache)
+
+def run_packet_scan(path, input_args=()):
+    """List every packet as [stream_index, time, size, pos, is_keyframe] without decoding."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        *input_args,
+        "-show_entries", "packet=stream_index,pts_time,dts_time,size,pos,flags",
+        "-of", "json",
+        str(path)
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    packets = []
+    for packet in json.loads(result.stdout).get("packets", []):
+        time_str = packet.get("pts_time", packet.get("dts_time"))
+        if time_str in (None, "N/A"):
+            continue
+        packets.append([
+            packet["stream_index"],
+            float(time_str),
+            int(packet["size"]),
+            int(packet["pos"]) if packet.get("pos", "N/A") != "N/A" else None,
+            "K" in packet.get("flags", ""),
+        ])
+    return packets
+
+def probe_packets(path, use_cache=True):
+    """Packet list of a media file (see run_packet_scan), cached in memory only."""
+    return _cached(path, "packets", run_packet_scan, use_cache)
+
+def probe_many(paths, max_workers=MAX_WORKERS):
+    """Probe many files in parallel, returning {path: probe} and saving the cache once."""
+    paths = [Path(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(probe, paths))
+    save_cache()
+    return dict(zip(paths, results))
+
+def probe_directory(directory, pattern="*.mp4", max_workers=MAX_WORKERS):
+    """Probe every file matching pattern in a directory in parallel."""
+    return probe_many(sorted(Path(directory).glob(pattern)), max_workers)
+
+def get_stream(data, codec_type):
+    """First stream of the given codec_type ("video"/"audio") in a probe result."""
+    for stream in (data or {}).get("streams", []):
+        if stream.get("codec_type") == codec_type:
+            return stream
+    return None
+
+def parse_frame_rate(rate):
+    """Parse an ffprobe rate like "30000/1001" into a float (None if invalid)."""
+    try:
+        if "/" in rate:
+            num, den = map(int, rate.split("/"))
+            return num / den if den != 0 else None
+        return float(rate) if rate else None
+    except (TypeError, ValueError):
+        return None
+
+def get_video_duration(video_path):
+    """Get video duration in seconds (None if unknown)."""
+    data = probe(video_path)
+    if not data:
+        return None
+    duration = data.get("format", {}).get("duration")
+    if duration is None:
+        durations = [float(s["duration"]) for s in data.get("streams", []) if s.get("duration")]
+        return max(durations) if durations else None
+    return float(duration)
+
+def get_video_fps(video_path, default=DEFAULT_FPS):
+    """Get video FPS, falling back to default."""
+    stream = get_stream(probe(video_path), "video")
+    fps = parse_frame_rate(stream.get("r_frame_rate")) if stream else None
+    if fps is None:
+        print(f"Warning: Could not get video FPS, using default {default}")
+        return default
+    return fps
+
+def get_video_info(video_path):
+    """Get video resolution and codec info."""
+    stream = get_stream(probe(video_path), "video")
+    if not stream:
+        return None
+    return {
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "codec": stream.get("codec_name", "h264"),
+        "profile": stream.get("profile"),
+        "level": stream.get("level")
+    }
+
+def get_bitrate_stats(video_path, window=BITRATE_WINDOW):
+    """Measure peak and average bitrate (bits/s, all streams) from a packet scan.
+    
+    Peak is the highest bitrate of any window-second slice, which is what
+    HLS BANDWIDTH means when segments are window seconds long.
+    Returns {"peak": int, "average": int} or None.
+    """
+    packets = probe_packets(video_path)
+    duration = get_video_duration(video_path)
+    if not packets or not duration:
+        return None
+
+    start = min(packet[1] for packet in packets)
+    window_bytes = {}
+    for _, time, size, _, _ in packets:
+        index = int(max(time - start, 0) // window)
+        window_bytes[index] = window_bytes.get(index, 0) + size
+
+    peak = 0.0
+    for index, size in window_bytes.items():
+        # The last window can be shorter than the others
+        length = min(window, duration - index * window)
+        if length > 0:
+            peak = max(peak, size * 8 / length)
+
+    average = sum(window_bytes.values()) * 8 / duration
+    return {"peak": int(round(max(peak, average))), "average": int(round(average))}
+
+# H.264 profile_idc and constraint flags by ffprobe profile name
+AVC_PROFILES = {
+    "Constrained Baseline": (66, 0xE0),
+    "Baseline": (66, 0x00),
+    "Main": (77, 0x00),
+    "Extended": (88, 0x00),
+    "High": (100, 0x00),
+    "High 10": (110, 0x00),
+    "High 4:2:2": (122, 0x00),
+    "High 4:4:4 Predictive": (244, 0x00),
+}
+
+# HEVC general_profile_idc and compatibility flags by ffprobe profile name
+HEVC_PROFILES = {
+    "Main": (1, "6"),
+    "Main 10": (2, "4"),
+}
+
+# Object type suffixes for AAC profiles
+AAC_PROFILES = {
+    "LC": "mp4a.40.2",
+    "HE-AAC": "mp4a.40.5",
+    "HE-AACv2": "mp4a.40.29",
+}
+
+def get_stream_codec_string(stream):
+    """RFC 6381 codec string for one ffprobe stream (None if unsupported)."""
+    codec = stream.get("codec_name")
+    profile = stream.get("profile")
+    level = stream.get("level")
+    if codec == "h264" and profile in AVC_PROFILES and isinstance(level, int) and level > 0:
+        profile_idc, constraints = AVC_PROFILES[profile]
+        return f"avc1.{profile_idc:02X}{constraints:02X}{level:02X}"
+    if codec == "hevc" and profile in HEVC_PROFILES and isinstance(level, int) and level > 0:
+        profile_idc, compatibility = HEVC_PROFILES[profile]
+        return f"hvc1.{profile_idc}.{compatibility}.L{level}.B0"
+    if codec == "aac":
+        return AAC_PROFILES.get(profile, "mp4a.40.2")
+    if codec == "mp3":
+        return "mp4a.40.34"
+    if codec == "ac3":
+        return "ac-3"
+    if codec == "eac3":
+        return "ec-3"
+    return None
+
+def get_codec_string(video_path):
+    """RFC 6381 CODECS attribute for a file's first audio and video streams."""
+    data = probe(video_path)
+    codecs = []
+    for codec_type in ("audio", "video"):
+        stream = get_stream(data, codec_type)
+        codec = get_stream_codec_string(stream) if stream else None
+        if codec:
+            codecs.append(codec)
+    return ",".join(codecs) or None
+
+def get_variant_stats(video_path, window=BITRATE_WINDOW):
+    """Measured BANDWIDTH, AVERAGE-BANDWIDTH, CODECS and RESOLUTION for a rendition.
+    
+    Values that can't be measured are None so callers can fall back.
+    """
+    stats = get_bitrate_stats(video_path, window) or {}
+    info = get_video_info(video_path) or {}
+    resolution = None
+    if info.get("width") and info.get("height"):
+        resolution = f"{info['width']}x{info['height']}"
+    return {
+        "bandwidth": stats.get("peak"),
+        "average_bandwidth": stats.get("average"),
+        "codecs": get_codec_string(video_path),
+        "resolution": resolution
+    }
+
+def main():
+    directory = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("downloaded_videos")
+    results = probe_directory(directory)
+    if not results:
+        print(f"❌ No MP4 files found in {directory}")
+        return
+    for path, data in results.items():
+        duration = get_video_duration(path)
+        info = get_video_info(path)
+        if data and duration is not None and info:
+            print(f"✅ {path.name}: {info['width']}x{info['height']} {info['codec']}, {duration:.2f}s")
+        else:
+            print(f"❌ {path.name}: could not probe")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Run per-item pipeline stages as a DAG with per-stage concurrency.
+
+Each stage has its own worker threads and a bounded input queue, so a slow
+stage applies backpressure instead of buffering every item. Items flow
+through the DAG independently: while one rendition uploads, the next can
+already be downloading, and total time approaches the slowest stage rather
+than the sum of all stages.
+
+A stage function is called as func(item, results), where results maps the
+names of the stages it depends on to their return values for that item.
+Returning None drops the item from the stages that depend on it (e.g. a
+failed download skips that rendition). Raising an exception cancels the
+whole pipeline: queued work is discarded, running stages finish, and run()
+re-raises the exception.
+
+Usage:
+  pipeline = Pipeline([
+      Stage("download", download, workers=2),
+      Stage("probe", probe, after=["download"]),
+      Stage("upload", upload, workers=3, after=["download"]),
+  ])
+  results = pipeline.run(items)   # [{stage_name: result}] per item
+"""
+
+import queue
+import threading
+
+# Configuration
+QUEUE_SIZE = 2  # Items waiting per stage before upstream workers block
+POLL_INTERVAL = 0.1  # Seconds between cancellation checks while blocked
+
+_STOP = object()
+
+class PipelineCancelled(Exception):
+    """Raised by Pipeline.put() when the pipeline has been cancelled."""
+
+class Stage:
+    """One pipeline stage: a function, its worker count and the stages it runs after."""
+
+    def __init__(self, name, func, workers=1, after=()):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.after = list(after)
+
+class Pipeline:
+    """A DAG of stages run over a list of items."""
+
+    def __init__(self, stages, queue_size=QUEUE_SIZE):
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.cancelled = threading.Event()
+
+        names = set()
+        for stage in self.stages:
+            if stage.name in names:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            missing = [name for name in stage.after if name not in names]
+            if missing:
+                raise ValueError(f"Stage {stage.name} runs after unknown or later stages: {missing}")
+            names.add(stage.name)
+
+    def put(self, stage, task):
+        """Queue a task for a stage, blocking while its queue is full (unless cancelled)."""
+        while True:
+            if self.cancelled.is_set():
+                raise PipelineCancelled()
+            try:
+                self.queues[stage.name].put(task, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def dispatch(self, index):
+        """Queue item index for every stage whose dependencies have all finished."""
+        for stage in self.stages:
+            with self.lock:
+                results = self.results[index]
+                if stage.name in results or stage.name in self.started[index]:
+                    continue
+                if not all(name in results for name in stage.after):
+                    continue
+                self.started[index].add(stage.name)
+                self.outstanding += 1
+            self.put(stage, index)
+
+    def worker(self, stage):
+        """Process tasks for one stage until told to stop."""
+        while True:
+            index = self.queues[stage.name].get()
+            if index is _STOP:
+                return
+            try:
+                if self.cancelled.is_set():
+                    continue
+                with self.lock:
+                    inputs = {name: self.results[index][name] for name in stage.after}
+                result = stage.func(self.items[index], inputs)
+                if result is not None:
+                    with self.lock:
+                        self.results[index][stage.name] = result
+                    self.dispatch(index)
+            except PipelineCancelled:
+                pass
+            except BaseException as e:
+                with self.lock:
+                    if self.error is None:
+                        self.error = e
+                self.cancelled.set()
+            finally:
+                with self.lock:
+                    self.outstanding -= 1
+                    self.idle.notify_all()
+
+    def run(self, items):
+        """Run every item through the DAG. Returns [{stage_name: result}] in item order."""
+        self.items = list(items)
+        self.results = [{} for _ in self.items]
+        self.started = [set() for _ in self.items]
+        self.queues = {stage.name: queue.Queue(self.queue_size) for stage in self.stages}
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.outstanding = 0
+        self.error = None
+        self.cancelled.clear()
+
+        threads = []
+        for stage in self.stages:
+            for i in range(stage.workers):
+                thread = threading.Thread(
+                    target=self.worker, args=(stage,), name=f"{stage.name}-{i}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for index in range(len(self.items)):
+                self.dispatch(index)
+            with self.lock:
+                while self.outstanding and not self.cancelled.is_set():
+                    self.idle.wait(POLL_INTERVAL)
+        except PipelineCancelled:
+            pass
+        except BaseException:
+            # e.g. Ctrl-C: stop handing out work, let running stages finish
+            self.cancelled.set()
+            raise
+        finally:
+            for stage in self.stages:
+                for _ in range(stage.workers):
+                    self.queues[stage.name].put(_STOP)
+            for thread in threads:
+                thread.join()
+
+        if self.error is not None:
+            raise self.error
+        return self.results
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Content-addressed pipeline state for the m3u8 download/publish scripts.
+
+Every stage run (download, probe, playlist, upload, ...) is recorded in a
+JSON state file under a fingerprint of its parameters and the content hash
+of its input files, together with the content hashes of the files it wrote.
+On the next run a stage whose fingerprint matches and whose outputs are
+still intact is skipped and its recorded result reused. The state is saved
+after every stage, so a crashed run resumes where it stopped.
+
+Usage:
+  python3 pipeline_state.py [state_file]   # Show recorded stages
+"""
+
+import hashlib
+import json
+import sys
+import threading
+from pathlib import Path
+
+# Configuration
+STATE_FILE = Path("downloaded_videos") / ".pipeline_state.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+class PipelineState:
+    """Stage records and cached file hashes, persisted to a JSON file."""
+
+    def __init__(self, path=STATE_FILE, force=False):
+        self.path = Path(path)
+        self.force = force  # Ignore recorded stages (still records new ones)
+        self.lock = threading.RLock()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.stages = data.get("stages", {})
+        self.hashes = data.get("hashes", {})
+
+    def save(self):
+        """Write the state file atomically."""
+        # Held while writing too: concurrent stages share the tmp file
+        with self.lock:
+            data = json.dumps({"stages": self.stages, "hashes": self.hashes}, indent=2)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            tmp_path.replace(self.path)
+
+    def file_hash(self, path):
+        """SHA-256 of a file, cached by size, mtime and inode (None if missing)."""
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        key = str(path.resolve())
+        signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        with self.lock:
+            cached = self.hashes.get(key)
+        if cached and cached["signature"] == signature:
+            return cached["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        with self.lock:
+            self.hashes[key] = {"signature": signature, "sha256": sha256}
+        return sha256
+
+    def fingerprint(self, stage, params, inputs=()):
+        """Hash of a stage's name, parameters and input file contents."""
+        payload = {
+            "stage": stage,
+            "params": params,
+            "inputs": {str(path): self.file_hash(path) for path in inputs},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def lookup(self, key, fingerprint):
+        """Return the stage record if it is fresh: same fingerprint and outputs unchanged."""
+        if self.force:
+            return None
+        with self.lock:
+            record = self.stages.get(key)
+        if not record or record["fingerprint"] != fingerprint:
+            return None
+        for path, sha256 in record["outputs"].items():
+            if self.file_hash(path) != sha256:
+                return None
+        return record
+
+    def record(self, key, fingerprint, outputs=(), result=None):
+        """Record a finished stage with the content hashes of its outputs, then save."""
+        with self.lock:
+            self.stages[key] = {
+                "fingerprint": fingerprint,
+                "outputs": {str(path): self.file_hash(path) for path in outputs},
+                "result": result,
+            }
+        self.save()
+
+    def run_stage(self, stage, name, params, func, inputs=(), outputs=()):
+        """Run func() unless the stage is unchanged since its last successful run.
+
+        Returns the recorded result when skipped, otherwise func()'s result,
+        which is recorded unless it is None or False (a failed stage).
+        outputs may be a callable taking the result, for outputs named by it.
+        """
+        key = f"{stage}:{name}"
+        fingerprint = self.fingerprint(stage, params, inputs)
+        record = self.lookup(key, fingerprint)
+        if record is not None:
+            print(f"   ⏭️  {stage} {name}: unchanged, skipping")
+            return record["result"]
+
+        result = func()
+        if result is not None and result is not False:
+            if callable(outputs):
+                outputs = outputs(result)
+            # Inputs may be rewritten by the stage itself; fingerprint what it left behind
+            self.record(key, self.fingerprint(stage, params, inputs), outputs, result)
+        return result
+
+def main():
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else STATE_FILE
+    state = PipelineState(path)
+    if not state.stages:
+        print(f"❌ No recorded stages in {path}")
+        return
+    for key, record in sorted(state.stages.items()):
+        print(f"✅ {key} ({len(record['outputs'])} outputs, fingerprint {record['fingerprint'][:12]})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Frame-exact trimming at near stream-copy speed ("smart cut").
+
+A plain "-t N -c copy" cut can only end on packet/GOP boundaries, so the
+watermark frames FRAMES_TO_TRIM is meant to remove can survive (or extra
+frames get dropped). A full re-encode is exact but slow. smart_cut()
+stream-copies every GOP that lies fully inside the keep window and
+re-encodes only the boundary GOPs, with the source codec, profile, level,
+pixel format and the bitrate of the GOP being replaced. Audio is copied.
+
+The pieces are joined as Annex B (MPEG-TS) so the re-encoded GOPs carry
+their own parameter sets in-band. Assumes closed GOPs, which is what HLS
+encoders produce. Supports H.264 and HEVC; anything else raises ValueError
+so callers can fall back to a copy cut.
+
+Usage:
+  python3 smart_cut.py input.mp4 output.mp4 --end 63
+  python3 smart_cut.py input.mp4 output.mp4 --frames-to-trim 15
+  python3 smart_cut.py input.mp4 output.mp4 --start 2.5 --end 10
+  python3 smart_cut.py input.mp4 output.mp4 --first-keyframe 1
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import ffmpeg_runner
+import media_probe
+
+# Configuration
+# Encoder, ffmpeg profile names and Annex B filter per source codec
+ENCODERS = {
+    "h264": {
+        "encoder": "libx264",
+        "bsf": "h264_mp4toannexb",
+        "tag": None,
+        "profiles": {
+            "Constrained Baseline": "baseline",
+            "Baseline": "baseline",
+            "Main": "main",
+            "High": "high",
+            "High 10": "high10",
+            "High 4:2:2": "high422",
+            "High 4:4:4 Predictive": "high444",
+        },
+        "level_divisor": 10,  # ffprobe level 31 -> 3.1
+    },
+    "hevc": {
+        "encoder": "libx265",
+        "bsf": "hevc_mp4toannexb",
+        "tag": "hvc1",  # Apple players only accept hvc1-tagged HEVC in MP4
+        "profiles": {"Main": "main", "Main 10": "main10"},
+        "level_divisor": 30,  # ffprobe level 93 -> 3.1
+    },
+}
+ENCODER_PRESET = "medium"
+ENCODER_CRF = 18  # Near-transparent, so re-encoded frames don't stand out
+MAXRATE_FACTOR = 1.5  # VBV cap relative to the replaced GOP's bitrate
+
+def video_timeline(path, input_args=()):
+    """Video stream, frame times and keyframe times (seconds from the file start, as -ss counts)."""
+    data = media_probe.probe(path, use_cache=False, input_args=input_args)
+    stream = media_probe.get_stream(data, "video")
+    if not stream:
+        raise ValueError(f"{path} has no video stream")
+    if stream.get("codec_name") not in ENCODERS:
+        raise ValueError(f"Smart cut supports {', '.join(ENCODERS)}, not {stream.get('codec_name')}")
+    packets = media_probe.run_packet_scan(path, input_args)
+    origin = float(data.get("format", {}).get("start_time") or 0)
+
+    frames = []
+    keyframes = []
+    sizes = {}
+    for stream_index, time, size, _, is_keyframe in packets:
+        if stream_index != stream["index"]:
+            continue
+        time -= origin
+        frames.append(time)
+        sizes[time] = size
+        if is_keyframe:
+            keyframes.append(time)
+    if not frames or not keyframes:
+        raise ValueError(f"No video packets in {path}")
+    return stream, sorted(frames), sorted(keyframes), sizes
+
+def gop_bitrate(frames, keyframes, sizes, keyframe, fps):
+    """Bitrate (bits/s) of the GOP starting at keyframe, from its packet sizes."""
+    later = [k for k in keyframes if k > keyframe]
+    gop_end = later[0] if later else frames[-1] + 1 / fps
+    gop = [t for t in frames if keyframe <= t < gop_end]
+    duration = max(gop_end - keyframe, 1 / fps)
+    return int(sum(sizes[t] for t in gop) * 8 / duration)
+
+def encode_args(stream, bitrate):
+    """Encoder options matching the source stream's codec parameters."""
+    codec = ENCODERS[stream["codec_name"]]
+    args = ["-c:v", codec["encoder"], "-preset", ENCODER_PRESET]
+    profile = codec["profiles"].get(stream.get("profile"))
+    if profile:
+        args += ["-profile:v", profile]
+    level = stream.get("level")
+    if isinstance(level, int) and level > 0:
+        args += ["-level:v", f"{level / codec['level_divisor']:.1f}"]
+    if stream.get("pix_fmt"):
+        args += ["-pix_fmt", stream["pix_fmt"]]
+    for option in ("color_range", "color_primaries", "color_trc", "colorspace"):
+        value = stream.get(option)
+        if value and value != "unknown":
+            args += [f"-{option}", value]
+    if not stream.get("has_b_frames"):
+        args += ["-bf", "0"]
+    # Capped so the cut GOP doesn't raise the rendition's peak bitrate much
+    args += ["-crf", str(ENCODER_CRF), "-maxrate", str(int(bitrate * MAXRATE_FACTOR)), "-bufsize", str(bitrate * 2)]
+    return args
+
+def encode_piece(input_path, output_path, stream, start, frame_count, bitrate, fps, keyframes=()):
+    """Re-encode frame_count frames from start (a frame time) into an MPEG-TS piece.
+
+    The piece is one GOP, plus a keyframe at each of keyframes (seconds from start).
+    """
+    codec = ENCODERS[stream["codec_name"]]
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-ss", f"{max(start - 0.5 / fps, 0):.6f}",  # Accurate seek: decodes from the previous keyframe
+        "-i", str(input_path),
+        "-map", "0:v:0",
+        "-frames:v", str(frame_count),
+        *encode_args(stream, bitrate),
+        "-g", str(frame_count + 1),  # One GOP
+    ]
+    if keyframes:
+        cmd += ["-force_key_frames", ",".join(f"{time:.6f}" for time in keyframes)]
+    cmd += [
+        "-bsf:v", codec["bsf"],
+        "-f", "mpegts",
+        "-y", str(output_path)
+    ]
+    ffmpeg_runner.run(cmd, duration=frame_count / fps)
+
+def copy_pieces(input_path, directory, stream, split_times, stop, fps, offset=0.0):
+    """Stream-copy the video into MPEG-TS pieces split at the given keyframe times.
+
+    The segment muxer counts split times from the first video frame, at offset.
+    """
+    codec = ENCODERS[stream["codec_name"]]
+    half_frame = 0.5 / fps
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-i", str(input_path),
+        "-map", "0:v:0",
+        "-t", f"{stop + 1:.6f}",  # Nothing after the last split is used
+        "-c:v", "copy",
+        "-bsf:v", codec["bsf"],
+        "-f", "segment",
+        "-segment_format", "mpegts",
+        # The segment muxer splits at the first keyframe at or after each time
+        "-segment_times", ",".join(f"{max(t - offset - half_frame, 0):.6f}" for t in split_times),
+        "-reset_timestamps", "1",
+        "-y", str(Path(directory) / "copy_%03d.ts")
+    ]
+    ffmpeg_runner.run(cmd, duration=stop + 1)
+    return sorted(Path(directory).glob("copy_*.ts"))
+
+def join_pieces(input_path, output_path, stream, pieces, first, duration, movflags=None):
+    """Concatenate (path, duration) video pieces into an MP4 with the source audio from first for duration."""
+    directory = Path(pieces[0][0]).parent
+    concat_list = directory / "pieces.txt"
+    concat_list.write_text("".join(f"file '{path.name}'\nduration {length:.6f}\n" for path, length in pieces))
+
+    codec = ENCODERS[stream["codec_name"]]
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-f", "concat", "-safe", "0", "-i", str(concat_list),
+        "-ss", f"{first:.6f}", "-t", f"{duration:.6f}", "-i", str(input_path),
+        "-map", "0:v:0", "-map", "1:a?",
+        "-c", "copy",
+        "-bsf:a", "aac_adtstoasc",
+    ]
+    if codec["tag"]:
+        cmd += ["-tag:v", codec["tag"]]
+    if movflags:
+        cmd += ["-movflags", movflags]
+    cmd += ["-f", "mp4", "-y", str(output_path)]
+    ffmpeg_runner.run(cmd, duration=duration)
+
+def copy_cut_end(input_path, end=None, frames_to_trim=None, input_args=()):
+    """Where a stream-copy cut ("-t") keeps exactly the frames smart_cut() would, or None.
+
+    That is when the first frame after the kept ones is a keyframe (or
+    there is none). Returns {"t", "frames", "duration"}: the -t value
+    (seconds from the file start to the end of the last kept frame), the
+    number of kept frames and their duration. -t alone isn't exact: stream
+    copy stops on decode timestamps, so frames reordered past the keyframe
+    would slip in; "-frames:v" (counted in decode order, which closed GOPs
+    keep apart) limits the video and -t the other streams. Only scans
+    packets, without seeking, so input_path can be a local HLS playlist
+    (with input_args).
+    """
+    stream, frames, keyframes, _ = video_timeline(input_path, input_args)
+    fps = media_probe.parse_frame_rate(stream.get("avg_frame_rate")) \
+        or media_probe.parse_frame_rate(stream.get("r_frame_rate")) or media_probe.DEFAULT_FPS
+    half_frame = 0.5 / fps
+    offset = frames[0]
+    kept = [t for t in frames if end is None or t < offset + end - half_frame]
+    if frames_to_trim:
+        kept = kept[:-frames_to_trim]
+    if not kept or kept[0] not in keyframes:
+        return None
+    following = [t for t in frames if t > kept[-1]]
+    if following and following[0] not in keyframes:
+        return None
+    last_end = following[0] if following else kept[-1] + 1 / fps
+    return {"t": last_end, "frames": len(kept), "duration": last_end - kept[0]}
+
+def smart_cut(input_path, output_path, end=None, start=0.0, movflags=None, frames_to_trim=None):
+    """Cut input_path to the frames in [start, end) seconds, frame-exactly.
+
+    Times count from the first video frame; a frame is kept when it is shown
+    before end (within half a frame). end defaults to the end of the video,
+    and frames_to_trim then drops that many more frames off the end (counted
+    on the video itself, not from a container duration that may include a
+    longer audio track). movflags are passed to the final MP4 mux (e.g. to
+    write a fragmented MP4).
+
+    Returns {"duration", "copied_frames", "encoded_frames"}; raises
+    ValueError for unsupported input and CalledProcessError if ffmpeg fails.
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    stream, frames, keyframes, sizes = video_timeline(input_path)
+    fps = media_probe.parse_frame_rate(stream.get("avg_frame_rate")) \
+        or media_probe.parse_frame_rate(stream.get("r_frame_rate")) or media_probe.DEFAULT_FPS
+    half_frame = 0.5 / fps
+
+    # The window counts from the first video frame (remuxed HLS often starts it a little late)
+    offset = frames[0]
+    kept = [t for t in frames if t >= offset + start - half_frame and (end is None or t < offset + end - half_frame)]
+    if frames_to_trim:
+        kept = kept[:-frames_to_trim]
+    if not kept:
+        raise ValueError(f"No frames of {input_path.name} left to keep")
+    first, last = kept[0], kept[-1]
+    duration = last - first + 1 / fps
+
+    # GOPs fully inside the window are copied: from the first keyframe at or after
+    # the first kept frame up to the last keyframe whose GOP ends inside the window
+    inside = [k for k in keyframes if first <= k <= last]
+    copy_start = inside[0] if inside else None
+    copy_end = None
+    if inside:
+        following = [t for t in frames if t > last]
+        if not following:
+            copy_end = last + 1 / fps
+        elif following[0] in keyframes:
+            copy_end = following[0]
+        else:
+            copy_end = inside[-1]
+        if copy_end <= copy_start:
+            copy_start = copy_end = None
+
+    with tempfile.TemporaryDirectory(dir=output_path.parent, prefix=".smart_cut_") as directory:
+        directory = Path(directory)
+        pieces = []  # (path, duration)
+        encoded = 0
+
+        head_end = copy_start if copy_start is not None else last + 1 / fps
+        head_frames = [t for t in kept if t < head_end]
+        if head_frames:
+            head = directory / "head.ts"
+            bitrate = gop_bitrate(frames, keyframes, sizes, max(k for k in keyframes if k <= first), fps)
+            encode_piece(input_path, head, stream, first, len(head_frames), bitrate, fps)
+            pieces.append((head, head_end - first))
+            encoded += len(head_frames)
+
+        if copy_start is not None:
+            # No split at the first frame: the segment muxer would move it to the next keyframe
+            split_times = [t for t in (copy_start, copy_end) if t > offset]
+            copied = copy_pieces(input_path, directory, stream, split_times, copy_end, fps, offset)
+            # Piece 0 is before copy_start (unless that is the first frame), then the copied GOPs
+            middle = copied[1] if copy_start > offset else copied[0]
+            pieces.append((middle, copy_end - copy_start))
+
+            tail_frames = [t for t in kept if t >= copy_end]
+            if tail_frames:
+                tail = directory / "tail.ts"
+                bitrate = gop_bitrate(frames, keyframes, sizes, copy_end, fps)
+                encode_piece(input_path, tail, stream, copy_end, len(tail_frames), bitrate, fps)
+                pieces.append((tail, last + 1 / fps - copy_end))
+                encoded += len(tail_frames)
+
+        join_pieces(input_path, output_path, stream, pieces, first, duration, movflags)
+
+    print(f"   ✂️  Smart cut to {duration:.3f}s: {len(kept) - encoded} frames copied, {encoded} re-encoded")
+    return {"duration": duration, "copied_frames": len(kept) - encoded, "encoded_frames": encoded}
+
+def split_first_gop(input_path, output_path, at, movflags=None):
+    """Give the video a keyframe at `at` seconds by re-encoding only its first GOP.
+
+    Lets a packager end a short first HLS segment there (see
+    hls_package.FIRST_SEGMENT_DURATION). Everything after the first GOP is
+    copied. Returns {"keyframe", "encoded_frames"} with the new keyframe
+    time, or None (nothing written) when the first GOP already ends by then.
+    Raises ValueError for unsupported input and CalledProcessError if ffmpeg
+    fails.
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    stream, frames, keyframes, sizes = video_timeline(input_path)
+    fps = media_probe.parse_frame_rate(stream.get("avg_frame_rate")) \
+        or media_probe.parse_frame_rate(stream.get("r_frame_rate")) or media_probe.DEFAULT_FPS
+    half_frame = 0.5 / fps
+    offset = frames[0]
+    end = frames[-1] + 1 / fps
+
+    later = [k for k in keyframes if k > offset + half_frame]
+    gop_end = later[0] if later else end
+    if gop_end <= offset + at + half_frame:
+        return None
+    head_frames = [t for t in frames if t < gop_end]
+    # The frame shown at `at` (the first one at or after it) starts the new GOP
+    split = next(t for t in head_frames if t >= offset + at - half_frame)
+
+    with tempfile.TemporaryDirectory(dir=output_path.parent, prefix=".smart_cut_") as directory:
+        directory = Path(directory)
+        head = directory / "head.ts"
+        bitrate = gop_bitrate(frames, keyframes, sizes, keyframes[0], fps)
+        encode_piece(input_path, head, stream, offset, len(head_frames), bitrate, fps, keyframes=[split - offset])
+        pieces = [(head, gop_end - offset)]
+        if later:
+            copied = copy_pieces(input_path, directory, stream, [gop_end], end, fps, offset)
+            pieces.append((copied[1], end - gop_end))
+        join_pieces(input_path, output_path, stream, pieces, offset, end - offset, movflags)
+
+    print(f"   ⚡ Keyframe at {split - offset:.3f}s: re-encoded the first {len(head_frames)} frames, copied the rest")
+    return {"keyframe": split - offset, "encoded_frames": len(head_frames)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Frame-exact trim that only re-encodes the boundary GOPs')
+    parser.add_argument('input', type=Path, help='Input MP4')
+    parser.add_argument('output', type=Path, help='Output MP4')
+    parser.add_argument('--start', type=float, default=0.0, help='Keep from this time (seconds)')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--end', type=float, help='Keep up to this time (seconds)')
+    group.add_argument('--frames-to-trim', type=int, help='Drop this many frames off the end')
+    group.add_argument('--first-keyframe', type=float,
+                       help='Keep everything, adding a keyframe at this time (seconds) in the first GOP')
+    args = parser.parse_args()
+
+    try:
+        if args.first_keyframe is not None:
+            if not split_first_gop(args.input, args.output, args.first_keyframe):
+                print(f"✅ The first GOP already ends by {args.first_keyframe:g}s, nothing to do")
+                return
+        else:
+            smart_cut(args.input, args.output, args.end, args.start, frames_to_trim=args.frames_to_trim)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ ffmpeg failed: {(e.stderr or b'').decode(errors='replace').strip()}")
+        sys.exit(1)
+    print(f"✅ {args.output}")
+
+if __name__ == "__main__":
+    main()
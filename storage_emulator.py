@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Cloud Storage JSON API subset the uploaders use.
+
+Supports multipart and resumable uploads (chunk rules, status queries,
+partial persistence, X-Goog-Hash / metadata hash checks), object listing
+with paging, object metadata and media downloads, and deletes. Objects live
+in memory. Latency and failures can be injected to exercise the retry and
+resume paths of gcs_storage.py.
+
+Point the uploaders at it with STORAGE_API_URL (any access token works):
+  python3 storage_emulator.py --port 9023 --latency 0.02 --failure-rate 0.05
+  STORAGE_API_URL=http://127.0.0.1:9023 GOOGLE_OAUTH_ACCESS_TOKEN=local \\
+      python3 upload_existing_videos.py --sync
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from gcs_storage import Crc32c
+
+# Configuration
+CHUNK_GRANULARITY = 256 * 1024  # Non-final resumable chunks must be multiples of this
+PAGE_SIZE = 1000  # Objects per listing page
+
+def object_hashes(data):
+    """Base64 CRC32C and MD5 of data, as Storage reports them."""
+    crc32c = Crc32c()
+    crc32c.update(data)
+    return {
+        "crc32c": base64.b64encode(crc32c.digest()).decode(),
+        "md5Hash": base64.b64encode(hashlib.md5(data).digest()).decode(),
+    }
+
+def parse_goog_hash(header):
+    """Parse an X-Goog-Hash header ("crc32c=...,md5=...") into resource field names."""
+    hashes = {}
+    for part in (header or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "crc32c":
+            hashes["crc32c"] = value
+        elif name == "md5":
+            hashes["md5Hash"] = value
+    return hashes
+
+class StorageEmulator:
+    """In-memory buckets served over HTTP, with injectable latency and failures."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, page_size=PAGE_SIZE, seed=None):
+        self.latency = latency  # Seconds added to every request
+        self.failure_rate = failure_rate  # Fraction of requests answered with 503
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.objects = {}  # (bucket, name) -> {"data": bytes, "resource": dict}
+        self.sessions = {}  # upload_id -> {"bucket", "resource", "data": bytearray, "done": resource or None}
+        self.stats = {"requests": 0, "failures": 0, "bytes_received": 0}
+        self.server = None
+        self.url = None
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serve in a background thread. Returns the base URL."""
+        self.server = ThreadingHTTPServer((host, port), make_handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        return self.url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def should_fail(self):
+        """Roll the injected failure dice for one request."""
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.failure_rate and self.random.random() < self.failure_rate:
+                self.stats["failures"] += 1
+                return True
+        return False
+
+    def store(self, bucket, resource, data, expected=None):
+        """Commit an object, checking expected hashes. Returns (status, resource or error)."""
+        data = bytes(data)
+        hashes = object_hashes(data)
+        for field, value in (expected or {}).items():
+            if value and hashes[field] != value:
+                return 400, f"Provided {field} doesn't match calculated {field}"
+        name = resource["name"]
+        with self.lock:
+            generation = str(time.time_ns())
+            stored = {
+                **resource,
+                "kind": "storage#object",
+                "bucket": bucket,
+                "size": str(len(data)),
+                "generation": generation,
+                **hashes,
+            }
+            self.objects[(bucket, name)] = {"data": data, "resource": stored}
+        return 200, stored
+
+def make_handler(emulator):
+    """Request handler class bound to an emulator."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body=None, headers=None):
+            payload = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if body is not None:
+                self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def send_error_json(self, status, message):
+            self.send_json(status, {"error": {"code": status, "message": message}})
+
+        def read_body(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length else b""
+            with emulator.lock:
+                emulator.stats["bytes_received"] += len(body)
+            return body
+
+        def route(self):
+            """Split the path into (kind, bucket, object name, query)."""
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            parts = url.path.split("/")
+            # /upload/storage/v1/b/<bucket>/o  or  /storage/v1/b/<bucket>/o[/<name>]
+            if url.path.startswith("/upload/storage/v1/b/") and len(parts) == 7:
+                return "upload", unquote(parts[5]), None, query
+            if url.path.startswith("/storage/v1/b/") and len(parts) >= 6:
+                name = unquote("/".join(parts[6:])) if len(parts) > 6 else None
+                return "object", unquote(parts[4]), name, query
+            return None, None, None, query
+
+        def begin(self):
+            """Apply latency and failure injection. Returns False if the request failed."""
+            if emulator.latency:
+                time.sleep(emulator.latency)
+            if emulator.should_fail():
+                self.read_body()
+                self.send_error_json(503, "Injected failure")
+                return False
+            return True
+
+        def do_POST(self):
+            if not self.begin():
+                return
+            kind, bucket, _, query = self.route()
+            if kind != "upload":
+                return self.send_error_json(404, "Not found")
+            body = self.read_body()
+            acl = query.get("predefinedAcl")
+
+            if query.get("uploadType") == "multipart":
+                boundary = self.headers.get("Content-Type", "").split("boundary=")[-1]
+                parts = body.split(f"--{boundary}".encode())
+                if len(parts) < 3:
+                    return self.send_error_json(400, "Malformed multipart body")
+                metadata = json.loads(parts[1].split(b"\r\n\r\n", 1)[1].rsplit(b"\r\n", 1)[0])
+                data = parts[2].split(b"\r\n\r\n", 1)[1][:-2]
+                expected = {field: metadata.pop(field, None) for field in ("crc32c", "md5Hash")}
+                status, result = emulator.store(bucket, {**metadata, "acl": acl}, data, expected)
+                if status != 200:
+                    return self.send_error_json(status, result)
+                return self.send_json(200, result)
+
+            if query.get("uploadType") == "resumable":
+                resource = json.loads(body or b"{}")
+                resource.setdefault("name", query.get("name"))
+                upload_id = uuid.uuid4().hex
+                with emulator.lock:
+                    emulator.sessions[upload_id] = {
+                        "bucket": bucket,
+                        "resource": {**resource, "acl": acl},
+                        "data": bytearray(),
+                        "done": None,
+                    }
+                location = f"{emulator.url}/upload/storage/v1/b/{bucket}/o?uploadType=resumable&upload_id={upload_id}"
+                return self.send_json(200, headers={"Location": location})
+            self.send_error_json(400, "Unsupported uploadType")
+
+        def do_PUT(self):
+            if not self.begin():
+                return
+            _, _, _, query = self.route()
+            with emulator.lock:
+                upload = emulator.sessions.get(query.get("upload_id"))
+            body = self.read_body()
+            if upload is None:
+                return self.send_error_json(404, "No such upload")
+            if upload["done"] is not None:
+                return self.send_json(200, upload["done"])
+
+            content_range = self.headers.get("Content-Range", "")
+            if not content_range.startswith("bytes "):
+                return self.send_error_json(400, "Missing Content-Range")
+            span, _, total = content_range[6:].partition("/")
+            total = None if total == "*" else int(total)
+            data = upload["data"]
+
+            if span != "*":
+                start, end = map(int, span.split("-"))
+                if start > len(data) or end - start + 1 != len(body):
+                    return self.send_error_json(400, "Content-Range does not match the persisted data")
+                if total is None and len(body) % CHUNK_GRANULARITY:
+                    return self.send_error_json(400, "Chunk size is not a multiple of 256 KiB")
+                data += body[len(data) - start:]
+
+            if total is not None and len(data) == total:
+                expected = parse_goog_hash(self.headers.get("X-Goog-Hash"))
+                status, result = emulator.store(upload["bucket"], upload["resource"], data, expected)
+                with emulator.lock:
+                    if status != 200:
+                        emulator.sessions.pop(query["upload_id"], None)
+                    else:
+                        upload["done"] = result
+                if status != 200:
+                    return self.send_error_json(status, result)
+                return self.send_json(200, result)
+
+            headers = {"Range": f"bytes=0-{len(data) - 1}"} if data else {}
+            self.send_json(308, headers=headers)
+
+        def do_GET(self):
+            if not self.begin():
+                return
+            kind, bucket, name, query = self.route()
+            if kind != "object":
+                return self.send_error_json(404, "Not found")
+
+            if name is None:
+                prefix = query.get("prefix", "")
+                with emulator.lock:
+                    names = sorted(n for b, n in emulator.objects if b == bucket and n.startswith(prefix))
+                    start = int(query.get("pageToken", 0))
+                    page = names[start:start + emulator.page_size]
+                    items = [emulator.objects[(bucket, n)]["resource"] for n in page]
+                listing = {"kind": "storage#objects", "items": items}
+                if start + emulator.page_size < len(names):
+                    listing["nextPageToken"] = str(start + emulator.page_size)
+                return self.send_json(200, listing)
+
+            with emulator.lock:
+                stored = emulator.objects.get((bucket, name))
+            if stored is None:
+                return self.send_error_json(404, "No such object")
+            if query.get("alt") == "media":
+                self.send_response(200)
+                self.send_header("Content-Type", stored["resource"].get("contentType", "application/octet-stream"))
+                if stored["resource"].get("cacheControl"):
+                    self.send_header("Cache-Control", stored["resource"]["cacheControl"])
+                self.send_header("Content-Length", str(len(stored["data"])))
+                self.end_headers()
+                self.wfile.write(stored["data"])
+                return
+            self.send_json(200, stored["resource"])
+
+        def do_DELETE(self):
+            if not self.begin():
+                return
+            kind, bucket, name, query = self.route()
+            with emulator.lock:
+                if "upload_id" in query:
+                    emulator.sessions.pop(query["upload_id"], None)
+                    found = True
+                else:
+                    found = emulator.objects.pop((bucket, name), None) is not None
+            if not found:
+                return self.send_error_json(404, "No such object")
+            self.send_json(204)
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve an in-memory Cloud Storage API stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9023)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int, help='Seed for failure injection')
+    args = parser.parse_args()
+
+    emulator = StorageEmulator(args.latency, args.failure_rate, seed=args.seed)
+    url = emulator.start(args.host, args.port)
+    print(f"✅ Storage emulator at {url}")
+    print(f"   export STORAGE_API_URL={url} GOOGLE_OAUTH_ACCESS_TOKEN=local")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        emulator.stop()
+        print(f"\n📊 {emulator.stats['requests']} requests, {emulator.stats['failures']} injected failures")
+
+if __name__ == "__main__":
+    main()
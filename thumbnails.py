@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Poster, scrub-sprite and WebVTT thumbnail track for a rendition, in one decode.
+
+One ffmpeg run decodes the video once and splits it: one branch writes the
+poster frame at full size, the other picks `count` evenly spaced frames,
+scales them to THUMBNAIL_WIDTH and tiles them into a single sprite sheet.
+The WebVTT track maps each time range to its tile (#xywh=...), which is
+what players use for seek previews. Clients show the poster until the first
+segment arrives instead of a black frame.
+
+The track is written separately (write_vtt) because it references the
+sprite by URL, which is only known once the sprite is uploaded.
+
+Usage:
+  python3 thumbnails.py downloaded_videos/landing_video_1280x720.mp4
+  python3 thumbnails.py video.mp4 --count 60 --format webp --output-dir previews
+"""
+
+import argparse
+import math
+import subprocess
+import sys
+from pathlib import Path
+
+import ffmpeg_runner
+import media_probe
+
+# Configuration
+THUMBNAIL_COUNT = 100  # Tiles in the sprite (fewer for short videos, see MIN_INTERVAL)
+MIN_INTERVAL = 1.0  # Seconds between thumbnails at least
+THUMBNAIL_WIDTH = 160  # Tile width in pixels (height follows the aspect ratio)
+SPRITE_COLUMNS = 10
+POSTER_TIME = 0.0  # Seconds; the first frame, so playback starts on the poster
+IMAGE_FORMAT = "jpg"  # "jpg" or "webp"
+IMAGE_OPTIONS = {
+    "jpg": {"poster": ["-q:v", "2"], "sprite": ["-q:v", "4"]},
+    "webp": {"poster": ["-c:v", "libwebp", "-quality", "85"], "sprite": ["-c:v", "libwebp", "-quality", "70"]},
+}
+
+def format_timestamp(seconds):
+    """WebVTT timestamp (hh:mm:ss.mmm)."""
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+def generate(video_path, output_dir=None, name=None, count=THUMBNAIL_COUNT, image_format=IMAGE_FORMAT):
+    """Write the poster and sprite sheet of video_path in a single decode.
+
+    Files are named <name>_poster.<ext> and <name>_sprite.<ext> in output_dir
+    (default: next to the video, named after it). Returns {"poster", "sprite",
+    "tiles"}, tiles being (start, end, x, y, width, height) per thumbnail for
+    write_vtt(). Raises ValueError if the video can't be probed and
+    CalledProcessError if ffmpeg fails.
+    """
+    video_path = Path(video_path)
+    output_dir = Path(output_dir) if output_dir else video_path.parent
+    name = name or video_path.stem
+    if image_format not in IMAGE_OPTIONS:
+        raise ValueError(f"Unknown image format '{image_format}', use one of: {', '.join(IMAGE_OPTIONS)}")
+
+    data = media_probe.probe(video_path)
+    stream = media_probe.get_stream(data, "video") if data else None
+    if not stream or not stream.get("width"):
+        raise ValueError(f"{video_path} has no video stream")
+    fps = media_probe.parse_frame_rate(stream.get("avg_frame_rate")) \
+        or media_probe.parse_frame_rate(stream.get("r_frame_rate")) or media_probe.DEFAULT_FPS
+    duration = float(stream.get("duration") or data.get("format", {}).get("duration") or 0)
+    total_frames = int(stream.get("nb_frames") or 0) or max(1, round(duration * fps))
+    duration = duration or total_frames / fps
+
+    # Every step-th frame, so the tiles are evenly spaced and their number is known up front
+    step = max(1, math.ceil(total_frames / count), round(MIN_INTERVAL * fps))
+    tile_count = math.ceil(total_frames / step)
+    columns = min(SPRITE_COLUMNS, tile_count)
+    rows = math.ceil(tile_count / columns)
+    width = THUMBNAIL_WIDTH
+    height = round(width * stream["height"] / stream["width"] / 2) * 2
+    poster_frame = min(round(POSTER_TIME * fps), total_frames - 1)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    poster = output_dir / f"{name}_poster.{image_format}"
+    sprite = output_dir / f"{name}_sprite.{image_format}"
+    options = IMAGE_OPTIONS[image_format]
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-i", str(video_path),
+        "-filter_complex",
+        f"[0:v]split=2[p][s];"
+        f"[p]select='eq(n\\,{poster_frame})'[poster];"
+        f"[s]select='not(mod(n\\,{step}))',scale={width}:{height},tile={columns}x{rows}[sprite]",
+        "-map", "[poster]", "-frames:v", "1", *options["poster"], "-y", str(poster),
+        "-map", "[sprite]", "-frames:v", "1", *options["sprite"], "-y", str(sprite)
+    ]
+    ffmpeg_runner.run(cmd, label=f"{poster.name} + {sprite.name}")
+
+    tiles = []
+    for index in range(tile_count):
+        start = index * step / fps
+        end = min((index + 1) * step / fps, duration)
+        row, column = divmod(index, columns)
+        tiles.append((start, end, column * width, row * height, width, height))
+    return {"poster": poster, "sprite": sprite, "tiles": tiles}
+
+def write_vtt(tiles, sprite_url, output_path):
+    """Write the WebVTT thumbnail track pointing at tiles of the sprite at sprite_url."""
+    lines = ["WEBVTT", ""]
+    for start, end, x, y, width, height in tiles:
+        lines.append(f"{format_timestamp(start)} --> {format_timestamp(end)}")
+        lines.append(f"{sprite_url}#xywh={x},{y},{width},{height}")
+        lines.append("")
+    Path(output_path).write_text("\n".join(lines))
+    return Path(output_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a poster, scrub sprite and WebVTT track in one decode')
+    parser.add_argument('video', type=Path, help='Input video')
+    parser.add_argument('--output-dir', type=Path, help='Where to write (default: next to the video)')
+    parser.add_argument('--count', type=int, default=THUMBNAIL_COUNT, help='Thumbnails in the sprite')
+    parser.add_argument('--format', choices=list(IMAGE_OPTIONS), default=IMAGE_FORMAT, help='Image format')
+    args = parser.parse_args()
+
+    try:
+        result = generate(args.video, args.output_dir, count=args.count, image_format=args.format)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ ffmpeg failed: {(e.stderr or b'').decode(errors='replace').strip()}")
+        sys.exit(1)
+    # Local files sit side by side, so the track can reference the sprite by name
+    vtt = write_vtt(result["tiles"], result["sprite"].name, result["sprite"].with_name(f"{args.video.stem}_thumbnails.vtt"))
+    print(f"✅ Poster: {result['poster']}")
+    print(f"✅ Sprite: {result['sprite']} ({len(result['tiles'])} thumbnails)")
+    print(f"✅ Track:  {vtt}")
+
+if __name__ == "__main__":
+    main()
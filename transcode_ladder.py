@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Encode an adaptive bitrate ladder from one input, in one ffmpeg process.
+
+For our own generated videos there is no source ladder to download (the
+landing video gets its 720p/360p/270p renditions from Twitter). transcode()
+decodes the input once, splits the decoded frames with a `split` filter,
+scales each branch to a rung and encodes every rung in the same process.
+Keyframes are forced on a fixed time grid (GOP_SECONDS) with scene-cut
+keyframes disabled, so every rung has its keyframes at the same times and
+HLS players can switch renditions at any segment boundary.
+
+Rungs taller than the input are skipped (no upscaling). Each rung sets its
+own bitrate, profile, level and audio bitrate, optionally preset, maxrate,
+bufsize and extra ffmpeg output options; see LADDER. With an audio output
+(--shared-audio) the rungs are video only and the audio is encoded once, at
+AUDIO_BITRATE, for an HLS audio group shared by every rung.
+
+Usage:
+  python3 transcode_ladder.py generated.mp4 --name my_effect
+  python3 transcode_ladder.py generated.mp4 --name my_effect --ladder ladder.json --fragmented
+  python3 transcode_ladder.py generated.mp4 --name my_effect --shared-audio
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import ffmpeg_runner
+import hls_package
+import media_probe
+
+# Configuration
+OUTPUT_DIR = Path("downloaded_videos")
+LADDER = [
+    {"name": "1280x720", "height": 720, "video_bitrate": 2400000, "profile": "high", "level": "3.1", "audio_bitrate": 128000},
+    {"name": "640x360", "height": 360, "video_bitrate": 800000, "profile": "main", "level": "3.0", "audio_bitrate": 96000},
+    {"name": "480x270", "height": 270, "video_bitrate": 300000, "profile": "main", "level": "3.0", "audio_bitrate": 64000},
+]
+GOP_SECONDS = 2.0  # Keyframe interval on every rung (divides hls_package.SEGMENT_DURATION)
+VIDEO_ENCODER = "libx264"
+PRESET = "veryfast"
+MAXRATE_FACTOR = 1.07  # Peak bitrate cap relative to video_bitrate
+BUFSIZE_FACTOR = 1.5  # VBV buffer relative to video_bitrate
+AUDIO_ENCODER = "aac"
+AUDIO_BITRATE = 128000  # For rungs that don't set audio_bitrate, and the shared audio output
+MOVFLAGS = "+faststart"
+
+def select_rungs(ladder, source_height):
+    """The rungs no taller than the source (the smallest rung if all are)."""
+    rungs = [rung for rung in ladder if rung["height"] <= source_height]
+    return rungs or [min(ladder, key=lambda rung: rung["height"])]
+
+def keyframe_expression(first_keyframe=None):
+    """-force_key_frames expression for the GOP_SECONDS grid, plus first_keyframe inside the first GOP."""
+    if first_keyframe and first_keyframe < GOP_SECONDS:
+        # 0, first_keyframe, then back on the grid: GOP_SECONDS, 2 * GOP_SECONDS, ...
+        return f"expr:if(eq(n_forced,1),gte(t,{first_keyframe}),gte(t,(n_forced-1)*{GOP_SECONDS}))"
+    return f"expr:gte(t,n_forced*{GOP_SECONDS})"
+
+def audio_args(bitrate=AUDIO_BITRATE):
+    """AAC encoder options, stereo."""
+    return ["-c:a", AUDIO_ENCODER, "-b:a", str(bitrate), "-ac", "2"]
+
+def rung_args(rung, gop_frames, first_keyframe=None, audio=True):
+    """Encoder options for one rung, keyframes on the shared GOP_SECONDS grid (without audio: video only)."""
+    bitrate = rung["video_bitrate"]
+    args = [
+        "-c:v", VIDEO_ENCODER,
+        "-preset", rung.get("preset", PRESET),
+        "-b:v", str(bitrate),
+        "-maxrate", str(rung.get("maxrate", int(bitrate * MAXRATE_FACTOR))),
+        "-bufsize", str(rung.get("bufsize", int(bitrate * BUFSIZE_FACTOR))),
+        "-pix_fmt", "yuv420p",
+        # Same keyframe times on every rung: forced by time, no extra ones at scene cuts
+        "-force_key_frames", keyframe_expression(first_keyframe),
+        "-g", str(gop_frames),
+        "-keyint_min", str(gop_frames),
+        "-sc_threshold", "0",
+    ]
+    if rung.get("profile"):
+        args += ["-profile:v", rung["profile"]]
+    if rung.get("level"):
+        args += ["-level:v", str(rung["level"])]
+    args += audio_args(rung.get("audio_bitrate", AUDIO_BITRATE)) if audio else ["-an"]
+    return args + list(rung.get("extra_args", []))
+
+def transcode_command(input_path, outputs, gop_frames, movflags=MOVFLAGS, first_keyframe=None, audio_path=None):
+    """ffmpeg command encoding every (rung, output path) from a single decode of input_path.
+
+    With audio_path the rungs are video only and the audio goes there instead.
+    """
+    labels = [f"v{index}" for index in range(len(outputs))]
+    graph = f"[0:v:0]split={len(outputs)}" + "".join(f"[{label}in]" for label in labels)
+    for label, (rung, _) in zip(labels, outputs):
+        graph += f";[{label}in]scale=-2:{rung['height']}:flags=lanczos[{label}]"
+    cmd = ["ffmpeg", "-v", "error", "-i", str(input_path), "-filter_complex", graph]
+    for label, (rung, path) in zip(labels, outputs):
+        cmd += ["-map", f"[{label}]"]
+        if not audio_path:
+            cmd += ["-map", "0:a:0?"]
+        cmd += rung_args(rung, gop_frames, first_keyframe, audio=not audio_path)
+        if movflags:
+            cmd += ["-movflags", movflags]
+        cmd += ["-f", "mp4", "-y", str(path)]
+    if audio_path:
+        cmd += ["-map", "0:a:0", *audio_args()]
+        if movflags == hls_package.FRAGMENT_MOVFLAGS:
+            cmd += hls_package.fragment_args(has_video=False)
+        elif movflags:
+            cmd += ["-movflags", movflags]
+        cmd += ["-f", "mp4", "-y", str(audio_path)]
+    return cmd
+
+def keyframe_times(path):
+    """Video keyframe times of a file, from its packets."""
+    data = media_probe.probe(path, use_cache=False)
+    stream = media_probe.get_stream(data, "video") if data else None
+    if not stream:
+        return []
+    return sorted(time for index, time, _, _, is_keyframe in media_probe.run_packet_scan(path)
+                  if index == stream["index"] and is_keyframe)
+
+def keyframes_aligned(paths, tolerance=0.001):
+    """Whether every file has its keyframes at the same times."""
+    times = [keyframe_times(path) for path in paths]
+    return all(
+        len(other) == len(times[0]) and all(abs(a - b) <= tolerance for a, b in zip(other, times[0]))
+        for other in times[1:]
+    )
+
+def transcode(input_path, output_dir=OUTPUT_DIR, name=None, ladder=LADDER, movflags=MOVFLAGS, first_keyframe=None,
+              shared_audio=False, on_progress=None):
+    """Encode the ladder from input_path in one ffmpeg run.
+
+    Outputs are <name>_<rung name>.mp4 in output_dir. first_keyframe adds a
+    keyframe that early in the first GOP on every rung, for a short first
+    HLS segment (see hls_package.FIRST_SEGMENT_DURATION). With shared_audio
+    the rungs are video only and the input's audio is encoded once into
+    <name>_audio.mp4 (if it has any). on_progress receives the encode's
+    progress (see ffmpeg_runner.run). Returns the renditions as [{"name",
+    "bandwidth", "file"}], tallest first (bandwidth includes the audio
+    bitrate; playlists later use the measured one). Raises ValueError if
+    the input has no video and CalledProcessError if ffmpeg fails.
+    """
+    input_path = Path(input_path)
+    output_dir = Path(output_dir)
+    name = name or input_path.stem
+    data = media_probe.probe(input_path, use_cache=False)
+    stream = media_probe.get_stream(data, "video") if data else None
+    if not stream or not stream.get("height"):
+        raise ValueError(f"{input_path} has no video stream")
+    fps = media_probe.parse_frame_rate(stream.get("avg_frame_rate")) \
+        or media_probe.parse_frame_rate(stream.get("r_frame_rate")) or media_probe.DEFAULT_FPS
+
+    rungs = sorted(select_rungs(ladder, stream["height"]), key=lambda rung: rung["height"], reverse=True)
+    skipped = [rung["name"] for rung in ladder if rung not in rungs]
+    if skipped:
+        print(f"   Skipping rungs taller than the {stream['height']}p input: {', '.join(skipped)}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    outputs = [(rung, output_dir / f"{name}_{rung['name']}.mp4") for rung in rungs]
+    audio_path = output_dir / f"{name}_audio.mp4" if shared_audio and media_probe.get_stream(data, "audio") else None
+
+    print(f"🎞️  Encoding {len(outputs)} rungs of {input_path.name} in one pass: {', '.join(r['name'] for r in rungs)}"
+          + (" + shared audio" if audio_path else ""))
+    cmd = transcode_command(input_path, outputs, max(1, round(GOP_SECONDS * fps)), movflags, first_keyframe, audio_path)
+    ffmpeg_runner.run(
+        cmd, duration=media_probe.get_video_duration(input_path), on_progress=on_progress, label=f"{name} ladder"
+    )
+    return [
+        {
+            "name": rung["name"],
+            "bandwidth": rung["video_bitrate"] + (0 if shared_audio else rung.get("audio_bitrate", AUDIO_BITRATE)),
+            "file": str(path)
+        }
+        for rung, path in outputs
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Encode a keyframe-aligned ABR ladder from one input in one pass')
+    parser.add_argument('input', type=Path, help='High-quality source video')
+    parser.add_argument('--name', help='Output name prefix (default: the input name)')
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR, help='Where to write the renditions')
+    parser.add_argument('--ladder', type=Path, help='JSON list of rungs replacing LADDER')
+    parser.add_argument('--fragmented', action='store_true', help='Write fragmented MP4s (byte-range HLS)')
+    parser.add_argument('--first-keyframe', type=float,
+                       help='Extra keyframe this early in the first GOP, for a short first HLS segment')
+    parser.add_argument('--shared-audio', action='store_true',
+                       help='Video-only rungs plus one <name>_audio.mp4 for a shared HLS audio group')
+    args = parser.parse_args()
+
+    ladder = LADDER
+    if args.ladder:
+        with open(args.ladder) as f:
+            ladder = json.load(f)
+    movflags = hls_package.FRAGMENT_MOVFLAGS if args.fragmented else MOVFLAGS
+    try:
+        renditions = transcode(
+            args.input, args.output_dir, args.name, ladder, movflags, args.first_keyframe, args.shared_audio,
+            ffmpeg_runner.progress_printer(args.name or args.input.stem)
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    for rendition in renditions:
+        size_mb = Path(rendition["file"]).stat().st_size / (1024 * 1024)
+        print(f"✅ {rendition['name']}: {rendition['file']} ({size_mb:.2f} MB)")
+    if keyframes_aligned([rendition["file"] for rendition in renditions]):
+        print("✅ Keyframes aligned across rungs")
+    else:
+        print("⚠️  Keyframes differ between rungs")
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,42 @@
 """
 Upload existing downloaded videos and m3u8 playlists to Firebase Storage.
 Skips download/trim - uses files that are already ready.
+
+The files to upload are the master playlist written by
+generate_m3u8_playlists.py and everything it references (media, audio
+and I-frame playlists and the MP4s), or FILES_TO_UPLOAD when there is no
+master playlist yet.
+
+Files are uploaded concurrently over one pooled Storage API session
+(gcs_storage.py), with the public-read ACL set in the same request.
+With --sync the storage path is listed once and only files whose size or
+hash changed are uploaded.
+
+Usage:
+  python3 upload_existing_videos.py [--workers 8]
+  python3 upload_existing_videos.py --sync            # Upload only changed or missing files
+  python3 upload_existing_videos.py --sync --delete   # Also delete stale versions no playlist references
 """
 
+import argparse
 import subprocess
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import quote
+
+import gcs_storage
 
 # Configuration
 OUTPUT_DIR = Path("downloaded_videos")
 FIREBASE_STORAGE_PATH = "videos/landing"
 PROJECT_ID = "genaivideogenerator"
 STORAGE_BUCKET = "genaivideogenerator.firebasestorage.app"
+UPLOAD_WORKERS = gcs_storage.UPLOAD_WORKERS  # Concurrent uploads
+
+MASTER_PLAYLIST = "landing_video_master.m3u8"  # Its references decide what is uploaded
 
-# Files to upload
+# Files to upload when there is no master playlist
 FILES_TO_UPLOAD = [
     "landing_video_1280x720.mp4",
     "landing_video_640x360.mp4",
@@ -24,15 +45,35 @@ FILES_TO_UPLOAD = [
     "landing_video_1280x720.m3u8",
     "landing_video_640x360.m3u8",
     "landing_video_480x270.m3u8",
+    "landing_video_audio.mp4",  # Shared audio group, if the renditions are video only
+    "landing_video_audio.m3u8",
+    "landing_video_1280x720_iframes.m3u8",  # I-frame playlists (byte-range layout)
+    "landing_video_640x360_iframes.m3u8",
+    "landing_video_480x270_iframes.m3u8",
     "landing_video_master.m3u8",
 ]
 
-def check_gsutil():
-    """Check if gsutil is installed."""
+def files_to_upload():
+    """(existing paths, missing names): the master playlist and what it references, else FILES_TO_UPLOAD."""
+    master = OUTPUT_DIR / MASTER_PLAYLIST
+    if master.exists():
+        return gcs_storage.playlist_files(master)
+    existing_files = []
+    missing_files = []
+    for filename in FILES_TO_UPLOAD:
+        file_path = OUTPUT_DIR / filename
+        if file_path.exists():
+            existing_files.append(file_path)
+        else:
+            missing_files.append(filename)
+    return existing_files, missing_files
+
+def check_storage_access():
+    """Check if Storage API credentials are available (GOOGLE_OAUTH_ACCESS_TOKEN or gcloud)."""
     try:
-        subprocess.run(["gsutil", "version"], capture_output=True, check=True)
+        gcs_storage.get_access_token()
         return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    except gcs_storage.UploadError:
         return False
 
 def check_firebase_cli():
@@ -43,43 +84,33 @@ def check_firebase_cli():
     except (subprocess.CalledProcessError, FileNotFoundError):
         return False
 
-def upload_with_gsutil(file_path, storage_path, storage_bucket):
-    """Upload file using gsutil."""
-    bucket = f"gs://{storage_bucket}"
-    gs_path = f"{bucket}/{storage_path}/{file_path.name}"
-    
+def upload_with_storage_api(file_path, storage_path, storage_bucket):
+    """Upload file through the pooled Storage API session (ACL and cache metadata set in the same request)."""
     print(f"   📤 Uploading: {file_path.name}")
     
-    cmd = ["gsutil", "cp", str(file_path), gs_path]
-    
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
-        
-        # Make file publicly readable
-        cmd_acl = ["gsutil", "acl", "ch", "-u", "AllUsers:R", gs_path]
-        subprocess.run(cmd_acl, check=True, capture_output=True)
-        
-        # Get public URL
-        public_url = f"https://firebasestorage.googleapis.com/v0/b/{storage_bucket}/o/{quote(storage_path, safe='')}%2F{quote(file_path.name, safe='')}?alt=media"
-        
+        object_name = f"{storage_path}/{gcs_storage.object_name_for(file_path)}"
+        upload = gcs_storage.upload_file(storage_bucket, object_name, file_path)
         print(f"   ✅ Uploaded: {file_path.name}")
-        return public_url
-    except subprocess.CalledProcessError as e:
+        return upload["url"]
+    except (gcs_storage.UploadError, OSError) as e:
         print(f"   ❌ Upload failed: {e}")
         return None
 
 def upload_with_firebase_cli(file_path, storage_path, project_id):
-    """Upload file using Firebase CLI."""
+    """Upload file using Firebase CLI, under the same (content-hashed) name as the Storage API path."""
     print(f"   📤 Uploading: {file_path.name}")
     
     # Use absolute path for Firebase CLI
     absolute_path = file_path.resolve()
+    # The playlists refer to media files by content-hashed names
+    object_name = gcs_storage.object_name_for(file_path)
     
     cmd = [
         "firebase",
         "storage:upload",
         str(absolute_path),
-        f"{storage_path}/",
+        f"{storage_path}/{object_name}",
         "--project", project_id
     ]
     
@@ -94,7 +125,7 @@ def upload_with_firebase_cli(file_path, storage_path, project_id):
         
         # Get public URL
         storage_bucket = f"{project_id}.firebasestorage.app"
-        public_url = f"https://firebasestorage.googleapis.com/v0/b/{storage_bucket}/o/{quote(storage_path, safe='')}%2F{quote(file_path.name, safe='')}?alt=media"
+        public_url = gcs_storage.public_url(storage_bucket, f"{storage_path}/{object_name}")
         
         print(f"   ✅ Uploaded: {file_path.name}")
         return public_url
@@ -104,39 +135,41 @@ def upload_with_firebase_cli(file_path, storage_path, project_id):
         return None
 
 def main():
+    parser = argparse.ArgumentParser(description='Upload existing videos and playlists to Firebase Storage')
+    parser.add_argument('--workers', type=int, default=UPLOAD_WORKERS, help='Concurrent uploads')
+    parser.add_argument('--sync', action='store_true',
+                       help='Only upload files whose remote size/hash differs (Storage API only)')
+    parser.add_argument('--delete', action='store_true',
+                       help='With --sync, delete stale versions of the uploaded files that no playlist references')
+    args = parser.parse_args()
+    if args.delete and not args.sync:
+        parser.error('--delete requires --sync')
+    
     print("=" * 70)
     print("Upload Existing Videos to Firebase Storage")
     print("=" * 70)
     
     # Check for upload tools
-    has_gsutil = check_gsutil()
+    has_storage_api = check_storage_access()
     has_firebase = check_firebase_cli()
     
-    if not has_gsutil and not has_firebase:
+    if not has_storage_api and not has_firebase:
         print("\n❌ No upload tool found!")
         print("   Install one of:")
-        print("   - gsutil: pip install gsutil")
+        print("   - Google Cloud SDK (then: gcloud auth login), or set GOOGLE_OAUTH_ACCESS_TOKEN")
         print("   - Firebase CLI: npm install -g firebase-tools")
         print("\n   Or upload manually via Firebase Console:")
         print("   https://console.firebase.google.com/project/genaivideogenerator/storage")
         sys.exit(1)
     
     # Check if files exist
-    missing_files = []
-    existing_files = []
-    
-    for filename in FILES_TO_UPLOAD:
-        file_path = OUTPUT_DIR / filename
-        if file_path.exists():
-            existing_files.append(file_path)
-        else:
-            missing_files.append(filename)
+    existing_files, missing_files = files_to_upload()
     
     if missing_files:
         print(f"\n⚠️  Missing files:")
         for f in missing_files:
             print(f"   - {f}")
-        print(f"\n   Found {len(existing_files)}/{len(FILES_TO_UPLOAD)} files")
+        print(f"\n   Found {len(existing_files)}/{len(existing_files) + len(missing_files)} files")
         response = input("\nContinue with existing files only? (y/n): ")
         if response.lower() != 'y':
             sys.exit(0)
@@ -152,40 +185,64 @@ def main():
     
     # Choose upload method
     upload_method = None
-    if has_gsutil and has_firebase:
+    if args.sync:
+        if not has_storage_api:
+            print("\n❌ --sync needs Storage API credentials (gcloud auth login or GOOGLE_OAUTH_ACCESS_TOKEN)")
+            sys.exit(1)
+        upload_method = "sync"
+    elif has_storage_api and has_firebase:
         print(f"\n🔧 Upload tools available:")
-        print(f"   1. gsutil (recommended)")
+        print(f"   1. Storage API (recommended)")
         print(f"   2. Firebase CLI")
         choice = input("   Choose method (1/2): ").strip()
-        upload_method = "gsutil" if choice == "1" else "firebase"
-    elif has_gsutil:
-        upload_method = "gsutil"
+        upload_method = "storage-api" if choice == "1" else "firebase"
+    elif has_storage_api:
+        upload_method = "storage-api"
     else:
         upload_method = "firebase"
     
-    print(f"\n🚀 Using: {upload_method}")
+    print(f"\n🚀 Using: {upload_method} ({args.workers} concurrent uploads)")
     print("=" * 70)
     
+    def upload(file_path):
+        if upload_method == "storage-api":
+            return upload_with_storage_api(file_path, FIREBASE_STORAGE_PATH, STORAGE_BUCKET)
+        return upload_with_firebase_cli(file_path, FIREBASE_STORAGE_PATH, PROJECT_ID)
+    
     # Upload files
     uploaded_files = []
+    unchanged_files = []
     failed_files = []
+    deleted_files = []
     
-    for file_path in existing_files:
-        print(f"\n📦 {file_path.name}")
-        
-        if upload_method == "gsutil":
-            url = upload_with_gsutil(file_path, FIREBASE_STORAGE_PATH, STORAGE_BUCKET)
-        else:
-            url = upload_with_firebase_cli(file_path, FIREBASE_STORAGE_PATH, PROJECT_ID)
+    if upload_method == "sync":
+        try:
+            sync = gcs_storage.sync_files(
+                STORAGE_BUCKET, FIREBASE_STORAGE_PATH, existing_files, delete=args.delete, max_workers=args.workers
+            )
+        except gcs_storage.UploadError as e:
+            print(f"\n❌ Sync failed: {e}")
+            sys.exit(1)
+        for file_path in existing_files:
+            if file_path.name in sync["uploaded"]:
+                uploaded_files.append({"file": str(file_path), "name": file_path.name, "url": sync["uploaded"][file_path.name]})
+            elif file_path.name in sync["unchanged"]:
+                unchanged_files.append({"file": str(file_path), "name": file_path.name, "url": sync["unchanged"][file_path.name]})
+        failed_files = sync["failed"]
+        deleted_files = sync["deleted"]
+    else:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            urls = list(executor.map(upload, existing_files))
         
-        if url:
-            uploaded_files.append({
-                "file": str(file_path),
-                "name": file_path.name,
-                "url": url
-            })
-        else:
-            failed_files.append(file_path.name)
+        for file_path, url in zip(existing_files, urls):
+            if url:
+                uploaded_files.append({
+                    "file": str(file_path),
+                    "name": file_path.name,
+                    "url": url
+                })
+            else:
+                failed_files.append(file_path.name)
     
     # Summary
     print("\n" + "=" * 70)
@@ -196,6 +253,16 @@ def main():
     for item in uploaded_files:
         print(f"   ✅ {item['name']}")
     
+    if unchanged_files:
+        print(f"\n⏭️  Unchanged (already in Storage): {len(unchanged_files)}")
+        for item in unchanged_files:
+            print(f"   ⏭️  {item['name']}")
+    
+    if deleted_files:
+        print(f"\n🗑️  Deleted stale objects: {len(deleted_files)}")
+        for name in deleted_files:
+            print(f"   🗑️  {name}")
+    
     if failed_files:
         print(f"\n❌ Failed: {len(failed_files)}")
         for name in failed_files:
@@ -203,7 +270,7 @@ def main():
     
     # Find master playlist URL
     master_url = None
-    for item in uploaded_files:
+    for item in uploaded_files + unchanged_files:
         if "master.m3u8" in item['name']:
             master_url = item['url']
             break
@@ -212,7 +279,9 @@ def main():
     results = {
         "master_playlist_url": master_url,
         "uploaded_files": uploaded_files,
+        "unchanged_files": unchanged_files,
         "failed_files": failed_files,
+        "deleted_files": deleted_files,
         "firebase_storage_path": FIREBASE_STORAGE_PATH,
         "project_id": PROJECT_ID,
         "storage_bucket": STORAGE_BUCKET
@@ -4,23 +4,48 @@
 
 cd "$(dirname "$0")"
 
+MASTER=downloaded_videos/landing_video_master.m3u8
+
+# Media files are published under content-hashed names (gcs_storage.object_name_for),
+# which is what the generated playlists refer to
+upload() {
+    local name
+    name=$(python3 -c 'import sys, gcs_storage; print(gcs_storage.object_name_for(sys.argv[1]))' "$1") || exit 1
+    firebase storage:upload "$1" "videos/landing/$name" --project genaivideogenerator || {
+        echo "❌ Upload failed: $1"
+        exit 1
+    }
+}
+
 echo "📤 Uploading videos to Firebase Storage..."
 echo ""
 
-# Upload MP4 files
-echo "Uploading MP4 files..."
-firebase storage:upload downloaded_videos/landing_video_1280x720.mp4 videos/landing/ --project genaivideogenerator
-firebase storage:upload downloaded_videos/landing_video_640x360.mp4 videos/landing/ --project genaivideogenerator
-firebase storage:upload downloaded_videos/landing_video_480x270.mp4 videos/landing/ --project genaivideogenerator
-
-# Upload m3u8 files (if they exist)
-if [ -f "downloaded_videos/landing_video_1280x720.m3u8" ]; then
-    echo ""
-    echo "Uploading m3u8 playlists..."
-    firebase storage:upload downloaded_videos/landing_video_1280x720.m3u8 videos/landing/ --project genaivideogenerator
-    firebase storage:upload downloaded_videos/landing_video_640x360.m3u8 videos/landing/ --project genaivideogenerator
-    firebase storage:upload downloaded_videos/landing_video_480x270.m3u8 videos/landing/ --project genaivideogenerator
-    firebase storage:upload downloaded_videos/landing_video_master.m3u8 videos/landing/ --project genaivideogenerator
+if [ -f "$MASTER" ]; then
+    # The master playlist and everything it references (media, audio and I-frame
+    # playlists, MP4s and segments), with the master last. A missing file fails
+    # the upload: e.g. without the audio group the video-only renditions are silent
+    files=$(python3 -c '
+import sys, gcs_storage
+paths, missing = gcs_storage.playlist_files(sys.argv[1])
+for name in missing:
+    print(f"❌ Missing: {name}", file=sys.stderr)
+if missing:
+    sys.exit(1)
+print("\n".join(str(path) for path in paths[1:] + paths[:1]))
+' "$MASTER") || {
+        echo "❌ Not all files $(basename "$MASTER") references are here, nothing uploaded"
+        exit 1
+    }
+    echo "Uploading $(echo "$files" | wc -l) files referenced by $(basename "$MASTER")..."
+    while IFS= read -r file; do
+        upload "$file"
+    done <<< "$files"
+else
+    # No playlists yet: just the MP4 files
+    echo "Uploading MP4 files..."
+    upload downloaded_videos/landing_video_1280x720.mp4
+    upload downloaded_videos/landing_video_640x360.mp4
+    upload downloaded_videos/landing_video_480x270.mp4
 fi
 
 echo ""
@@ -28,4 +53,3 @@ echo "✅ Upload complete!"
 echo ""
 echo "💡 Get the master playlist URL from Firebase Console:"
 echo "   Storage → videos/landing/landing_video_master.m3u8 → Get download URL"
-